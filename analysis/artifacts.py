@@ -0,0 +1,95 @@
+"""
+Content-addressed store for pipeline outputs.
+
+Every figure and CSV a target writes is stored once under data/.cache/artifacts/objects,
+named by the SHA-1 of its bytes, and the index maps each target fingerprint (a hash of
+its code, input data and parameters, see pipeline.py) to the objects it produced. When a
+target's fingerprint has been seen before its outputs are restored from the store instead
+of being rendered again, e.g. after outputs were deleted or a change was reverted.
+"""
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from earnings.utils import CACHE_DIR, file_sha1
+
+ARTIFACTS_DIR = CACHE_DIR / 'artifacts'
+OBJECTS_DIR = ARTIFACTS_DIR / 'objects'
+INDEX_PATH = ARTIFACTS_DIR / 'index.json'
+
+
+class ArtifactCache:
+    """Stores output files by content hash and remembers which fingerprint produced them."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        if INDEX_PATH.exists():
+            with open(INDEX_PATH) as f:
+                self.index = json.load(f)
+        else:
+            self.index = {}
+
+    def _object_path(self, sha1):
+        return OBJECTS_DIR / sha1[:2] / sha1
+
+    def store(self, fingerprint, target, outputs):
+        """Copy outputs (paths relative to root) into the store under fingerprint. Returns {output: sha1}."""
+        stored = {}
+        for output in outputs:
+            source = self.root / output
+            sha1 = file_sha1(source)
+            object_path = self._object_path(sha1)
+            if not object_path.exists():
+                object_path.parent.mkdir(parents=True, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=object_path.parent)
+                os.close(fd)
+                shutil.copyfile(source, tmp_path)
+                os.replace(tmp_path, object_path)
+            stored[output] = sha1
+        self.index[fingerprint] = {'target': target, 'outputs': stored, 'stored': time.time()}
+        return stored
+
+    def lookup(self, fingerprint):
+        """Return {output: sha1} stored for fingerprint, or None if any object is missing."""
+        entry = self.index.get(fingerprint)
+        if entry is None or not all(self._object_path(sha1).exists() for sha1 in entry['outputs'].values()):
+            return None
+        return entry['outputs']
+
+    def restore(self, outputs):
+        """Write stored objects back to their output paths, skipping files that already match."""
+        for output, sha1 in outputs.items():
+            destination = self.root / output
+            if destination.exists() and file_sha1(destination) == sha1:
+                continue
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(self._object_path(sha1), destination)
+
+    def prune(self, keep):
+        """Forget every fingerprint not in keep and delete objects no longer referenced. Returns bytes freed."""
+        self.index = {fingerprint: entry for fingerprint, entry in self.index.items() if fingerprint in keep}
+        referenced = {sha1 for entry in self.index.values() for sha1 in entry['outputs'].values()}
+        freed = 0
+        if OBJECTS_DIR.exists():
+            for object_path in OBJECTS_DIR.glob('*/*'):
+                if object_path.name not in referenced:
+                    freed += object_path.stat().st_size
+                    object_path.unlink()
+        return freed
+
+    def size(self):
+        """Number of stored objects and their total size in bytes."""
+        if not OBJECTS_DIR.exists():
+            return 0, 0
+        sizes = [path.stat().st_size for path in OBJECTS_DIR.glob('*/*')]
+        return len(sizes), sum(sizes)
+
+    def save(self):
+        ARTIFACTS_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = INDEX_PATH.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.index, f, indent=2)
+        os.replace(tmp_path, INDEX_PATH)
@@ -2,6 +2,12 @@ import matplotlib.pyplot as plt
 import numpy as np
 from pathlib import Path
 from utils import load_earnings_data
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from render import save_figure
+from sketches import Summary
 
 def analyze_earnings_distribution(year):
     """Analyze earnings distribution for a given year and return the data"""
@@ -11,24 +17,20 @@ def analyze_earnings_distribution(year):
     # Filter for police department employees
     df = df[df['DEPARTMENT_NAME'].str.contains('POLICE', case=False, na=False)]
     
-    # Calculate statistics on all data
-    mean_earnings = df['TOTAL GROSS'].mean()
-    median_earnings = df['TOTAL GROSS'].median()
-    min_earnings = df['TOTAL GROSS'].min()
-    max_earnings = df['TOTAL GROSS'].max()
-    std_earnings = df['TOTAL GROSS'].std()
+    # Calculate statistics on all data, in one pass
+    summary = Summary.of(df['TOTAL GROSS'])
     
     # Print summary statistics
     print(f"\nEarnings Distribution Summary ({year})")
     print("-" * 50)
     print(f"Total Employees: {len(df):,}")
-    print(f"Mean Earnings: ${mean_earnings:,.2f}")
-    print(f"Median Earnings: ${median_earnings:,.2f}")
-    print(f"Min Earnings: ${min_earnings:,.2f}")
-    print(f"Max Earnings: ${max_earnings:,.2f}")
-    print(f"Standard Deviation: ${std_earnings:,.2f}")
+    print(f"Mean Earnings: ${summary.mean:,.2f}")
+    print(f"Median Earnings: ${summary.median():,.2f}")
+    print(f"Min Earnings: ${summary.min:,.2f}")
+    print(f"Max Earnings: ${summary.max:,.2f}")
+    print(f"Standard Deviation: ${summary.std():,.2f}")
     
-    return df['TOTAL GROSS'].dropna(), mean_earnings, median_earnings
+    return df['TOTAL GROSS'].dropna(), summary.mean, summary.median()
 
 if __name__ == "__main__":
     # Create figure with two subplots side by side
@@ -66,7 +68,6 @@ if __name__ == "__main__":
     # Save the figure
     output_path = Path('EDA')
     output_path.mkdir(exist_ok=True)
-    plt.savefig(output_path / 'earnings_distribution_comparison.png', 
+    save_figure(output_path / 'earnings_distribution_comparison.png', 
                 dpi=300, 
-                bbox_inches='tight')
-    plt.close() 
\ No newline at end of file
+                bbox_inches='tight', show=False) 
\ No newline at end of file
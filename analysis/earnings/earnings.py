@@ -1,57 +1,19 @@
 import pandas as pd
 import matplotlib.pyplot as plt
-import os
 import matplotlib.ticker as ticker
+from utils import load_all_earnings
+import sys
+import os
 
-data_dir = 'data/earnings/'
-
-# List all the files for years 2011 to 2024
-file_names = [f"employee-earnings-report-{year}.csv" for year in range(2011, 2025)]
-
-# Initialize a list to hold the total earnings for each year
-total_earnings_by_year = []
-
-# Loop through each file to process data
-for file in file_names:
-    file_path = os.path.join(data_dir, file)
-    
-    # Try to read the data from the CSV file with a different encoding (ISO-8859-1)
-    try:
-        df = pd.read_csv(file_path, encoding='ISO-8859-1')
-    except UnicodeDecodeError:
-        print(f"Error reading {file}. Skipping this file.")
-        continue
-    
-    # Normalize the column names (remove spaces, make case consistent)
-    df.columns = [col.strip().replace(" ", "_").upper() for col in df.columns]
-    
-    # Identify the column names related to department and total earnings
-    department_column = [col for col in df.columns if 'DEPARTMENT' in col]
-    total_column = [col for col in df.columns if 'TOTAL' in col]
-    
-    if not department_column or not total_column:
-        print(f"Warning: Skipping file {file} as it doesn't have both department and total columns.")
-        continue
-    
-    # Extract the relevant columns
-    department_column = department_column[0]  # Get the first match
-    total_column = total_column[0]  # Get the first match
-
-    # Clean the "TOTAL_EARNINGS" or "TOTAL_GROSS" column and convert it to numeric (removing $ and commas)
-    df[total_column] = df[total_column].replace({'\$': '', ',': ''}, regex=True)
-    
-    # Convert to numeric, coercing errors to NaN, then drop rows with NaN values in the total column
-    df[total_column] = pd.to_numeric(df[total_column], errors='coerce')
-    df = df.dropna(subset=[total_column])
-    
-    # Filter for Boston Police Department (BPD) data
-    bpd_data = df[df[department_column] == 'Boston Police Department']
-    
-    # Sum up the total earnings for this year and append to the list
-    total_earnings_by_year.append(bpd_data[total_column].sum())
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from render import save_figure
 
-# Prepare the data for plotting
+# Load BPD total earnings for 2011 to 2024 in one pass
 years = range(2011, 2025)
+df = load_all_earnings(years, columns=['TOTAL GROSS'], departments=['Boston Police Department'])
+
+# Sum up the total earnings for each year (years without data count as 0)
+total_earnings_by_year = df.groupby('YEAR')['TOTAL GROSS'].sum().reindex(years, fill_value=0).tolist()
 
 # Plot the data
 plt.figure(figsize=(10, 6))
@@ -67,5 +29,5 @@ plt.gca().yaxis.set_major_formatter(ticker.FuncFormatter(lambda x, _: f"${x:,.0f
 plt.xticks(years)
 plt.grid(True)
 
-plt.savefig("./analysis/earnings/figures/figure_totalearnings.png", dpi=300, bbox_inches="tight")
+save_figure("./analysis/earnings/figures/figure_totalearnings.png", dpi=300, bbox_inches="tight", show=False)
 
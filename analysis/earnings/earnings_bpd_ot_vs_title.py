@@ -1,13 +1,15 @@
 import pandas as pd
 import matplotlib.pyplot as plt
-import os
 import matplotlib.ticker as ticker
+from utils import load_all_earnings
+import sys
+import os
 
-# Define the directory where the data files are located
-data_dir = 'data/earnings/'
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from render import save_figure
 
-# List all the files for years 2011 to 2024
-file_names = [f"employee-earnings-report-{year}.csv" for year in range(2011, 2025)]
+# Years to plot, 2011 to 2024
+years = range(2011, 2025)
 
 # Define the list of key phrases that correspond to employee titles
 title_keywords = {
@@ -23,52 +25,19 @@ title_keywords = {
     'Other': []  # Employees not matching any of the above titles will be categorized as 'Other'
 }
 
-# Loop through each file to process data
-for file in file_names:
-    file_path = os.path.join(data_dir, file)
-    
-    # Try to read the data from the CSV file with a different encoding (ISO-8859-1)
-    try:
-        df = pd.read_csv(file_path, encoding='ISO-8859-1')
-    except UnicodeDecodeError:
-        print(f"Error reading {file}. Skipping this file.")
-        continue
-    
-    # Normalize the column names (remove spaces, make case consistent)
-    df.columns = [col.strip().replace(" ", "_").upper() for col in df.columns]
-    
-    # Identify the column names related to department, total earnings, overtime, and title
-    department_column = [col for col in df.columns if 'DEPARTMENT' in col]
-    total_column = [col for col in df.columns if 'TOTAL' in col]
-    overtime_column = [col for col in df.columns if 'OVERTIME' in col]
-    title_column = [col for col in df.columns if 'TITLE' in col]
-    
-    if not department_column or not total_column or not overtime_column or not title_column:
-        print(f"Warning: Skipping file {file} as it doesn't have the necessary columns.")
-        continue
-    
-    # Extract the relevant columns
-    department_column = department_column[0]  # Get the first match
-    total_column = total_column[0]  # Get the first match
-    overtime_column = overtime_column[0]  # Get the first match
-    title_column = title_column[0]  # Get the first match
+# Load title, total earnings and overtime of every BPD employee for all years at once
+all_years = load_all_earnings(years, columns=['TITLE', 'TOTAL GROSS', 'OVERTIME'],
+                              departments=['Boston Police Department'])
+title_column, total_column, overtime_column = 'TITLE', 'TOTAL GROSS', 'OVERTIME'
+
+# Fill NaN values with 0 and drop rows where both total earnings and overtime are 0
+all_years[[total_column, overtime_column]] = all_years[[total_column, overtime_column]].fillna(0)
+all_years = all_years[~((all_years[total_column] == 0) & (all_years[overtime_column] == 0))]
+
+# Loop through each year to plot
+for year, bpd_data in all_years.groupby('YEAR'):
+    bpd_data = bpd_data.copy()
 
-    # Clean the "TOTAL_EARNINGS" or "TOTAL_GROSS" column and convert it to numeric (removing $ and commas)
-    df[total_column] = df[total_column].replace({'\$': '', ',': ''}, regex=True)
-    df[overtime_column] = df[overtime_column].replace({'\$': '', ',': ''}, regex=True)
-    
-    # Convert to numeric, coercing errors to NaN
-    df[total_column] = pd.to_numeric(df[total_column], errors='coerce')
-    df[overtime_column] = pd.to_numeric(df[overtime_column], errors='coerce')
-    
-    # Fill NaN values with 0 unless both total earnings and overtime are NaN
-    df[total_column].fillna(0, inplace=True)
-    df[overtime_column].fillna(0, inplace=True)
-    df = df[~((df[total_column] == 0) & (df[overtime_column] == 0))]
-    
-    # Filter for Boston Police Department (BPD) data
-    bpd_data = df[df[department_column] == 'Boston Police Department']
-    
     # Initialize a new column to store the title category
     bpd_data['TITLE_CATEGORY'] = 'Other'  # Default value is 'Other'
 
@@ -79,9 +48,6 @@ for file in file_names:
             bpd_data.loc[bpd_data[title_column].str.contains(keyword, case=False, na=False), 'TITLE_CATEGORY'] = title
     
 
-    year = file.split('-')[-1].split('.')[0]  
-    
-
     plt.figure(figsize=(10, 6))
     
     # Loop through each title category
@@ -103,5 +69,4 @@ for file in file_names:
     plt.grid(True)
     plt.legend()
     plt.tight_layout()
-    plt.savefig(f"./analysis/earnings/figures/plots/ot_title_plots/figure_bpd_overtime_by_title_{year}.png", dpi=300, bbox_inches="tight")
-    plt.close()
+    save_figure(f"./analysis/earnings/figures/plots/ot_title_plots/figure_bpd_overtime_by_title_{year}.png", dpi=300, bbox_inches="tight", show=False)
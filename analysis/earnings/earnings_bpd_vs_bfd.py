@@ -1,59 +1,33 @@
 import pandas as pd
 import matplotlib.pyplot as plt
-import os
 import matplotlib.ticker as ticker
+from utils import load_all_earnings
+import sys
+import os
 
-data_dir = 'data/earnings/'
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from render import save_figure
 
-# List all the files for years 2011 to 2024
+# List all the years from 2011 to 2024
 years = list(range(2011, 2025))
-file_names = [f"employee-earnings-report-{year}.csv" for year in years]
 
 # Categories we need to extract
 categories = ["OVERTIME", "INJURED"]
 
-# Initialize dictionaries to store earnings by year for BPD and BFD
-bpd_earnings = {category: [0] * len(years) for category in categories}
-bfd_earnings = {category: [0] * len(years) for category in categories}
+# Load overtime & injured pay for BPD and BFD employees across all years at once
+df = load_all_earnings(years, columns=['DEPARTMENT_NAME'] + categories,
+                       departments=['Boston Police Department', 'Boston Fire Department'])
 
-# Function to clean and convert earnings columns
-def clean_and_convert(series):
-    series = series.astype(str).str.strip()
-    series = series.str.replace(r'[\$,]', '', regex=True)  # Remove $ and commas
-    series = series.str.replace(r'\((.*?)\)', r'-\1', regex=True)  # Convert (2.51) to -2.51
-    return pd.to_numeric(series, errors='coerce').fillna(0)  # Convert to float, replace NaN with 0
+# Sum each category per year and department (blank cells count as 0)
+yearly_sums = df.groupby(['DEPARTMENT_NAME', 'YEAR'], observed=True)[categories].sum()
 
-# Loop through each file to process data
-for idx, file in enumerate(file_names):
-    file_path = os.path.join(data_dir, file)
-    
-    try:
-        df = pd.read_csv(file_path, encoding='ISO-8859-1')
-    except UnicodeDecodeError:
-        print(f"Error reading {file}. Skipping this file.")
-        continue
-    
-    # Normalize the column names
-    df.columns = [col.strip().replace(" ", "_").upper() for col in df.columns]
-    
-    # Identify the department column
-    department_column = next((col for col in df.columns if 'DEPARTMENT' in col), None)
-    if not department_column:
-        print(f"Skipping {file}: No department column found.")
-        continue
-    
-    # Process only BPD and BFD data
-    bpd_data = df[df[department_column] == 'Boston Police Department'].copy()
-    bfd_data = df[df[department_column] == 'Boston Fire Department'].copy()
+def department_earnings(department):
+    totals = yearly_sums.loc[department].reindex(years, fill_value=0)
+    return {category: totals[category].tolist() for category in categories}
 
-    # Extract overtime & injured pay, ensuring proper type conversion
-    for category in categories:
-        if category in df.columns:
-            bpd_data.loc[:, category] = clean_and_convert(bpd_data[category])
-            bfd_data.loc[:, category] = clean_and_convert(bfd_data[category])
-            
-            bpd_earnings[category][idx] = bpd_data[category].sum()
-            bfd_earnings[category][idx] = bfd_data[category].sum()
+# Dictionaries of earnings by year for BPD and BFD
+bpd_earnings = department_earnings('Boston Police Department')
+bfd_earnings = department_earnings('Boston Fire Department')
 
 # 🎨 Plot the data
 plt.figure(figsize=(12, 6))
@@ -74,5 +48,4 @@ plt.grid(True, linestyle="--", alpha=0.7)
 plt.gca().yaxis.set_major_formatter(ticker.FuncFormatter(lambda x, _: f"${x:,.0f}"))
 
 # Save and display the figure
-plt.savefig("./analysis/earnings/figures/figure_bpd_vs_bfd.png", dpi=300, bbox_inches="tight")
-plt.show()
+save_figure("./analysis/earnings/figures/figure_bpd_vs_bfd.png", dpi=300, bbox_inches="tight")
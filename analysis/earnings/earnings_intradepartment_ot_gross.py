@@ -1,15 +1,16 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
-import os
 import matplotlib.ticker as ticker
+from utils import load_all_earnings
+import sys
+import os
 
-# Define data directory
-data_dir = 'data/earnings/'
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from render import save_figure
 
 # Years to analyze
 years_to_plot = [2018, 2019, 2020, 2021]
-file_names = {year: f"employee-earnings-report-{year}.csv" for year in years_to_plot}
 
 # Departments to analyze
 departments = {
@@ -18,36 +19,14 @@ departments = {
     "BPS": "purple"
 }
 
-# Process each year separately
-for year, file in file_names.items():
-    file_path = os.path.join(data_dir, file)
-    
-    # Try reading the CSV file
-    try:
-        df = pd.read_csv(file_path, encoding='ISO-8859-1')
-    except UnicodeDecodeError:
-        print(f"Error reading {file}. Skipping this file.")
-        continue
-    
-    # Normalize column names
-    df.columns = [col.strip().replace(" ", "_").upper() for col in df.columns]
-    
-    # Identify required columns
-    department_column = next((col for col in df.columns if 'DEPARTMENT' in col), None)
-    total_column = next((col for col in df.columns if 'TOTAL' in col), None)
-    overtime_column = next((col for col in df.columns if 'OVERTIME' in col), None)
-
-    if not department_column or not total_column or not overtime_column:
-        print(f"Warning: Skipping file {file} as it doesn't have necessary columns.")
-        continue
-    
-    # Clean numeric columns
-    for col in [total_column, overtime_column]:
-        df[col] = df[col].replace({'\$': '', ',': ''}, regex=True)
-        df[col] = pd.to_numeric(df[col], errors='coerce')
-    
-    df = df.dropna(subset=[total_column, overtime_column])
+# Load total earnings and overtime for the departments of interest across all years at once
+department_column, total_column, overtime_column = 'DEPARTMENT_NAME', 'TOTAL GROSS', 'OVERTIME'
+all_years = load_all_earnings(years_to_plot, columns=[department_column, total_column, overtime_column],
+                              departments="|".join(departments))
+all_years = all_years.dropna(subset=[total_column, overtime_column])
 
+# Process each year separately
+for year, df in all_years.groupby('YEAR'):
     plt.figure(figsize=(10, 6))
 
     # Process each department
@@ -82,5 +61,4 @@ for year, file in file_names.items():
 
     # Save plot
     plt.tight_layout()
-    plt.savefig(f"./analysis/earnings/figures/figure_intradepartment_overtime_vs_earnings_{year}.png", dpi=300, bbox_inches="tight")
-    plt.show()
+    save_figure(f"./analysis/earnings/figures/figure_intradepartment_overtime_vs_earnings_{year}.png", dpi=300, bbox_inches="tight")
@@ -2,6 +2,11 @@ import matplotlib.pyplot as plt
 import numpy as np
 from pathlib import Path
 from utils import load_earnings_data
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from render import save_figure
 
 def analyze_mean_earnings(year):
     """Analyze mean earnings for police department employees for a given year."""
@@ -65,7 +70,7 @@ def main():
         # Save the plot in the EDA directory within earnings analysis
         output_dir = Path(__file__).parent / 'EDA'
         output_dir.mkdir(exist_ok=True)
-        plt.savefig(output_dir / 'mean_earnings_trend.png', bbox_inches='tight', dpi=300)
+        save_figure(output_dir / 'mean_earnings_trend.png', bbox_inches='tight', dpi=300, show=False)
         print(f"\nPlot saved as 'mean_earnings_trend.png' in {output_dir}")
 
 if __name__ == "__main__":
@@ -3,6 +3,11 @@ import numpy as np
 import pandas as pd
 from pathlib import Path
 from utils import load_earnings_data
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from render import save_figure
 
 def create_top_earners_chart(df, year):
     plt.figure(figsize=(15, 8))
@@ -50,7 +55,7 @@ def create_top_earners_chart(df, year):
     # Save the figure
     output_dir = Path(__file__).parent / 'EDA'
     output_dir.mkdir(exist_ok=True)
-    plt.savefig(output_dir / f'top_earners_{year}.png', bbox_inches='tight', dpi=300)
+    save_figure(output_dir / f'top_earners_{year}.png', bbox_inches='tight', dpi=300, show=False)
     print(f"\nPlot saved as 'top_earners_{year}.png' in {output_dir}")
 
 if __name__ == "__main__":
@@ -1,60 +1,394 @@
+import codecs
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 from pathlib import Path
 
-def load_earnings_data(year):
-    """Load earnings data for a given year and standardize column names."""
-    data_dir = Path(__file__).parent.parent.parent / 'data' / 'earnings'
-    file_path = data_dir / f'employee-earnings-report-{year}.csv'
-    
+try:
+    from .currency import parse_currency_columns
+except ImportError:  # imported as a top-level module from analysis/earnings
+    from currency import parse_currency_columns
+
+DATA_DIR = Path(__file__).parent.parent.parent / 'data'
+
+# Cleaned frames are cached as one .npy file per column so a repeat load is a
+# memory-map instead of a CSV parse. Bump CACHE_VERSION whenever the cleaning
+# below changes so stale caches are rebuilt.
+CACHE_DIR = DATA_DIR / '.cache'
+CACHE_VERSION = 6
+
+# Standardized earnings columns, in the order every loader returns them
+EARNINGS_COLUMNS = ['NAME', 'DEPARTMENT_NAME', 'TITLE', 'REGULAR', 'RETRO', 'OTHER', 'OVERTIME',
+                    'INJURED', 'DETAIL', 'QUINN_EDUCATION', 'TOTAL GROSS', 'POSTAL']
+NUMERIC_COLUMNS = ['TOTAL GROSS', 'REGULAR', 'RETRO', 'OTHER', 'OVERTIME', 'INJURED', 'DETAIL', 'QUINN_EDUCATION']
+
+# Raw headers (whitespace stripped) of each yearly report, listed in EARNINGS_COLUMNS order
+_RAW_HEADERS = {
+    2011: ['Name', 'Department Name', 'Title', 'Regular', 'Retro', 'Other', 'Overtime',
+           'Injured', 'Detail', 'Quinn', 'Total Earnings', 'Zip Code'],
+    2012: ['NAME', 'DEPARTMENT', 'TITLE', 'REGULAR', 'RETRO', 'OTHER', 'OVERTIME',
+           'INJURED', 'DETAIL', 'QUINN', 'TOTAL EARNINGS', 'ZIP'],
+    2013: ['NAME', 'DEPARTMENT', 'TITLE', 'REGULAR', 'RETRO', 'OTHER', 'OVERTIME',
+           'INJURED', 'DETAIL', 'QUINN', 'TOTAL EARNINGS', 'ZIP'],
+    2014: ['NAME', 'DEPARTMENT NAME', 'TITLE', 'REGULAR', 'RETRO', 'OTHER', 'OVERTIME',
+           'INJURED', 'DETAIL', 'QUINN', 'TOTAL EARNINGS', 'ZIP'],
+    2015: ['NAME', 'DEPARTMENT_NAME', 'TITLE', 'REGULAR', 'RETRO', 'OTHER', 'OVERTIME',
+           'INJURED', 'DETAILS', 'QUINN/EDUCATION INCENTIVE', 'TOTAL EARNINGS', 'POSTAL'],
+    2016: ['NAME', 'DEPARTMENT_NAME', 'TITLE', 'REGULAR', 'RETRO', 'OTHER', 'OVERTIME',
+           'INJURED', 'DETAIL', 'QUINN/EDUCATION INCENTIVE', 'TOTAL EARNINGS', 'POSTAL'],
+    2017: ['NAME', 'DEPARTMENT NAME', 'TITLE', 'REGULAR', 'RETRO', 'OTHER', 'OVERTIME',
+           'INJURED', 'DETAIL', 'QUINN/EDUCATION INCENTIVE', 'TOTAL EARNINGS', 'POSTAL'],
+    2018: ['NAME', 'DEPARTMENT_NAME', 'TITLE', 'REGULAR', 'RETRO', 'OTHER', 'OVERTIME',
+           'INJURED', 'DETAIL', 'QUINN/EDUCATION INCENTIVE', 'TOTAL EARNINGS', 'POSTAL'],
+    2019: ['NAME', 'DEPARTMENT_NAME', 'TITLE', 'REGULAR', 'RETRO', 'OTHER', 'OVERTIME',
+           'INJURED', 'DETAIL', 'QUINN/EDUCATION INCENTIVE', 'TOTAL EARNINGS', 'POSTAL'],
+    2020: ['NAME', 'DEPARTMENT_NAME', 'TITLE', 'REGULAR', 'RETRO', 'OTHER', 'OVERTIME',
+           'INJURED', 'DETAIL', 'QUINN / EDUCATION INCENTIVE', 'TOTAL EARNINGS', 'POSTAL'],
+    2021: ['NAME', 'DEPARTMENT_NAME', 'TITLE', 'REGULAR', 'RETRO', 'OTHER', 'OVERTIME',
+           'INJURED', 'DETAIL', 'QUINN_EDUCATION_INCENTIVE', 'TOTAL_GROSS', 'POSTAL'],
+    2022: ['NAME', 'DEPARTMENT_NAME', 'TITLE', 'REGULAR', 'RETRO', 'OTHER', 'OVERTIME',
+           'INJURED', 'DETAIL', 'QUINN_EDUCATION', 'TOTAL_ GROSS', 'POSTAL'],
+    2023: ['NAME', 'DEPARTMENT_NAME', 'TITLE', 'REGULAR', 'RETRO', 'OTHER', 'OVERTIME',
+           'INJURED', 'DETAIL', 'QUINN_EDUCATION', 'TOTAL GROSS', 'POSTAL'],
+    2024: ['NAME', 'DEPARTMENT_NAME', 'TITLE', 'REGULAR', 'RETRO', 'OTHER', 'OVERTIME',
+           'INJURED', 'DETAIL', 'QUINN_EDUCATION', 'TOTAL GROSS', 'POSTAL'],
+}
+
+# Per-year map from raw header to standardized column name
+EARNINGS_SCHEMA = {year: dict(zip(headers, EARNINGS_COLUMNS)) for year, headers in _RAW_HEADERS.items()}
+
+# The reformatted reports share one header across all years
+_REFORMATTED_HEADERS = ['NAME', 'DEPARTMENT NAME', 'TITLE', 'REGULAR', 'RETRO', 'OTHER', 'OVERTIME',
+                        'INJURED', 'DETAILS', 'QUINN', 'TOTAL EARNINGS', 'ZIP']
+REFORMATTED_SCHEMA = {year: dict(zip(_REFORMATTED_HEADERS, EARNINGS_COLUMNS)) for year in range(2011, 2025)}
+
+# Schema map for each data/ directory the loaders can read
+SOURCE_SCHEMAS = {
+    'earnings': EARNINGS_SCHEMA,
+    'earnings-reformatted': REFORMATTED_SCHEMA,
+}
+
+# Rows per chunk when streaming a CSV without the cache
+CHUNK_ROWS = 4096
+
+# Fallback for years missing from EARNINGS_SCHEMA
+COLUMN_MAPPING = {
+    'TOTAL EARNINGS': 'TOTAL GROSS',
+    'TOTAL_EARNINGS': 'TOTAL GROSS',
+    'TOTAL GROSS': 'TOTAL GROSS',
+    'TOTAL_GROSS': 'TOTAL GROSS',
+    'TOTAL_ GROSS': 'TOTAL GROSS',  # Handle space variation
+    'QUINN': 'QUINN_EDUCATION',
+    'QUINN/EDUCATION INCENTIVE': 'QUINN_EDUCATION',
+    'QUINN / EDUCATION INCENTIVE': 'QUINN_EDUCATION',
+    'QUINN_EDUCATION_INCENTIVE': 'QUINN_EDUCATION',
+    'DEPARTMENT': 'DEPARTMENT_NAME',
+    'DEPARTMENT NAME': 'DEPARTMENT_NAME',
+    'DETAILS': 'DETAIL',
+    'ZIP': 'POSTAL',
+}
+
+
+def file_sha1(file_path, limit=None):
+    """Hash a file (or its first limit bytes) in 1 MB blocks so large CSVs are never read into memory at once."""
+    digest = hashlib.sha1()
+    remaining = float('inf') if limit is None else limit
+    with open(file_path, 'rb') as f:
+        while remaining > 0:
+            block = f.read(int(min(1 << 20, remaining)))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+    return digest.hexdigest()
+
+
+def _read_cache(cache_path, file_path, columns=None, departments=None):
+    """
+    Return the cached frame for file_path, or None if the cache is missing or stale.
+
+    Only the requested columns are memory-mapped, and when departments is given the
+    department column is read first so the other columns are sliced to matching rows.
+    """
+    meta_path = cache_path / 'meta.json'
+    if not meta_path.exists():
+        return None
+
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if meta.get('version') != CACHE_VERSION:
+        return None
+    data_path = cache_path / meta['data']
+
+    # mtime/size is the cheap check; only fall back to hashing when it differs
+    stat = file_path.stat()
+    if (stat.st_size, stat.st_mtime_ns) != (meta['size'], meta['mtime_ns']):
+        if stat.st_size != meta['size'] or file_sha1(file_path) != meta['sha1']:
+            return None
+        # file was touched but the content is unchanged, so keep the cache
+        meta['mtime_ns'] = stat.st_mtime_ns
+        _write_meta(meta_path, meta)
+
+    stored = {name: (i, kind) for i, (name, kind) in enumerate(meta['columns'])}
+
+    def read_column(name, rows=None):
+        i, kind = stored[name]
+        values = np.load(data_path / f'{i}.npy', mmap_mode='r')
+        if rows is not None:
+            values = values[rows]
+        if kind == 'str':
+            # strings are stored fixed-width with '' standing in for missing values
+            values = pd.Series(values, dtype=object).where(values != '')
+        return values
+
+    names = [name for name, _ in meta['columns']] if columns is None else [col for col in columns if col in stored]
+    try:
+        rows = None
+        if departments is not None and 'DEPARTMENT_NAME' in stored:
+            rows = _department_mask(read_column('DEPARTMENT_NAME'), departments).to_numpy()
+        return pd.DataFrame({name: read_column(name, rows) for name in names})
+    except FileNotFoundError:
+        # a concurrent rebuild removed the columns after meta.json was read
+        return None
+
+
+def _write_meta(meta_path, meta):
+    """Replace meta.json atomically, so a reader never sees it half-written."""
+    tmp_path = meta_path.with_suffix(f'.{os.getpid()}.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+
+def _write_cache(cache_path, file_path, df):
+    """
+    Write df to cache_path, replacing any previous cache for the same file.
+
+    The columns go to a directory named by the cache version and the file's sha1, and
+    meta.json, which names it, is replaced last, so readers see the previous cache or
+    the new one, never a mix. Other directories are only removed after that.
+    """
+    cache_path.mkdir(parents=True, exist_ok=True)
+    tmp_path = Path(tempfile.mkdtemp(dir=cache_path, prefix='.tmp-'))
+
+    columns = []
+    for i, name in enumerate(df.columns):
+        col = df[name]
+        if pd.api.types.is_numeric_dtype(col):
+            np.save(tmp_path / f'{i}.npy', col.to_numpy())
+            columns.append((name, 'num'))
+        else:
+            np.save(tmp_path / f'{i}.npy', col.fillna('').astype(str).to_numpy(dtype=str))
+            columns.append((name, 'str'))
+
+    stat = file_path.stat()
+    sha1 = file_sha1(file_path)
+    data_path = cache_path / f'v{CACHE_VERSION}-{sha1}'
     try:
-        df = pd.read_csv(file_path, encoding='utf-8')
-    except UnicodeDecodeError:
-        df = pd.read_csv(file_path, encoding='latin-1')
-    
+        os.replace(tmp_path, data_path)
+    except OSError:
+        # another process already wrote the same columns
+        shutil.rmtree(tmp_path)
+
+    _write_meta(cache_path / 'meta.json', {
+        'version': CACHE_VERSION,
+        'source': str(file_path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha1': sha1,
+        'data': data_path.name,
+        'columns': columns,
+    })
+
+    # earlier versions (and the flat layout before CACHE_VERSION 5), but not the
+    # temporary files of writers still running
+    for path in cache_path.iterdir():
+        if path == data_path or path.name == 'meta.json' or path.name.startswith('.tmp-') or path.suffix == '.tmp':
+            continue
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            path.unlink(missing_ok=True)
+
+
+def detect_encoding(file_path):
+    """Return 'utf-8' if the whole file decodes as UTF-8, otherwise 'latin-1'."""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    with open(file_path, 'rb') as f:
+        try:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                decoder.decode(block)
+            decoder.decode(b'', final=True)
+        except UnicodeDecodeError:
+            return 'latin-1'
+    return 'utf-8'
+
+
+def _department_mask(dept, departments):
+    """Boolean mask of rows whose department is in departments, or matches it if it is a pattern."""
+    if isinstance(departments, str):
+        # a single string is a case-insensitive pattern, e.g. 'POLICE' or 'Boston Public Schools|BPS'
+        return dept.str.contains(departments, case=False, na=False)
+    return dept.isin(departments)
+
+
+def _select(df, columns=None, departments=None):
+    """Apply the department filter and column projection to an already loaded frame."""
+    if departments is not None and 'DEPARTMENT_NAME' in df.columns:
+        df = df[_department_mask(df['DEPARTMENT_NAME'], departments)]
+    if columns is not None:
+        df = df[[col for col in columns if col in df.columns]]
+    return df
+
+
+def _parse_earnings(year, file_path, schema):
+    """Read and clean a whole yearly report."""
+    # everything is read as text: currency is parsed below and POSTAL keeps its leading zeros
+    df = pd.read_csv(file_path, encoding=detect_encoding(file_path), dtype=str)
+
     print(f"\nProcessing {year} data:")
     print("Original columns:", df.columns.tolist())
-    
+
     # Clean column names by stripping whitespace
     df.columns = df.columns.str.strip()
-    
+
     # Map column names to standardized format
-    column_mapping = {
-        'TOTAL EARNINGS': 'TOTAL GROSS',
-        'TOTAL_EARNINGS': 'TOTAL GROSS',
-        'TOTAL GROSS': 'TOTAL GROSS',
-        'TOTAL_ GROSS': 'TOTAL GROSS',  # Handle space variation
-        ' TOTAL EARNINGS ': 'TOTAL GROSS',  # Handle 2020 format
-        'QUINN': 'QUINN_EDUCATION',
-        'QUINN/EDUCATION INCENTIVE': 'QUINN_EDUCATION',
-        'QUINN / EDUCATION INCENTIVE': 'QUINN_EDUCATION',
-        ' QUINN / EDUCATION INCENTIVE ': 'QUINN_EDUCATION',  # Handle 2020 format
-        'DEPARTMENT': 'DEPARTMENT_NAME',
-        'DEPARTMENT NAME': 'DEPARTMENT_NAME',
-        'DETAIL ': 'DETAIL'  # Handle extra space
-    }
-    
-    # Apply column mapping
-    df = df.rename(columns=column_mapping)
+    df = df.rename(columns=schema)
     print("Columns after mapping:", df.columns.tolist())
-    
-    # Function to clean numeric values
-    def clean_numeric(x):
-        if pd.isna(x):
-            return x
-        if isinstance(x, str):
-            # If the string contains multiple values (space-separated), take the first one
-            x = x.split()[0] if ' ' in x else x
-            # Remove $ and , and convert to float
-            x = x.replace('$', '').replace(',', '')
-        return pd.to_numeric(x, errors='coerce')
-    
+
     # Clean numeric columns
-    numeric_columns = ['TOTAL GROSS', 'REGULAR', 'RETRO', 'OTHER', 'OVERTIME', 'INJURED', 'DETAIL', 'QUINN_EDUCATION']
-    for col in numeric_columns:
-        if col in df.columns:
-            df[col] = df[col].apply(clean_numeric)
-    
+    failures = parse_currency_columns(df, NUMERIC_COLUMNS)
+    for col, count in failures.items():
+        if count:
+            print(f"Warning: {count} cells in {col} could not be parsed as currency")
+
     print("Final columns:", df.columns.tolist())
     print(f"Number of rows: {len(df)}\n")
-    
-    return df 
\ No newline at end of file
+    return df
+
+
+def _stream_earnings(year, file_path, schema, columns=None, departments=None):
+    """
+    Read a yearly report in chunks, keeping only the requested columns and departments.
+
+    Unused columns are skipped by the CSV reader and each chunk is filtered before it
+    is cleaned, so the full citywide frame is never held in memory.
+    """
+    wanted = None
+    if columns is not None:
+        wanted = set(columns)
+        if departments is not None:
+            wanted.add('DEPARTMENT_NAME')
+
+    def standard_name(raw):
+        return schema.get(raw.strip(), raw.strip())
+
+    usecols = None if wanted is None else (lambda raw: standard_name(raw) in wanted)
+    reader = pd.read_csv(file_path, encoding=detect_encoding(file_path), usecols=usecols,
+                         dtype=str, chunksize=CHUNK_ROWS)
+
+    chunks, failed = [], {}
+    with reader:
+        for chunk in reader:
+            chunk.columns = [standard_name(col) for col in chunk.columns]
+            if departments is not None:
+                chunk = chunk[_department_mask(chunk['DEPARTMENT_NAME'], departments)].copy()
+            for col, count in parse_currency_columns(chunk, NUMERIC_COLUMNS).items():
+                failed[col] = failed.get(col, 0) + count
+            chunks.append(chunk)
+
+    for col, count in failed.items():
+        if count:
+            print(f"Warning: {count} cells in {col} of {year} could not be parsed as currency")
+
+    df = pd.concat(chunks, ignore_index=True)
+    return _select(df, columns)
+
+
+def load_earnings_data(year, columns=None, departments=None, source='earnings', use_cache=True):
+    """
+    Load earnings data for a given year and standardize column names.
+
+    Args:
+        year (int): Report year.
+        columns (list[str]): Standardized columns to return (see EARNINGS_COLUMNS). All by default.
+        departments (list[str] | str): Exact department names to keep, or a single
+            case-insensitive pattern matched with str.contains. All departments by default.
+        source (str): Directory under data/ to read, 'earnings' or 'earnings-reformatted'.
+        use_cache (bool): Read from, and build, the column cache. When False the CSV is
+            streamed in chunks with the column and department filters applied while reading.
+
+    Returns:
+        pd.DataFrame: The cleaned earnings with currency columns as floats.
+    """
+    data_dir = DATA_DIR / source
+    file_path = data_dir / f'employee-earnings-report-{year}.csv'
+    schema = SOURCE_SCHEMAS[source].get(year, COLUMN_MAPPING)
+
+    if not use_cache:
+        return _stream_earnings(year, file_path, schema, columns, departments)
+
+    cache_path = CACHE_DIR / data_dir.name / file_path.stem
+    df = _read_cache(cache_path, file_path, columns, departments)
+    if df is not None:
+        print(f"\nLoaded {year} data from cache ({len(df)} rows)")
+        return df
+
+    # First load of this file: parse it fully once so every later query hits the cache
+    df = _parse_earnings(year, file_path, schema)
+    try:
+        _write_cache(cache_path, file_path, df)
+    except OSError as e:
+        print(f"Warning: could not write earnings cache for {year}: {e}")
+
+    return _select(df, columns, departments)
+
+
+def _load_year(year, columns, departments, source):
+    """Load one year with the filters pushed down, and tag it with YEAR."""
+    return load_earnings_data(year, columns, departments, source).assign(YEAR=year)
+
+
+def load_all_earnings(years=range(2011, 2025), columns=None, departments=None, source='earnings', workers=None):
+    """
+    Load several years of earnings into one standardized, year-tagged frame.
+
+    Each year is loaded from the column cache with the department filter and column
+    projection pushed down, so unused rows and columns are never materialized.
+    Years are loaded in parallel worker processes where the platform can fork.
+
+    Args:
+        years (iterable[int]): Report years to load.
+        columns (list[str]): Standardized columns to keep (see EARNINGS_COLUMNS). All by default.
+        departments (list[str] | str): Exact department names to keep, or a single
+            case-insensitive pattern matched with str.contains. All departments by default.
+        source (str): Directory under data/ to read, 'earnings' or 'earnings-reformatted'.
+        workers (int): Number of worker processes. Defaults to one per CPU; 1 loads serially.
+
+    Returns:
+        pd.DataFrame: One row per employee per year with a YEAR column. DEPARTMENT_NAME
+        and TITLE are categorical.
+    """
+    years = list(years)
+    workers = workers or min(len(years), os.cpu_count() or 1)
+
+    # Forked workers inherit the loaded modules; under spawn every worker would
+    # re-run the calling script, so fall back to loading serially there.
+    if workers > 1 and len(years) > 1 and 'fork' in multiprocessing.get_all_start_methods():
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as pool:
+            frames = list(pool.map(_load_year, years, [columns] * len(years), [departments] * len(years),
+                                   [source] * len(years)))
+    else:
+        frames = [_load_year(year, columns, departments, source) for year in years]
+
+    df = pd.concat(frames, ignore_index=True)
+    for col in ['DEPARTMENT_NAME', 'TITLE']:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return df
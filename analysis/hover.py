@@ -0,0 +1,57 @@
+"""
+Hover labels for the plotly figures.
+
+Instead of building an HTML string per point and shipping each one in the figure's JSON,
+a hover is declared once as a list of labelled fields. The field values go into the
+traces' customdata as they are, and a single hovertemplate lays them out and formats
+them in the browser. The page then carries each value once, not once inside a label
+string and again as customdata, and nothing is formatted row by row in Python.
+
+    columns, template = hover_template([('Job Title', 'Job Title'), ('Annual Rate', 'Annual Rt', '$,.2f')])
+    fig = px.scatter(df, x=..., y=..., custom_data=columns)
+    fig.update_traces(hovertemplate=template)
+"""
+import numpy as np
+import pandas as pd
+
+# Shown for text fields with no value
+MISSING = 'N/A'
+
+
+def hover_template(fields, title=None):
+    """
+    Customdata columns and the hovertemplate that shows them.
+
+    Args:
+        fields (list[tuple]): One (label, column) or (label, column, format) per line,
+            format being a d3-format spec such as ',.2f' or '$,.0f'.
+        title (str): Column shown in bold above the fields, e.g. a name.
+
+    Returns:
+        (list[str], str): Columns to pass as custom_data, in order, and the hovertemplate.
+    """
+    columns, lines = [], []
+    if title is not None:
+        columns.append(title)
+        lines.append('<b>%{customdata[0]}</b>')
+    for label, column, *spec in fields:
+        value = f'customdata[{len(columns)}]' + (f':{spec[0]}' if spec else '')
+        columns.append(column)
+        lines.append(f'{label}: %{{{value}}}')
+    # <extra></extra> drops the secondary box with the trace name
+    return columns, '<br>'.join(lines) + '<extra></extra>'
+
+
+def fill_missing(df, columns, missing=MISSING):
+    """Copy of df with missing values in its text columns among columns replaced by missing."""
+    text = [column for column in dict.fromkeys(columns) if not pd.api.types.is_numeric_dtype(df[column])]
+    df = df.copy()
+    for column in text:
+        df[column] = df[column].astype(object).where(df[column].notna(), missing)
+    return df
+
+
+def labels(mask, true_label, false_label):
+    """Text label of each value of a boolean column, e.g. 'Male'/'Female' for Sex_M."""
+    return pd.Series(np.where(np.asarray(mask, dtype=bool), true_label, false_label),
+                     index=getattr(mask, 'index', None))
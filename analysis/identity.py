@@ -0,0 +1,330 @@
+"""
+Identity resolution for officers across the earnings reports, roster and overtime ledgers.
+
+The roster and both overtime ledgers carry the 6-digit employee ID; the earnings reports
+only have a 'Last,First M' name. The index is built once from every (ID, name) pair in
+the roster and ledgers, with names normalized to an upper-case (last, first) key, and
+resolves any frame to an EMPLOYEE_ID column: by ID where the frame has one, otherwise by
+a name key that belongs to exactly one ID, or failing that by the key with the middle
+initial, which the earnings and ledger names often carry. Lookups are dict hits and bulk
+resolution is a vectorized map, so joins never scan one table per row of another.
+
+Every pair also records the officer's RANK on the shared scale of ranks.py, from the
+roster's job title or a ledger's RANK code.
+
+Names that still do not resolve can be linked fuzzily (see linkage.py), catching
+suffixes, padding and spelling variants; for frames with a rank or job title, only among
+officers who held the same rank. Every resolved row gets a MATCH quality: 'id',
+'name', 'fuzzy', 'ambiguous' (the name belongs to several IDs) or 'unmatched', and a
+MATCH_SCORE (1 for exact matches, the linkage score for fuzzy ones).
+"""
+import os
+import sys
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'overtime'))
+from ledger import DATA_DIR, iter_ledger
+from linkage import MIN_SCORE, best_links, link, parse_names
+from ranks import encode_rank_codes, encode_titles
+
+ROSTER_PATH = DATA_DIR / 'roster' / 'bpd-roster-2020.csv'
+LEDGERS = ['overtime', 'courtot']
+
+MATCH_QUALITIES = ['id', 'name', 'fuzzy', 'ambiguous', 'unmatched']
+
+# Columns holding an officer's rank, and their encoding onto ranks.RANKS
+RANK_COLUMNS = {'RANK': encode_rank_codes, 'TITLE': encode_titles, 'Job Title': encode_titles}
+
+
+def normalize_ids(ids):
+    """Employee IDs as 6-digit strings, whether they were read as text or as numbers."""
+    ids = pd.Series(ids)
+    text = ids.astype(str).str.strip().str.replace(r'\.0$', '', regex=True)
+    return text.str.zfill(6).where(ids.notna())
+
+
+def name_keys(last, first, initial=False):
+    """
+    Normalized 'LAST|FIRST' keys: upper case, stripped, first given name only.
+
+    With initial=True the keys are 'LAST|FIRST|M' with the middle initial, and missing
+    for names without one.
+    """
+    last = pd.Series(last, dtype=object).str.strip().str.upper()
+    given = pd.Series(first, dtype=object).str.strip().str.upper().str.split()
+    keys = last + '|' + given.str[0].values
+    if initial:
+        initials = given.str[1].fillna('').astype(str).str[:1]
+        keys = keys + '|' + initials.where(initials != '').values
+    return keys.where(keys.notna())
+
+
+def split_names(names):
+    """Split 'Last,First M' names into (last, first) Series."""
+    parts = pd.Series(names, dtype=object).str.split(',', n=1, expand=True)
+    if parts.shape[1] < 2:
+        parts[1] = None
+    return parts[0], parts[1]
+
+
+class IdentityIndex:
+    """(ID, name) pairs from every source, with O(1) lookups and bulk resolution."""
+
+    def __init__(self, pairs):
+        """
+        Args:
+            pairs (pd.DataFrame): ID, KEY, INITIAL_KEY (see name_keys), RANK (index into
+                ranks.RANKS) and SOURCE columns, one row per distinct combination.
+        """
+        self.pairs = pairs.dropna(subset=['ID']).drop_duplicates(ignore_index=True)
+        self._by_id = {}
+        for employee_id, key, source in self.pairs[['ID', 'KEY', 'SOURCE']].itertuples(index=False):
+            record = self._by_id.setdefault(employee_id, {'keys': set(), 'sources': set()})
+            if isinstance(key, str):
+                record['keys'].add(key)
+            record['sources'].add(source)
+        self._name_maps = {}
+        self._candidates = {}
+
+    @classmethod
+    def build(cls, roster_path=ROSTER_PATH, ledgers=LEDGERS, years=None):
+        """Collect the (ID, name) pairs of the roster and the ledgers."""
+        frames = []
+        if roster_path is not None:
+            roster = pd.read_csv(roster_path, dtype=str, usecols=['ID', 'Last', 'First Name', 'Job Title'])
+            frames.append(pd.DataFrame({
+                'ID': normalize_ids(roster['ID']),
+                'KEY': name_keys(roster['Last'], roster['First Name']),
+                'INITIAL_KEY': name_keys(roster['Last'], roster['First Name'], initial=True),
+                'RANK': encode_titles(roster['Job Title']),
+                'SOURCE': 'roster',
+            }))
+        for dataset in ledgers:
+            for year, df in iter_ledger(dataset, years, ['ID', 'NAME', 'RANK']):
+                # the ledgers repeat each officer on every row, so dedupe on the categorical codes first
+                codes = pd.DataFrame({col: df[col].cat.codes for col in ['ID', 'NAME', 'RANK']}).drop_duplicates()
+                values = {}
+                for col in codes:
+                    categories = df[col].cat.categories.to_numpy(dtype=object)
+                    values[col] = np.where(codes[col] >= 0, categories[codes[col]], None)
+                last, first = split_names(values['NAME'])
+                frames.append(pd.DataFrame({
+                    'ID': normalize_ids(values['ID']).to_numpy(),
+                    'KEY': name_keys(last, first).to_numpy(),
+                    'INITIAL_KEY': name_keys(last, first, initial=True).to_numpy(),
+                    'RANK': encode_rank_codes(values['RANK']).to_numpy(),
+                    'SOURCE': dataset,
+                }))
+        return cls(pd.concat(frames, ignore_index=True))
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __contains__(self, employee_id):
+        return employee_id in self._by_id
+
+    def lookup(self, employee_id):
+        """The name keys and sources seen for an ID, or None if it is unknown."""
+        return self._by_id.get(normalize_ids([employee_id]).iloc[0])
+
+    def find(self, name=None, last=None, first=None, within=None):
+        """
+        The ID a 'Last,First M' name (or last and first) belongs to.
+
+        Returns None when the name is unknown or shared by several IDs.
+        """
+        if name is not None:
+            last, first = split_names([name])
+        else:
+            last, first = [last], [first]
+        resolved = self._match_names(last, first, within)[0]
+        return resolved.iloc[0] if resolved.notna().iloc[0] else None
+
+    def _ids_within(self, within):
+        """Pairs of the IDs seen in a source (with their names from every source), or all pairs."""
+        if within is None:
+            return self.pairs
+        return self.pairs[self.pairs['ID'].isin(self.pairs.loc[self.pairs['SOURCE'] == within, 'ID'])]
+
+    def _name_map(self, column, within=None):
+        """
+        ({key: ID} for keys of a single ID, set of keys shared by several IDs).
+
+        With within, only IDs seen in that source are candidates, though their names
+        may come from any source.
+        """
+        if (column, within) not in self._name_maps:
+            pairs = self._ids_within(within).dropna(subset=[column])
+            ids_per_key = pairs.drop_duplicates([column, 'ID']).groupby(column)['ID']
+            counts = ids_per_key.size()
+            unique = ids_per_key.first()[counts == 1].to_dict()
+            self._name_maps[column, within] = (unique, set(counts.index[counts > 1]))
+        return self._name_maps[column, within]
+
+    def _match_names(self, last, first, within=None):
+        """IDs of names (missing where unresolved) and a mask of the names shared by several IDs."""
+        keys = name_keys(last, first)
+        unique, ambiguous = self._name_map('KEY', within)
+        employee_ids = keys.map(unique)
+        shared = keys.isin(ambiguous)
+        # a shared name can still be told apart by the middle initial
+        initial_unique, _ = self._name_map('INITIAL_KEY', within)
+        by_initial = name_keys(last, first, initial=True).map(initial_unique)
+        employee_ids = employee_ids.where(~shared, by_initial)
+        return employee_ids, shared & employee_ids.isna()
+
+    def _fuzzy_candidates(self, within=None):
+        """Every distinct parsed name of the candidate IDs, with its ID and rank."""
+        if within not in self._candidates:
+            pairs = self._ids_within(within).dropna(subset=['KEY'])
+            names = pairs['KEY'].str.split('|', expand=True)
+            parsed = parse_names(names[0], names[1])
+            parsed['INITIAL'] = pairs['INITIAL_KEY'].str.split('|').str[2].fillna('').to_numpy()
+            parsed['ID'] = pairs['ID'].to_numpy()
+            parsed['RANK'] = pairs['RANK'].to_numpy()
+            self._candidates[within] = parsed.drop_duplicates(ignore_index=True)
+        return self._candidates[within]
+
+    def _fuzzy_match(self, last, first, within=None, exclude=(), min_score=MIN_SCORE, ranks=None):
+        """
+        Link names to IDs fuzzily, one-to-one; with ranks (indices into ranks.RANKS, one
+        per name), only to IDs that held the same rank in some source.
+
+        Returns:
+            tuple[pd.Series, pd.Series]: The linked ID (missing where none is clearly
+            best) and its score, by position of the names.
+        """
+        candidates = self._fuzzy_candidates(within)
+        candidates = candidates[~candidates['ID'].isin(exclude)].reset_index(drop=True)
+        left_blocks, right_blocks = ([ranks], [candidates['RANK']]) if ranks is not None else (None, None)
+        links = link(parse_names(last, first), candidates, left_blocks, right_blocks, min_score=min_score)
+        links['ID'] = candidates['ID'].to_numpy()[links['RIGHT'].to_numpy(dtype=int)]
+
+        # an ID's several spellings count once, then each name and each ID gets one link
+        links = links.drop_duplicates(['LEFT', 'ID'])
+        links = best_links(best_links(links, 'LEFT', 'ID'), 'ID', 'LEFT')
+        employee_ids = pd.Series(None, index=range(len(last)), dtype=object)
+        scores = pd.Series(np.nan, index=range(len(last)))
+        employee_ids[links['LEFT'].to_numpy()] = links['ID'].to_numpy()
+        scores[links['LEFT'].to_numpy()] = links['SCORE'].to_numpy()
+        return employee_ids, scores
+
+    def resolve(self, df, id_column=None, name_column=None, last_column=None, first_column=None, within=None,
+                fuzzy=False, min_score=MIN_SCORE, rank_column=None):
+        """
+        Add EMPLOYEE_ID, MATCH and MATCH_SCORE columns to a copy of df.
+
+        The columns default to what the sources use: 'ID', then 'NAME' ('Last,First M'),
+        then the roster's 'Last' and 'First Name'.
+
+        Args:
+            df (pd.DataFrame): Rows to resolve.
+            id_column (str): Column of employee IDs, used wherever it is present.
+            name_column (str): Column of 'Last,First M' names, the fallback.
+            last_column, first_column (str): Separate name columns, instead of name_column.
+            within (str): Only match names to IDs seen in this source, e.g. 'roster'.
+            fuzzy (bool): Link names that did not match exactly to the remaining IDs with
+                fuzzy record linkage. An ID is never given to two rows this way.
+            min_score (float): Lowest linkage score accepted as a fuzzy match.
+            rank_column (str): Column of job titles or ledger RANK codes (one of
+                RANK_COLUMNS). Fuzzy links must then also agree on the rank, which keeps
+                officers with similar names but different ranks apart.
+
+        Returns:
+            pd.DataFrame: df with the resolved EMPLOYEE_ID (missing when not resolved),
+            its MATCH quality and MATCH_SCORE.
+        """
+        if id_column is None and 'ID' in df.columns:
+            id_column = 'ID'
+        if name_column is None and last_column is None:
+            if 'NAME' in df.columns:
+                name_column = 'NAME'
+            elif 'Last' in df.columns and 'First Name' in df.columns:
+                last_column, first_column = 'Last', 'First Name'
+
+        resolved = df.copy()
+        employee_ids = pd.Series(None, index=df.index, dtype=object)
+        match = np.full(len(df), 'unmatched', dtype=object)
+        scores = np.full(len(df), np.nan)
+
+        if id_column is not None:
+            employee_ids = normalize_ids(df[id_column]).set_axis(df.index)
+            match[employee_ids.notna().to_numpy()] = 'id'
+
+        if name_column is not None or last_column is not None:
+            if name_column is not None:
+                last, first = split_names(df[name_column].to_numpy())
+            else:
+                last, first = df[last_column].to_numpy(), df[first_column].to_numpy()
+            by_name, ambiguous = self._match_names(last, first, within)
+            by_name, ambiguous = by_name.set_axis(df.index), ambiguous.set_axis(df.index)
+            pending = employee_ids.isna()
+            employee_ids = employee_ids.where(~pending, by_name)
+            match[(pending & by_name.notna()).to_numpy()] = 'name'
+            match[(pending & ambiguous).to_numpy()] = 'ambiguous'
+
+            pending = employee_ids.isna().to_numpy()
+            if fuzzy and pending.any():
+                ranks = None
+                if rank_column is not None:
+                    ranks = RANK_COLUMNS[rank_column](df[rank_column]).to_numpy()[pending]
+                by_link, link_scores = self._fuzzy_match(np.asarray(last, dtype=object)[pending],
+                                                         np.asarray(first, dtype=object)[pending],
+                                                         within, set(employee_ids.dropna()), min_score, ranks)
+                employee_ids[pending] = by_link.to_numpy()
+                linked = np.zeros(len(df), dtype=bool)
+                linked[pending] = by_link.notna().to_numpy()
+                match[linked] = 'fuzzy'
+                scores[pending] = link_scores.to_numpy()
+
+        scores[(match == 'id') | (match == 'name')] = 1.0
+        resolved['EMPLOYEE_ID'] = employee_ids
+        resolved['MATCH'] = match
+        resolved['MATCH_SCORE'] = scores
+        return resolved
+
+    def join(self, left, right, how='inner', left_within=None, right_within=None, fuzzy=False,
+             suffixes=('', '_right')):
+        """
+        Join two frames on their resolved employee IDs.
+
+        Each side is resolved with resolve() and its default columns, fuzzily too if
+        fuzzy is set; rows that did not resolve never match anything. Duplicate IDs on
+        the right multiply rows as in any merge.
+
+        Returns:
+            tuple[pd.DataFrame, dict]: The joined rows, and match stats per side
+            ({'left': {quality: rows}, 'right': {...}, 'joined': rows}).
+        """
+        left = self.resolve(left, within=left_within, fuzzy=fuzzy)
+        right = self.resolve(right, within=right_within, fuzzy=fuzzy)
+        joined = left.merge(right[right['EMPLOYEE_ID'].notna()].drop(columns=['MATCH', 'MATCH_SCORE']),
+                            on='EMPLOYEE_ID', how=how, suffixes=suffixes)
+        stats = {'left': match_stats(left), 'right': match_stats(right), 'joined': len(joined)}
+        return joined, stats
+
+
+def match_stats(resolved):
+    """Rows per MATCH quality of a resolved frame."""
+    counts = resolved['MATCH'].value_counts()
+    return {quality: int(counts.get(quality, 0)) for quality in MATCH_QUALITIES}
+
+
+@lru_cache(maxsize=None)
+def load_identity_index():
+    """The index over the roster and every ledger year, built once per process."""
+    return IdentityIndex.build()
+
+
+if __name__ == '__main__':
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from earnings.utils import load_earnings_data
+
+    index = load_identity_index()
+    print(f"{len(index):,} employee IDs from {index.pairs['SOURCE'].nunique()} sources")
+    police = load_earnings_data(2020, columns=['NAME', 'TITLE', 'DEPARTMENT_NAME', 'TOTAL GROSS'], departments='POLICE')
+    for within in [None, 'roster']:
+        resolved = index.resolve(police, within=within, fuzzy=True, rank_column='TITLE')
+        print(f"2020 police earnings resolved within {within or 'all sources'}: {match_stats(resolved)}")
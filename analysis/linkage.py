@@ -0,0 +1,195 @@
+"""
+Fuzzy record linkage of officer names, for the rows exact identity resolution misses.
+
+Names are parsed into last name, first name and middle initial, with generational
+suffixes (JR, III, ...), punctuation and padding removed. Candidate pairs are only formed
+within blocks of rows sharing the Soundex code of the last name (plus any extra block
+columns, e.g. a rank), so the work grows with the block sizes rather than with n*m. Every
+pair is scored at once from sparse character n-gram vectors: cosine similarity of the
+last and of the first names, plus agreement of the middle initials. When there are many
+pairs, blocks are scored in forked worker processes.
+"""
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.preprocessing import normalize
+
+SUFFIXES = {'JR', 'SR', 'II', 'III', 'IV', 'V'}
+
+# Contribution of each similarity to a pair's score
+WEIGHTS = {'LAST': 0.55, 'FIRST': 0.35, 'INITIAL': 0.10}
+
+# Links scoring below this are not reported
+MIN_SCORE = 0.85
+
+# Below this many candidate pairs scoring in one process is faster than forking
+PARALLEL_PAIRS = 200_000
+
+SOUNDEX_CODES = {letter: str(code) for code, letters in enumerate(
+    ['AEIOUYHW', 'BFPV', 'CGJKQSXZ', 'DT', 'L', 'MN', 'R']) for letter in letters}
+
+
+def _tokens(text):
+    """Upper-case words of a name part without punctuation or generational suffixes."""
+    if not isinstance(text, str):
+        return []
+    words = re.sub(r"[^A-Z\s-]", '', text.upper()).replace('-', ' ').split()
+    return [word for word in words if word not in SUFFIXES]
+
+
+def parse_names(last, first):
+    """
+    Normalize last and first name parts for linkage.
+
+    Returns:
+        pd.DataFrame: LAST (all last-name words joined, e.g. 'HICKS' for 'Hicks III'),
+        FIRST (first given name) and INITIAL (middle initial, '' if none).
+    """
+    last_words = [_tokens(text) for text in last]
+    given_words = [_tokens(text) for text in first]
+    return pd.DataFrame({
+        'LAST': [''.join(words) for words in last_words],
+        'FIRST': [words[0] if words else '' for words in given_words],
+        'INITIAL': [words[1][0] if len(words) > 1 else '' for words in given_words],
+    })
+
+
+def soundex(name):
+    """American Soundex code of a name, e.g. 'R163' for ROBERT, '' for an empty name."""
+    if not name:
+        return ''
+    digits = [SOUNDEX_CODES.get(letter, '0') for letter in name]
+    code, previous = name[0], digits[0]
+    for letter, digit in zip(name[1:], digits[1:]):
+        if digit != '0' and digit != previous:
+            code += digit
+        # H and W do not separate letters with the same code, vowels do
+        if letter not in 'HW':
+            previous = digit
+    return (code + '000')[:4]
+
+
+def block_keys(parsed, block_on=None):
+    """Blocking key of each row: the last name's Soundex code plus any extra columns."""
+    codes = parsed['LAST'].map({name: soundex(name) for name in parsed['LAST'].unique()})
+    keys = codes.to_numpy(dtype=object)
+    for values in block_on or []:
+        keys = keys + '|' + pd.Series(values).astype(str).to_numpy(dtype=object)
+    return np.where(codes.to_numpy(dtype=object) != '', keys, None)
+
+
+def candidate_pairs(left_keys, right_keys):
+    """(left positions, right positions) of every pair sharing a blocking key, grouped by block."""
+    left = pd.DataFrame({'KEY': left_keys, 'LEFT': np.arange(len(left_keys))}).dropna()
+    right = pd.DataFrame({'KEY': right_keys, 'RIGHT': np.arange(len(right_keys))}).dropna()
+    pairs = left.merge(right, on='KEY').sort_values(['KEY', 'LEFT'], kind='stable')
+    return pairs['LEFT'].to_numpy(), pairs['RIGHT'].to_numpy(), pairs['KEY'].to_numpy()
+
+
+def _ngram_vectors(left, right):
+    """L2-normalized character 2-3 gram vectors of two string columns over a shared vocabulary."""
+    vectorizer = CountVectorizer(analyzer='char_wb', ngram_range=(2, 3), binary=True, lowercase=False)
+    vectorizer.fit(np.concatenate([left, right]))
+    return normalize(vectorizer.transform(left)), normalize(vectorizer.transform(right))
+
+
+def _score(vectors, left_parsed, right_parsed, left_rows, right_rows):
+    """Similarities and weighted score of the given pairs."""
+    scores = {}
+    for part in ['LAST', 'FIRST']:
+        left_vectors, right_vectors = vectors[part]
+        scores[part] = np.asarray(left_vectors[left_rows].multiply(right_vectors[right_rows]).sum(axis=1)).ravel()
+
+    # a first name that is a prefix of the other (CHRIS / CHRISTOPHER) is nearly as good as equal
+    left_first = left_parsed['FIRST'].to_numpy(dtype=str)[left_rows]
+    right_first = right_parsed['FIRST'].to_numpy(dtype=str)[right_rows]
+    prefix = ((np.char.startswith(left_first, right_first) | np.char.startswith(right_first, left_first))
+              & (np.minimum(np.char.str_len(left_first), np.char.str_len(right_first)) >= 3))
+    scores['FIRST'] = np.where(prefix, np.maximum(scores['FIRST'], 0.9), scores['FIRST'])
+
+    # matching initials confirm, conflicting ones count against, a missing one is neutral
+    left_initial = left_parsed['INITIAL'].to_numpy(dtype=str)[left_rows]
+    right_initial = right_parsed['INITIAL'].to_numpy(dtype=str)[right_rows]
+    known = (left_initial != '') & (right_initial != '')
+    scores['INITIAL'] = np.where(known, (left_initial == right_initial).astype(float), 0.5)
+
+    scores['SCORE'] = sum(WEIGHTS[part] * scores[part] for part in WEIGHTS)
+    return scores
+
+
+# State of the current link() call, inherited by its forked workers
+_task = None
+
+
+def _score_chunk(i):
+    vectors, left_parsed, right_parsed, chunks = _task
+    left_rows, right_rows = chunks[i]
+    return _score(vectors, left_parsed, right_parsed, left_rows, right_rows)
+
+
+def link(left_parsed, right_parsed, left_blocks=None, right_blocks=None, min_score=MIN_SCORE, workers=None):
+    """
+    Score candidate links between two sets of parsed names.
+
+    Args:
+        left_parsed, right_parsed (pd.DataFrame): Names from parse_names().
+        left_blocks, right_blocks (list[array-like]): Extra blocking columns, one value
+            per row and in the same order on both sides, e.g. [rank]. Pairs must agree
+            on them as well as on the last name's Soundex code.
+        min_score (float): Drop candidate links scoring below this.
+        workers (int): Processes to score blocks in. Defaults to one per CPU when there
+            are enough pairs to be worth it; 1 scores serially.
+
+    Returns:
+        pd.DataFrame: LEFT and RIGHT row positions, the LAST, FIRST and INITIAL
+        similarities and the weighted SCORE, best links first.
+    """
+    left_parsed = left_parsed.reset_index(drop=True)
+    right_parsed = right_parsed.reset_index(drop=True)
+    left_rows, right_rows, keys = candidate_pairs(block_keys(left_parsed, left_blocks),
+                                                  block_keys(right_parsed, right_blocks))
+    columns = ['LEFT', 'RIGHT', 'LAST', 'FIRST', 'INITIAL', 'SCORE']
+    if not len(left_rows):
+        return pd.DataFrame(columns=columns)
+
+    vectors = {part: _ngram_vectors(left_parsed[part].to_numpy(dtype=str), right_parsed[part].to_numpy(dtype=str))
+               for part in ['LAST', 'FIRST']}
+
+    workers = workers or ((os.cpu_count() or 1) if len(left_rows) >= PARALLEL_PAIRS else 1)
+    if workers > 1 and 'fork' in multiprocessing.get_all_start_methods():
+        # split into one chunk of about the same number of pairs per worker, at block boundaries
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        cuts = np.searchsorted(starts, [len(keys) * i // workers for i in range(1, workers)])
+        bounds = [0] + [starts[min(cut, len(starts) - 1)] for cut in cuts] + [len(keys)]
+        chunks = [(left_rows[a:b], right_rows[a:b]) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+        global _task
+        _task = (vectors, left_parsed, right_parsed, chunks)
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            parts = list(pool.map(_score_chunk, range(len(chunks))))
+        _task = None
+        scores = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+    else:
+        scores = _score(vectors, left_parsed, right_parsed, left_rows, right_rows)
+
+    links = pd.DataFrame({'LEFT': left_rows, 'RIGHT': right_rows, **scores})[columns]
+    links = links[links['SCORE'] >= min_score]
+    return links.sort_values('SCORE', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def best_links(links, by='LEFT', target='RIGHT'):
+    """
+    Keep each row's single best link.
+
+    A row whose best score is shared by links to different targets is left unlinked,
+    since the names cannot tell those targets apart.
+    """
+    top = links.groupby(by)['SCORE'].transform('max')
+    best = links[links['SCORE'] == top].drop_duplicates([by, target])
+    ties = best[by].duplicated(keep=False)
+    return best[~ties].reset_index(drop=True)
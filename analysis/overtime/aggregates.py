@@ -0,0 +1,161 @@
+"""
+Per-employee overtime aggregates.
+
+Materializes the sum and count of OTHOURS per (YEAR, ID, RANK, ASSIGNED, TYPE) from the
+ledger store into data/.cache/aggregates/<dataset>/<year>/, maintained incrementally:
+a year is recomputed only when its ledger partition changes, and when rows were only
+appended to a year's CSV just those rows are aggregated and folded into the stored sums.
+Rows with a missing key are kept as a group of their own, as in ledger.aggregate_ledger.
+
+Run `python analysis/overtime/aggregates.py` to bring every year up to date.
+"""
+import json
+import os
+import sys
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from ledger import CACHE_DIR, LEDGER_DIR, LEDGER_VERSION, ingest, read_columns, write_columns
+
+AGGREGATES_DIR = CACHE_DIR / 'aggregates'
+MANIFEST_PATH = AGGREGATES_DIR / 'manifest.json'
+AGGREGATES_VERSION = 2
+
+# Grouping keys of the aggregate table; datasets without some of them use the rest
+AGGREGATE_KEYS = ['ID', 'RANK', 'ASSIGNED', 'TYPE']
+
+
+def _read_manifest():
+    if MANIFEST_PATH.exists():
+        with open(MANIFEST_PATH) as f:
+            manifest = json.load(f)
+        # a new ledger format invalidates every aggregate built from the old one
+        if (manifest.get('version'), manifest.get('ledger_version')) == (AGGREGATES_VERSION, LEDGER_VERSION):
+            return manifest
+    return {'version': AGGREGATES_VERSION, 'ledger_version': LEDGER_VERSION, 'datasets': {}}
+
+
+def _write_manifest(manifest):
+    AGGREGATES_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = MANIFEST_PATH.with_suffix('.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def _aggregate(columns, keys, start=0):
+    """Sum and count OTHOURS per key over the ledger rows from start onwards."""
+    hours = pd.Series(np.asarray(columns['OTHOURS'][start:], dtype=np.float64))
+    # grouping by a list of as many Categoricals as there are rows is ambiguous to pandas,
+    # so the keys are grouped by as the columns of one frame
+    keyed = pd.DataFrame({key: columns[key][start:] for key in keys})
+    groups = hours.groupby([keyed[key] for key in keys], observed=True, dropna=False)
+    sums = pd.DataFrame({'OTHOURS': groups.sum(), 'N': groups.size()}).reset_index()
+    sums.columns = keys + ['OTHOURS', 'N']
+    return sums
+
+
+def _merge(stored, appended, keys):
+    """Fold the aggregates of newly appended rows into the stored aggregates."""
+    combined = {}
+    for key in keys:
+        combined[key] = union_categoricals([stored[key], pd.Categorical(appended[key])])
+    combined['OTHOURS'] = np.concatenate([stored['OTHOURS'], appended['OTHOURS'].to_numpy()])
+    combined['N'] = np.concatenate([stored['N'], appended['N'].to_numpy()])
+    merged = pd.DataFrame(combined).groupby(keys, observed=True, dropna=False)[['OTHOURS', 'N']].sum()
+    return merged.reset_index()
+
+
+def update_aggregates(dataset='overtime', years=None, force=False):
+    """
+    Bring the aggregate table of a ledger up to date.
+
+    Args:
+        dataset (str): Ledger dataset to aggregate.
+        years (iterable[int]): Only update these years. Every stored year by default.
+        force (bool): Recompute years even if their ledger partition is unchanged.
+
+    Returns:
+        dict: {year: manifest entry} for the dataset.
+    """
+    ledger_entries = ingest([dataset], years)['datasets'].get(dataset, {})
+    manifest = _read_manifest()
+    entries = manifest['datasets'].setdefault(dataset, {})
+    changed = False
+
+    for year, ledger_entry in sorted(ledger_entries.items()):
+        if years is not None and int(year) not in years:
+            continue
+        entry = entries.get(year)
+        if not force and entry is not None and entry['sha1'] == ledger_entry['sha1']:
+            continue
+
+        keys = [key for key in AGGREGATE_KEYS if key in ledger_entry['columns']]
+        ledger = read_columns(LEDGER_DIR / dataset / year, ledger_entry['columns'], keys + ['OTHOURS'])
+        path = AGGREGATES_DIR / dataset / year
+        appended_to = ledger_entry.get('appended_to')
+
+        if not force and entry is not None and appended_to and appended_to['sha1'] == entry['sha1']:
+            print(f"Folding {ledger_entry['rows'] - entry['rows']} new {dataset} {year} rows into the aggregates")
+            stored = read_columns(path, entry['columns'])
+            sums = _merge(stored, _aggregate(ledger, keys, start=entry['rows']), keys)
+        else:
+            print(f"Aggregating {dataset} {year}")
+            sums = _aggregate(ledger, keys)
+
+        columns = {key: pd.Categorical(sums[key]) for key in keys}
+        columns['OTHOURS'] = sums['OTHOURS'].to_numpy(dtype=np.float64)
+        columns['N'] = sums['N'].to_numpy(dtype=np.int64)
+        entries[year] = {
+            'sha1': ledger_entry['sha1'],
+            'rows': ledger_entry['rows'],
+            'groups': len(sums),
+            'columns': write_columns(path, columns),
+        }
+        changed = True
+
+    if changed or not MANIFEST_PATH.exists():
+        _write_manifest(manifest)
+    return entries
+
+
+def load_aggregates(dataset='overtime', years=None, by=None):
+    """
+    Load the overtime aggregates with a YEAR column, updating stale years first.
+
+    Args:
+        dataset (str): Ledger dataset.
+        years (iterable[int]): Years to load. Every stored year by default.
+        by (list[str]): Re-group each year to these keys (a subset of AGGREGATE_KEYS).
+            By default the full (ID, RANK, ASSIGNED, TYPE) grouping is returned.
+
+    Returns:
+        pd.DataFrame: One row per (YEAR, *keys) with the OTHOURS sum and row count N.
+    """
+    entries = update_aggregates(dataset, years)
+    wanted = sorted(int(year) for year in entries) if years is None else list(years)
+
+    frames = []
+    for year in wanted:
+        entry = entries.get(str(year))
+        if entry is None:
+            raise FileNotFoundError(f"No {dataset} ledger for {year}")
+        df = pd.DataFrame(read_columns(AGGREGATES_DIR / dataset / str(year), entry['columns']))
+        if by is not None:
+            df = df.groupby(list(by), observed=True, dropna=False)[['OTHOURS', 'N']].sum().reset_index()
+        frames.append(df.assign(YEAR=year))
+    if not frames:
+        return pd.DataFrame(columns=['YEAR'] + list(by or AGGREGATE_KEYS) + ['OTHOURS', 'N'])
+
+    df = pd.concat(frames, ignore_index=True)
+    return df[['YEAR'] + [col for col in df.columns if col != 'YEAR']]
+
+
+if __name__ == '__main__':
+    for dataset in ['overtime', 'courtot']:
+        entries = update_aggregates(dataset)
+        groups = sum(entry['groups'] for entry in entries.values())
+        rows = sum(entry['rows'] for entry in entries.values())
+        print(f"{dataset}: {rows:,} ledger rows -> {groups:,} aggregate rows")
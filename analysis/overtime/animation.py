@@ -0,0 +1,190 @@
+"""
+Streaming animations of distributions that change over time.
+
+The histograms of every frame are counted in one pass over shared bin edges into a
+(frames, bins) array. Rendering draws the axes, grid and labels once; each frame then
+only restores that background, updates the bar heights, marker lines, title and legend
+in place and redraws those artists (blitting), and its pixels go straight to the encoder.
+Frames are written as they are drawn, so memory does not grow with the number of frames.
+
+GIFs are encoded with Pillow, every frame against the first frame's palette and cropped
+to the pixels that changed since the previous one. Any other
+extension (e.g. .mp4) is piped to ffmpeg, which must then be installed.
+"""
+import os
+import shutil
+import subprocess
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from PIL import GifImagePlugin, Image
+
+
+def histogram_frames(values, frames, bins=50, value_range=None):
+    """
+    Normalized histograms of values for each frame, over bin edges shared by all frames.
+
+    Args:
+        values (array-like): Observations of all frames.
+        frames (array-like): Frame index (0, 1, ...) of each observation.
+        bins (int): Number of bins.
+        value_range (tuple): (low, high) of the bins. The range of values by default.
+
+    Returns:
+        (np.ndarray, np.ndarray): The bins + 1 edges and a (frames, bins) array of
+        densities, each row integrating to 1 like np.histogram(..., density=True).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    frames = np.asarray(frames, dtype=np.int64)
+    edges = np.histogram_bin_edges(values, bins, value_range)
+    inside = (values >= edges[0]) & (values <= edges[-1])
+    # the last bin includes its right edge, as in np.histogram
+    positions = np.minimum(np.searchsorted(edges, values[inside], side='right') - 1, bins - 1)
+    count = frames.max() + 1 if len(frames) else 0
+    counts = np.bincount(frames[inside] * bins + positions, minlength=count * bins).reshape(count, bins)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        densities = counts / counts.sum(axis=1, keepdims=True) / np.diff(edges)
+    return edges, np.nan_to_num(densities)
+
+
+class GifWriter:
+    """Writes RGB(A) frames to a looping GIF as they are added."""
+
+    def __init__(self, path, fps):
+        self.path = path
+        self.duration = int(round(1000 / fps))
+        self._tmp_path = f'{path}.{os.getpid()}.tmp'
+        self._file = None
+        self._palette = None
+        self._previous = None
+
+    def write(self, rgba):
+        image = Image.fromarray(np.asarray(rgba)[..., :3])
+        if self._palette is None:
+            frame = image.quantize(256)
+            # getheader may reorder the palette, so later frames are matched to frame afterwards
+            header, _ = GifImagePlugin.getheader(frame, info={'loop': 0, 'duration': self.duration})
+            self._palette = frame
+            self._file = open(self._tmp_path, 'wb')
+            self._file.write(b''.join(header))
+            box = (0, 0) + frame.size
+        else:
+            frame = image.quantize(palette=self._palette, dither=Image.Dither.NONE)
+            # only the pixels that changed since the previous frame are encoded
+            changed = np.asarray(frame) != self._previous
+            rows, columns = np.flatnonzero(changed.any(axis=1)), np.flatnonzero(changed.any(axis=0))
+            box = (columns[0], rows[0], columns[-1] + 1, rows[-1] + 1) if len(rows) else (0, 0, 1, 1)
+        self._previous = np.asarray(frame)
+        self._file.write(b''.join(GifImagePlugin.getdata(frame.crop(box), offset=box[:2], duration=self.duration)))
+
+    def close(self):
+        if self._file is not None:
+            self._file.write(b';')
+            self._file.close()
+            os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        if self._file is not None:
+            self._file.close()
+            os.remove(self._tmp_path)
+
+
+class FFmpegWriter:
+    """Pipes RGBA frames to ffmpeg, which encodes them by the output extension."""
+
+    def __init__(self, path, fps):
+        if shutil.which('ffmpeg') is None:
+            raise RuntimeError(f"Writing {path} needs ffmpeg on the PATH; use a .gif path instead")
+        self.path = path
+        self.fps = fps
+        self._process = None
+
+    def write(self, rgba):
+        rgba = np.asarray(rgba)
+        if self._process is None:
+            height, width = rgba.shape[:2]
+            self._process = subprocess.Popen([
+                'ffmpeg', '-y', '-loglevel', 'error',
+                '-f', 'rawvideo', '-pix_fmt', 'rgba', '-s', f'{width}x{height}', '-r', str(self.fps), '-i', '-',
+                # yuv420p (playable everywhere) needs even dimensions
+                '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p', self.path,
+            ], stdin=subprocess.PIPE)
+        self._process.stdin.write(rgba.tobytes())
+
+    def close(self):
+        if self._process is not None:
+            self._process.stdin.close()
+            if self._process.wait():
+                raise RuntimeError(f"ffmpeg failed writing {self.path}")
+
+    def abort(self):
+        if self._process is not None:
+            self._process.kill()
+            self._process.wait()
+
+
+def open_writer(path, fps):
+    """Frame writer for path: a GifWriter for .gif files, an FFmpegWriter otherwise."""
+    return GifWriter(path, fps) if str(path).lower().endswith('.gif') else FFmpegWriter(path, fps)
+
+
+def save_histogram_animation(path, edges, densities, titles, markers=None, xlabel=None, ylabel=None,
+                             fps=2, figsize=(10, 5), dpi=100):
+    """
+    Animate precomputed histograms, one frame per row of densities, streaming each frame
+    to path.
+
+    Args:
+        path (str | Path): Output .gif, or any format ffmpeg writes (e.g. .mp4).
+        edges, densities: Bin edges and per-frame densities from histogram_frames().
+        titles (list[str]): Axes title of each frame.
+        markers (dict): Vertical lines per frame, {label: (color, values)}, e.g. the
+            mean of every frame. The legend shows each line's current value.
+        xlabel, ylabel (str): Axis labels.
+        fps (float): Frames per second.
+    """
+    markers = markers or {}
+    fig = plt.figure(figsize=figsize, dpi=dpi)
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+
+    bars = ax.bar(edges[:-1], densities[0], width=np.diff(edges), align='edge',
+                  edgecolor='black', alpha=0.7, animated=True)
+    lines = {label: ax.axvline(values[0], color=color, linestyle='dashed', linewidth=2, animated=True,
+                               label=f"{label}: {values[0]:.2f}")
+             for label, (color, values) in markers.items()}
+    ax.set_xlim(edges[0], edges[-1])
+    ax.set_ylim(0, densities.max() or 1)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.grid(True)
+    title = ax.set_title(titles[0], animated=True)
+    legend = ax.legend() if lines else None
+    if legend is not None:
+        legend.set_animated(True)
+
+    # everything that does not change between frames is drawn once
+    canvas.draw()
+    background = canvas.copy_from_bbox(fig.bbox)
+    animated = list(bars) + list(lines.values()) + [title] + ([legend] if legend is not None else [])
+
+    writer = open_writer(path, fps)
+    try:
+        for i in range(len(densities)):
+            canvas.restore_region(background)
+            for bar, height in zip(bars, densities[i]):
+                bar.set_height(height)
+            for text, (label, (color, values)) in zip(legend.get_texts() if legend is not None else [], markers.items()):
+                lines[label].set_xdata([values[i], values[i]])
+                text.set_text(f"{label}: {values[i]:.2f}")
+            title.set_text(titles[i])
+            for artist in animated:
+                ax.draw_artist(artist)
+            writer.write(canvas.buffer_rgba())
+    except BaseException:
+        writer.abort()
+        raise
+    else:
+        writer.close()
+    finally:
+        plt.close(fig)
@@ -0,0 +1,152 @@
+"""
+Court overtime minimum pay.
+
+Court appearances and records request work are paid a minimum number of hours: WRKDHRS
+is the time actually worked and OTHOURS the time paid, so half an hour in court is paid
+as 4. premium_tables() measures the PREMIUM, the hours paid beyond those worked, per
+officer, unit, event code (OTCODE) and month of both ledgers.
+
+All four tables come from one pass over the ledger partitions: the rows of a partition
+are binned by the integer codes of each dimension with np.bincount, and only those
+per-key sums are combined across partitions. top_k() picks the largest rows with
+np.argpartition and sorts only those.
+
+Run `python analysis/overtime/court_premium.py` to print the officers and event codes
+with the largest premium and write every table to csv/court_premium.csv.
+"""
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from ledger import iter_ledger
+
+# Ledgers with both hours worked (WRKDHRS) and hours paid (OTHOURS)
+PREMIUM_LEDGERS = ['courtot', 'policerequests']
+
+# Key column of every dimension and the column labelling its keys, if any
+DIMENSIONS = {
+    'officer': ('ID', 'NAME'),
+    'unit': ('ASSIGNED_DESC', None),
+    'code': ('OTCODE', 'DESCRIPTION'),
+    'month': ('OTDATE', None),
+}
+
+SUM_COLUMNS = ['ROWS', 'MINIMUM_ROWS', 'WRKDHRS', 'OTHOURS']
+
+
+def _dimension_codes(df, column):
+    """Integer code of every row (-1 where missing) and the key of every code."""
+    if column == 'OTDATE':
+        months = df['OTDATE'].to_numpy().astype('datetime64[M]')
+        keys, codes = np.unique(months, return_inverse=True)
+        return np.where(np.isnat(months), -1, codes.ravel()), keys.astype(str)
+    categorical = pd.Categorical(df[column])
+    return categorical.codes, categorical.categories.to_numpy(dtype=str)
+
+
+def _partition_sums(df, column, label):
+    """Hours worked and paid per key of one dimension over one partition."""
+    worked = df['WRKDHRS'].to_numpy(dtype=np.float64)
+    paid = df['OTHOURS'].to_numpy(dtype=np.float64)
+    codes, keys = _dimension_codes(df, column)
+    valid = (codes >= 0) & np.isfinite(worked) & np.isfinite(paid)
+    codes, worked, paid = codes[valid], worked[valid], paid[valid]
+
+    n = len(keys)
+    sums = pd.DataFrame({
+        'KEY': keys,
+        'ROWS': np.bincount(codes, minlength=n),
+        'MINIMUM_ROWS': np.bincount(codes, paid > worked, minlength=n).astype(np.int64),
+        'WRKDHRS': np.bincount(codes, worked, minlength=n),
+        'OTHOURS': np.bincount(codes, paid, minlength=n),
+    })
+    if label is not None:
+        # the label of the first row of each key, e.g. an officer's name
+        present, first = np.unique(codes, return_index=True)
+        labels = np.full(n, None, dtype=object)
+        labels[present] = np.asarray(df[label])[valid][first]
+        sums['LABEL'] = labels
+    return sums[sums['ROWS'] > 0]
+
+
+def _with_premium(table):
+    table['PREMIUM'] = table['OTHOURS'] - table['WRKDHRS']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        table['PAID_PER_WORKED'] = table['OTHOURS'] / table['WRKDHRS']
+    return table
+
+
+def premium_tables(datasets=None, years=None):
+    """
+    Hours worked, hours paid and the premium between them per officer, unit, event code
+    and month.
+
+    Args:
+        datasets (list[str]): Ledgers to read. PREMIUM_LEDGERS by default.
+        years (iterable[int]): Years to read. Every stored year by default.
+
+    Returns:
+        dict: {dimension: pd.DataFrame} for every dimension of DIMENSIONS, with one row
+        per DATASET and KEY (and the key's LABEL where the dimension has one): ROWS,
+        MINIMUM_ROWS (rows paid more than worked), WRKDHRS, OTHOURS, PREMIUM and
+        PAID_PER_WORKED.
+    """
+    columns = ['WRKDHRS', 'OTHOURS'] + [col for pair in DIMENSIONS.values() for col in pair if col]
+    parts = {dimension: [] for dimension in DIMENSIONS}
+    for dataset in datasets or PREMIUM_LEDGERS:
+        for year, df in iter_ledger(dataset, years, columns):
+            for dimension, (column, label) in DIMENSIONS.items():
+                parts[dimension].append(_partition_sums(df, column, label).assign(DATASET=dataset))
+
+    tables = {}
+    for dimension, (_, label) in DIMENSIONS.items():
+        combined = pd.concat(parts[dimension], ignore_index=True)
+        aggregations = dict.fromkeys(SUM_COLUMNS, 'sum')
+        if label is not None:
+            aggregations['LABEL'] = 'first'
+        table = combined.groupby(['DATASET', 'KEY'], sort=True).agg(aggregations).reset_index()
+        tables[dimension] = _with_premium(table)
+    return tables
+
+
+def across_datasets(table):
+    """One row per key, summing its rows of every ledger."""
+    aggregations = dict.fromkeys(SUM_COLUMNS, 'sum')
+    if 'LABEL' in table:
+        aggregations['LABEL'] = 'first'
+    return _with_premium(table.groupby('KEY', sort=False).agg(aggregations).reset_index())
+
+
+def top_k(table, k=20, column='PREMIUM'):
+    """The k rows of table with the largest column, largest first."""
+    values = table[column].to_numpy(dtype=np.float64)
+    values = np.where(np.isnan(values), -np.inf, values)
+    if k < len(values):
+        # only the k largest are sorted
+        candidates = np.argpartition(-values, k - 1)[:k]
+    else:
+        candidates = np.arange(len(values))
+    return table.iloc[candidates[np.argsort(-values[candidates], kind='stable')]].reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    tables = premium_tables()
+
+    officers = across_datasets(tables['officer'])
+    print("Officers with the most court and records request hours paid beyond hours worked:")
+    for row in top_k(officers, 10).itertuples():
+        print(f"  {row.KEY} {str(row.LABEL).strip():<30} {row.PREMIUM:>8,.1f} premium hours "
+              f"({row.OTHOURS:,.1f} paid for {row.WRKDHRS:,.1f} worked)")
+
+    print("\nEvent codes by premium:")
+    for row in top_k(tables['code'], 10).itertuples():
+        print(f"  {row.DATASET:<15} {row.KEY} {str(row.LABEL):<22} {row.PREMIUM:>10,.1f} "
+              f"x{row.PAID_PER_WORKED:.2f} paid per hour worked, {row.MINIMUM_ROWS / row.ROWS:.0%} at the minimum")
+
+    output_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'csv', 'court_premium.csv')
+    pd.concat([table.assign(DIMENSION=dimension) for dimension, table in tables.items()], ignore_index=True)[
+        ['DIMENSION', 'DATASET', 'KEY', 'LABEL'] + SUM_COLUMNS + ['PREMIUM', 'PAID_PER_WORKED']
+    ].to_csv(output_path, index=False, float_format='%.2f')
+    print(f"\nPremium tables written to {output_path}")
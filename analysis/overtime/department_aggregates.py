@@ -0,0 +1,109 @@
+"""
+Prebuilt department aggregates for the overtime-ratio dashboard.
+
+The dashboard's default view shows two numbers per department: the average overtime
+percentage of gross pay (averaged per year, then across years) and the total overtime
+earned. They are rolled up from the earnings cube (see earnings_cube.py) and stored as
+.npy arrays under data/.cache/dashboard/, each sorted by its metric so a range filter is
+two binary searches. The artifact is rebuilt only when a source report changes.
+
+Run `python analysis/overtime/department_aggregates.py` to build it ahead of serving.
+"""
+import json
+import os
+import sys
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from earnings_cube import CACHE_DIR, EarningsCube, source_stats
+from earnings.utils import file_sha1
+
+AGGREGATES_DIR = CACHE_DIR / 'dashboard'
+META_PATH = AGGREGATES_DIR / 'meta.json'
+AGGREGATES_VERSION = 2
+
+# Average overtime percentage, and total overtime earned
+METRICS = ['avg', 'total']
+
+
+def department_values(cube, metric, years=None, titles=None):
+    """
+    Compute a dashboard metric per department from the cube.
+
+    Args:
+        cube (EarningsCube): The earnings cube.
+        metric (str): One of METRICS.
+        years, titles (iterable): Restrict to these years and titles. Everything by default.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Department names and values, sorted by value ascending.
+    """
+    if metric == 'avg':
+        # Mean overtime percentage per department for each year, then averaged across the years
+        per_year = cube.rollup(['YEAR', 'DEPARTMENT_NAME'], 'OVERTIME_PCT', 'mean', years=years, titles=titles)
+        table = per_year.groupby('DEPARTMENT_NAME')['OVERTIME_PCT'].mean().dropna()
+    else:
+        # Total overtime earned per department across the years
+        table = cube.rollup(['DEPARTMENT_NAME'], 'OVERTIME', 'sum', years=years, titles=titles)
+        table = table.set_index('DEPARTMENT_NAME')['OVERTIME']
+    table = table.sort_values(kind='stable')
+    return table.index.to_numpy(dtype=str), table.to_numpy(dtype=np.float64)
+
+
+def build_department_aggregates(force=False):
+    """Write the aggregates artifact unless it is already current. Returns its directory."""
+    stats = source_stats()
+    if not force and META_PATH.exists():
+        with open(META_PATH) as f:
+            meta = json.load(f)
+        if meta.get('version') == AGGREGATES_VERSION and meta.get('sources') == stats:
+            return AGGREGATES_DIR
+
+    AGGREGATES_DIR.mkdir(parents=True, exist_ok=True)
+    cube = EarningsCube()
+    arrays = {}
+    for metric in METRICS:
+        arrays[f'{metric}_names'], arrays[f'{metric}_values'] = department_values(cube, metric)
+    # each array is swapped in whole, so a serving worker never maps a half-written file
+    for name, array in arrays.items():
+        tmp_path = AGGREGATES_DIR / f'{name}.{os.getpid()}.tmp.npy'
+        np.save(tmp_path, array)
+        os.replace(tmp_path, AGGREGATES_DIR / f'{name}.npy')
+
+    tmp_path = META_PATH.with_suffix(f'.{os.getpid()}.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump({'version': AGGREGATES_VERSION, 'sources': stats}, f, indent=2)
+    os.replace(tmp_path, META_PATH)
+    return AGGREGATES_DIR
+
+
+def aggregates_etag():
+    """Short token that changes whenever the aggregates artifact is rebuilt."""
+    return file_sha1(META_PATH)[:16]
+
+
+def load_department_aggregates():
+    """
+    Memory-map the dashboard aggregates, building them first if needed.
+
+    Returns:
+        dict[str, tuple[np.ndarray, np.ndarray]]: metric -> (department names, values),
+        both ordered by value ascending.
+    """
+    path = build_department_aggregates()
+    return {
+        metric: (np.load(path / f'{metric}_names.npy', mmap_mode='r'),
+                 np.load(path / f'{metric}_values.npy', mmap_mode='r'))
+        for metric in METRICS
+    }
+
+
+def select_range(values, low, high):
+    """Slice bounds of the sorted values within [low, high], found by binary search."""
+    return np.searchsorted(values, low, side='left'), np.searchsorted(values, high, side='right')
+
+
+if __name__ == '__main__':
+    build_department_aggregates(force='--force' in sys.argv)
+    for metric, (names, values) in load_department_aggregates().items():
+        print(f"{metric}: {len(names)} departments, {values[0]:,.2f} to {values[-1]:,.2f}")
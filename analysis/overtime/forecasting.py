@@ -0,0 +1,258 @@
+"""
+Batched overtime forecasting.
+
+Overtime is forecast for many series at once: one per unit, district, rank or overtime
+type, by year or by month. The series are the rows of a (series, periods) matrix over a
+gap-free range of periods, resampled from the daily series of timeseries.py, with the
+periods no ledger covers (e.g. a missing year) left as NaN, and
+
+  - linear trends are fitted to every row at once by closed-form least squares over the
+    observed cells (a few masked matrix products, no per-series model objects);
+  - ARIMA models are fitted with statsmodels one series at a time, in forked worker
+    processes when there are many series;
+  - backtest() refits either method on each expanding window of the history and scores
+    its forecasts against the periods that actually followed.
+
+Run `python analysis/overtime/forecasting.py` to forecast every unit, district, rank and
+overtime type, yearly and monthly, into csv/overtime_forecasts.csv.
+"""
+import multiprocessing
+import os
+import sys
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from timeseries import load_daily
+
+METHODS = ['linear', 'arima']
+
+# Below this many series fitting ARIMA in one process is faster than forking
+PARALLEL_SERIES = 32
+
+# An ARIMA series needs at least this many observed periods to be fitted
+MIN_ARIMA_POINTS = 5
+
+
+def ledger_series(by, freq='year', dataset='overtime', years=None):
+    """
+    OTHOURS per key and period, as a (series, periods) matrix.
+
+    Args:
+        by (list[str]): Ledger columns identifying a series, e.g. ['ASSIGNED_DESC'].
+        freq (str): 'year' or 'month'. Monthly periods are numbered year * 12 + month - 1.
+        dataset (str): 'overtime', 'courtot' or 'policerequests'.
+        years (iterable[int]): Years to keep. Every stored year by default.
+
+    Returns:
+        (pd.DataFrame, np.ndarray, np.ndarray): The key values of each series, the
+        consecutive periods from the first to the last one the ledger covers, and the
+        (series, periods) matrix of sums: 0 where a series had no overtime, NaN in
+        periods with no ledger at all.
+    """
+    daily = load_daily(by, dataset)
+    periods, matrix = daily.resample(freq)
+    if years is not None:
+        matrix = np.where(np.isin(periods // 12 if freq == 'month' else periods, list(years)), matrix, np.nan)
+    covered = np.flatnonzero(np.isfinite(matrix).any(axis=0))
+    if not len(covered):
+        return daily.keys, np.empty(0, dtype=np.int64), np.empty((len(daily), 0))
+    span = slice(covered[0], covered[-1] + 1)
+    return daily.keys, periods[span], matrix[:, span]
+
+
+def period_labels(periods, freq='year'):
+    """Readable labels of periods: '2021' for years, '2021-03' for months."""
+    if freq == 'month':
+        return [f'{period // 12}-{period % 12 + 1:02d}' for period in periods]
+    return [str(period) for period in periods]
+
+
+def fit_linear(x, Y):
+    """
+    Least-squares line through the observed (finite) cells of every row of Y.
+
+    Args:
+        x (array-like): Position of each column, e.g. the years.
+        Y (np.ndarray): (series, periods) values, NaN where unobserved.
+
+    Returns:
+        (np.ndarray, np.ndarray): Slope and intercept of each row. A row with one
+        observation gets a flat line through it, a row with none NaNs.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    Y = np.atleast_2d(np.asarray(Y, dtype=np.float64))
+    observed = np.isfinite(Y)
+    weights = observed.astype(np.float64)
+    values = np.where(observed, Y, 0.0)
+
+    # centered positions keep the normal equations well conditioned for x around 2000
+    center = x.mean() if len(x) else 0.0
+    xc = x - center
+    n = weights.sum(axis=1)
+    sx, sxx = weights @ xc, weights @ xc ** 2
+    sy, sxy = values.sum(axis=1), values @ xc
+    with np.errstate(invalid='ignore', divide='ignore'):
+        denominator = n * sxx - sx ** 2
+        slope = np.where(denominator > 0, (n * sxy - sx * sy) / denominator, 0.0)
+        intercept = (sy - slope * sx) / n
+    slope = np.where(n > 0, slope, np.nan)
+    return slope, intercept - slope * center
+
+
+def linear_forecast(x, Y, future):
+    """(series, len(future)) values of each row's linear trend at the future positions."""
+    slope, intercept = fit_linear(x, Y)
+    return intercept[:, None] + slope[:, None] * np.asarray(future, dtype=np.float64)[None, :]
+
+
+def _arima_row(values, steps, order):
+    """Forecast of one series, NaN when it is too short or the fit fails."""
+    from statsmodels.tsa.arima.model import ARIMA
+
+    observed = np.flatnonzero(np.isfinite(values))
+    if len(observed) < MIN_ARIMA_POINTS:
+        return np.full(steps, np.nan)
+    # later gaps are handled as missing observations by the state space model
+    values = values[observed[0]:]
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            return np.asarray(ARIMA(values, order=order).fit().forecast(steps=steps))
+    except (ValueError, np.linalg.LinAlgError):
+        return np.full(steps, np.nan)
+
+
+# State of the current arima_forecast() call, inherited by its forked workers
+_task = None
+
+
+def _arima_chunk(rows):
+    Y, steps, order = _task
+    return np.array([_arima_row(Y[row], steps, order) for row in rows]).reshape(len(rows), steps)
+
+
+def arima_forecast(Y, steps, order=(1, 1, 1), workers=None):
+    """
+    ARIMA forecasts of the next steps periods of every row of Y.
+
+    Args:
+        Y (np.ndarray): (series, periods) values, NaN where unobserved.
+        steps (int): Periods to forecast after the last column.
+        order (tuple): ARIMA (p, d, q).
+        workers (int): Processes to fit in. Defaults to one per CPU when there are
+            enough series to be worth it; 1 fits serially.
+
+    Returns:
+        np.ndarray: (series, steps) forecasts; NaN for series with fewer than
+        MIN_ARIMA_POINTS observations or whose fit failed.
+    """
+    Y = np.atleast_2d(np.asarray(Y, dtype=np.float64))
+    workers = workers or ((os.cpu_count() or 1) if len(Y) >= PARALLEL_SERIES else 1)
+    if workers > 1 and 'fork' in multiprocessing.get_all_start_methods():
+        global _task
+        _task = (Y, steps, order)
+        # interleaved rows give every worker a similar mix of long and short series
+        chunks = [np.arange(i, len(Y), workers * 4) for i in range(min(len(Y), workers * 4))]
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            parts = list(pool.map(_arima_chunk, chunks))
+        _task = None
+        forecasts = np.empty((len(Y), steps))
+        for rows, part in zip(chunks, parts):
+            forecasts[rows] = part
+        return forecasts
+    return np.array([_arima_row(row, steps, order) for row in Y]).reshape(len(Y), steps)
+
+
+def forecast(x, Y, steps, method='linear', **kwargs):
+    """(series, steps) forecasts of the periods after the last column, by either method."""
+    if method == 'linear':
+        return linear_forecast(x, Y, x[-1] + np.arange(1, steps + 1))
+    if method == 'arima':
+        return arima_forecast(Y, steps, **kwargs)
+    raise ValueError(f"Unknown forecasting method {method!r}, expected one of {METHODS}")
+
+
+def backtest(x, Y, method='linear', folds=3, horizon=1, **kwargs):
+    """
+    Score a method on the history: for each of the last folds forecast origins, fit on
+    the periods before it, forecast horizon periods and compare with what followed.
+
+    Returns:
+        pd.DataFrame: Per series, the mean absolute error (MAE) and the mean absolute
+        percentage error (MAPE, over actuals other than 0) of the scored forecasts, and
+        how many forecasts were scored (N).
+    """
+    Y = np.atleast_2d(np.asarray(Y, dtype=np.float64))
+    errors, actuals = [], []
+    for origin in range(len(x) - folds - horizon + 1, len(x) - horizon + 1):
+        if origin < 2:
+            continue
+        predicted = forecast(x[:origin], Y[:, :origin], horizon, method, **kwargs)
+        errors.append(predicted - Y[:, origin:origin + horizon])
+        actuals.append(Y[:, origin:origin + horizon])
+    if not errors:
+        return pd.DataFrame({'MAE': np.full(len(Y), np.nan), 'MAPE': np.nan, 'N': 0})
+
+    errors, actuals = np.abs(np.hstack(errors)), np.hstack(actuals)
+    scored = np.isfinite(errors)
+    relative = scored & (actuals != 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        percentage = np.where(relative, errors / np.abs(actuals) * 100, 0.0)
+        return pd.DataFrame({
+            'MAE': np.where(scored, errors, 0.0).sum(axis=1) / scored.sum(axis=1),
+            'MAPE': percentage.sum(axis=1) / relative.sum(axis=1),
+            'N': scored.sum(axis=1),
+        })
+
+
+def forecast_series(keys, periods, Y, steps=3, method='linear', freq='year', folds=3, **kwargs):
+    """
+    Forecasts of every series with their backtest errors, as a long table.
+
+    Returns:
+        pd.DataFrame: The key columns, PERIOD (label of the forecast period), FORECAST,
+        and the series' backtest MAE and MAPE, one row per series and forecast period.
+    """
+    predicted = forecast(periods, Y, steps, method, **kwargs)
+    scores = backtest(periods, Y, method, folds, **kwargs)
+    labels = period_labels(periods[-1] + np.arange(1, steps + 1), freq)
+    table = keys.loc[keys.index.repeat(steps)].reset_index(drop=True)
+    table['PERIOD'] = np.tile(labels, len(keys))
+    table['FORECAST'] = predicted.ravel()
+    table['MAE'] = np.repeat(scores['MAE'].to_numpy(), steps)
+    table['MAPE'] = np.repeat(scores['MAPE'].to_numpy(), steps)
+    return table
+
+
+# Series forecast by the command line run: name, key columns, frequency, periods ahead
+GROUPINGS = [
+    ('unit', ['ASSIGNED_DESC'], 'year', 3),
+    ('district', ['CHARGED_DESC'], 'year', 3),
+    ('rank', ['RANK'], 'year', 3),
+    ('overtime type', ['DESCRIPTION'], 'year', 3),
+    ('unit', ['ASSIGNED_DESC'], 'month', 12),
+]
+
+
+if __name__ == '__main__':
+    import time
+
+    tables = []
+    for name, by, freq, steps in GROUPINGS:
+        keys, periods, Y = ledger_series(by, freq)
+        for method in METHODS:
+            start = time.perf_counter()
+            table = forecast_series(keys, periods, Y, steps, method, freq)
+            table = table.rename(columns={by[0]: 'SERIES'}).assign(GROUPING=name, FREQ=freq, METHOD=method)
+            tables.append(table)
+            print(f"{name} by {freq}, {method}: {len(keys)} series in {time.perf_counter() - start:.1f}s, "
+                  f"backtest median MAPE {table.groupby('SERIES')['MAPE'].first().median():.1f}%")
+
+    output_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'csv', 'overtime_forecasts.csv')
+    columns = ['GROUPING', 'FREQ', 'METHOD', 'SERIES', 'PERIOD', 'FORECAST', 'MAE', 'MAPE']
+    pd.concat(tables, ignore_index=True)[columns].to_csv(output_path, index=False, float_format='%.2f')
+    print(f"Forecasts written to {output_path}")
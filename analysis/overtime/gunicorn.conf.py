@@ -0,0 +1,22 @@
+"""
+Gunicorn settings for serving the department overtime dashboard in production:
+
+    gunicorn -c analysis/overtime/gunicorn.conf.py
+
+The app is imported once in the master before the workers fork, so the aggregates are
+built at most once and every worker shares the same memory-mapped arrays. Gunicorn needs
+a POSIX system; on Windows use `python overtime-ratio.py` instead.
+"""
+import multiprocessing
+import os
+
+wsgi_app = 'overtime-ratio:server'
+chdir = os.path.dirname(os.path.abspath(__file__))
+
+bind = os.environ.get('DASHBOARD_BIND', '0.0.0.0:8050')
+workers = int(os.environ.get('DASHBOARD_WORKERS', min(2 * multiprocessing.cpu_count() + 1, 8)))
+preload_app = True
+
+# Callbacks are pure CPU work over small arrays, so a slow one means something is wrong
+timeout = 30
+accesslog = '-'
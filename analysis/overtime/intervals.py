@@ -0,0 +1,259 @@
+"""
+Shift intervals of the overtime ledgers.
+
+STARTTIME and ENDTIME are 'HHMM' strings on the row's OTDATE; an ENDTIME before the
+STARTTIME falls on the next day (e.g. 2300-0130). load_intervals() turns them into
+absolute START and END timestamps, parsing each distinct time string once.
+
+Both questions asked of the intervals are answered by sorting and sweeping rather than
+by comparing every pair of rows, so a year of both ledgers takes a few sorts:
+
+  - concurrent_officers(): how many officers were on overtime in each unit in each
+    15-minute slot. Each officer's intervals in a unit are first merged, so overlapping
+    claims count them once; every merged interval then adds +1 at its first slot and -1
+    after its last in a (units, slots) difference array, whose running sum is the count.
+  - overlapping_claims(): claims of the same officer that overlap in time, within and
+    across the overtime and court OT ledgers (e.g. court during a paid detail). Rows are
+    sorted by officer and start; a row overlaps an earlier claim exactly when it starts
+    before the latest end so far of that officer, which is one running maximum.
+
+Run `python analysis/overtime/intervals.py` to print the peak concurrency of every unit
+and write the overlapping claims of every year to csv/overlapping_claims.csv.
+"""
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from ledger import available_years, iter_ledger
+
+# Ledgers whose rows are overtime worked at a recorded time
+LEDGERS = ['overtime', 'courtot']
+
+# Width of a concurrency slot, in minutes
+SLOT_MINUTES = 15
+
+# Columns kept for each side of an overlapping pair
+CLAIM_COLUMNS = ['SOURCE', 'OTDATE', 'STARTTIME', 'ENDTIME', 'DESCRIPTION', 'ASSIGNED_DESC', 'OTHOURS']
+
+
+def _hhmm_minutes(value):
+    """Minutes after midnight of one 'HHMM' string (2400 is midnight at the end of the day), else -1."""
+    value = value.strip() if isinstance(value, str) else ''
+    if not value.isdigit() or len(value) > 4:
+        return -1
+    hours, minutes = divmod(int(value), 100)
+    if minutes >= 60 or hours > 24 or (hours == 24 and minutes):
+        return -1
+    return hours * 60 + minutes
+
+
+def time_minutes(times):
+    """Minutes after midnight of every 'HHMM' time; -1 where missing or malformed."""
+    categorical = pd.Categorical(times)
+    lookup = np.array([_hhmm_minutes(value) for value in categorical.categories] + [-1], dtype=np.int64)
+    # missing values have code -1, which picks the trailing -1
+    return lookup[categorical.codes]
+
+
+def shift_bounds(dates, start_times, end_times):
+    """
+    Absolute start and end of shifts given as a date and two 'HHMM' times.
+
+    Args:
+        dates (array-like): Date of each shift (OTDATE).
+        start_times, end_times (array-like): STARTTIME and ENDTIME.
+
+    Returns:
+        (np.ndarray, np.ndarray): datetime64[m] starts and ends; an end before its start
+        is moved to the next day. NaT where the date or either time is missing.
+    """
+    days = np.asarray(dates, dtype='datetime64[D]').astype('datetime64[m]')
+    start, end = time_minutes(start_times), time_minutes(end_times)
+    valid = ~np.isnat(days) & (start >= 0) & (end >= 0)
+    end = end + np.where(end < start, 24 * 60, 0)
+    starts = np.where(valid, days + start.astype('timedelta64[m]'), np.datetime64('NaT'))
+    ends = np.where(valid, days + end.astype('timedelta64[m]'), np.datetime64('NaT'))
+    return starts.astype('datetime64[m]'), ends.astype('datetime64[m]')
+
+
+def load_intervals(years=None, datasets=None, columns=None):
+    """
+    Ledger rows with their shift START and END, one frame per year.
+
+    Args:
+        years (iterable[int]): Years to load. Every overtime ledger year by default.
+        datasets (list[str]): Ledgers to read. LEDGERS by default.
+        columns (list[str]): Ledger columns to keep besides ID, OTDATE, STARTTIME and
+            ENDTIME; columns a ledger does not have are left empty.
+
+    Yields:
+        (int, pd.DataFrame): The year and its rows of every ledger, with a SOURCE column
+        naming the ledger and datetime64[m] START and END.
+    """
+    datasets = datasets or LEDGERS
+    years = available_years(datasets[0]) if years is None else list(years)
+    wanted = ['ID', 'OTDATE', 'STARTTIME', 'ENDTIME'] + [col for col in columns or [] if col != 'SOURCE']
+    for year in years:
+        frames = []
+        for dataset in datasets:
+            if year not in available_years(dataset):
+                continue
+            for _, df in iter_ledger(dataset, [year], wanted):
+                df = df.reindex(columns=wanted)
+                df.insert(0, 'SOURCE', dataset)
+                frames.append(df)
+        if not frames:
+            continue
+        df = pd.concat(frames, ignore_index=True)
+        df['START'], df['END'] = shift_bounds(df['OTDATE'], df['STARTTIME'], df['ENDTIME'])
+        yield year, df
+
+
+def _codes(values):
+    """Integer codes and categories of values; missing values get -1."""
+    categorical = pd.Categorical(values)
+    return categorical.codes.astype(np.int64), categorical.categories
+
+
+def _previous_ends(groups, starts, ends):
+    """
+    For rows sorted by (group, start): the latest end among the earlier rows of the same
+    group and the position of the row it belongs to (-1 for the first row of a group).
+    """
+    if not len(groups):
+        return ends.copy(), np.zeros(0, dtype=np.int64)
+    # offsetting each group by a span larger than any end keeps the running maximum from
+    # carrying over between groups
+    base = min(starts.min(), ends.min())
+    span = ends.max() - base + 1
+    keyed = groups * span + (ends - base)
+    running = np.maximum.accumulate(keyed)
+    position = np.arange(len(keyed))
+    holder = np.maximum.accumulate(np.where(keyed == running, position, 0))
+
+    previous, holder = np.r_[-1, running[:-1]], np.r_[-1, holder[:-1]]
+    same = previous >= groups * span
+    return np.where(same, previous - groups * span + base, base - 1), np.where(same, holder, -1)
+
+
+def merge_intervals(groups, starts, ends):
+    """
+    Union of the intervals of each group: overlapping or touching [start, end) intervals
+    become one.
+
+    Args:
+        groups (np.ndarray): Integer group of each interval.
+        starts, ends (np.ndarray): Integer bounds.
+
+    Returns:
+        (np.ndarray, np.ndarray, np.ndarray): Group, start and end of every merged
+        interval, sorted by group and start.
+    """
+    order = np.lexsort((starts, groups))
+    groups, starts, ends = groups[order], starts[order], ends[order]
+    previous, _ = _previous_ends(groups, starts, ends)
+    # an interval opens a new run unless it starts at or before the end of the runs so far
+    first = np.flatnonzero(starts > previous)
+    run_ends = np.maximum.reduceat(ends, first) if len(first) else ends[:0]
+    return groups[first], starts[first], run_ends
+
+
+def concurrent_officers(df, by='ASSIGNED_DESC', slot=SLOT_MINUTES):
+    """
+    Distinct officers on overtime per key and time slot.
+
+    An officer counts in every slot any of their intervals overlaps, once however many
+    claims cover it.
+
+    Args:
+        df (pd.DataFrame): Rows with ID, START, END and the by column (see load_intervals).
+        by (str): Column to count per, e.g. 'ASSIGNED_DESC' or 'CHARGED_DESC'.
+        slot (int): Slot width in minutes.
+
+    Returns:
+        (pd.Index, np.ndarray, np.ndarray): The keys, the datetime64[m] start of every
+        slot from the first shift start to the last shift end, and the int32
+        (keys, slots) officer counts.
+    """
+    starts = df['START'].to_numpy('datetime64[m]').astype(np.int64)
+    ends = df['END'].to_numpy('datetime64[m]').astype(np.int64)
+    keys, key_values = _codes(df[by])
+    officers, officer_values = _codes(df['ID'])
+    valid = ~np.isnat(df['START'].to_numpy('datetime64[m]')) & (ends > starts) & (keys >= 0) & (officers >= 0)
+    if not valid.any():
+        return key_values, np.empty(0, dtype='datetime64[m]'), np.zeros((len(key_values), 0), dtype=np.int32)
+
+    # slots are numbered from the first slot of the day of the earliest shift
+    origin = starts[valid].min() // (24 * 60) * (24 * 60)
+    first = (starts[valid] - origin) // slot
+    last = -((origin - ends[valid]) // slot)  # exclusive, rounded up
+    groups = keys[valid] * len(officer_values) + officers[valid]
+    groups, first, last = merge_intervals(groups, first, last)
+
+    units, slots = len(key_values), int(last.max())
+    units_of = groups // len(officer_values)
+    changes = np.bincount(units_of * (slots + 1) + first, minlength=units * (slots + 1))
+    changes -= np.bincount(units_of * (slots + 1) + last, minlength=units * (slots + 1))
+    counts = np.cumsum(changes.reshape(units, slots + 1)[:, :slots], axis=1).astype(np.int32)
+    slot_starts = (origin + np.arange(slots) * slot).astype('datetime64[m]')
+    return key_values, slot_starts, counts
+
+
+def overlapping_claims(df, columns=CLAIM_COLUMNS):
+    """
+    Claims that overlap an earlier claim of the same officer.
+
+    Every such claim is paired with the earlier claim that runs latest, so an officer
+    with three stacked claims gives two pairs rather than all three.
+
+    Args:
+        df (pd.DataFrame): Rows with ID, START and END (see load_intervals).
+        columns (list[str]): Columns of df to report for each claim of a pair.
+
+    Returns:
+        pd.DataFrame: ID, the FIRST_ and SECOND_ columns of the earlier and the later
+        claim, their START and END, and OVERLAP_MINUTES.
+    """
+    starts = df['START'].to_numpy('datetime64[m]').astype(np.int64)
+    ends = df['END'].to_numpy('datetime64[m]').astype(np.int64)
+    officers, _ = _codes(df['ID'])
+    rows = np.flatnonzero(~np.isnat(df['START'].to_numpy('datetime64[m]')) & (ends > starts) & (officers >= 0))
+
+    order = rows[np.lexsort((ends[rows], starts[rows], officers[rows]))]
+    previous, holder = _previous_ends(officers[order], starts[order], ends[order])
+    overlap = starts[order] < previous
+    later, earlier = order[overlap], order[holder[overlap]]
+
+    columns = [col for col in columns if col in df] + ['START', 'END']
+    pairs = pd.concat([
+        df['ID'].iloc[later].reset_index(drop=True),
+        df[columns].iloc[earlier].reset_index(drop=True).add_prefix('FIRST_'),
+        df[columns].iloc[later].reset_index(drop=True).add_prefix('SECOND_'),
+    ], axis=1)
+    pairs['OVERLAP_MINUTES'] = np.minimum(ends[later], ends[earlier]) - starts[later]
+    return pairs
+
+
+if __name__ == '__main__':
+    import time
+
+    tables = []
+    for year, df in load_intervals(columns=['ASSIGNED_DESC', 'DESCRIPTION', 'OTHOURS']):
+        start = time.perf_counter()
+        units, slots, counts = concurrent_officers(df)
+        pairs = overlapping_claims(df)
+        elapsed = time.perf_counter() - start
+        tables.append(pairs.assign(YEAR=year))
+
+        peak = counts.argmax(axis=1)
+        busiest = np.argsort(-counts.max(axis=1))[:3]
+        sources = (pairs['FIRST_SOURCE'] + '/' + pairs['SECOND_SOURCE']).value_counts().to_dict()
+        print(f"{year}: {len(df):,} rows in {elapsed:.2f}s, {len(pairs):,} overlapping claims {sources}")
+        for row in busiest:
+            print(f"  {units[row]:<35} peak {counts[row, peak[row]]:>4} officers at {slots[peak[row]]}")
+
+    output_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'csv', 'overlapping_claims.csv')
+    pd.concat(tables, ignore_index=True).to_csv(output_path, index=False)
+    print(f"Overlapping claims written to {output_path}")
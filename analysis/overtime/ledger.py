@@ -0,0 +1,403 @@
+"""
+Overtime ledger store.
+
+The raw ledgers are converted once into a year-partitioned, typed column store under
+data/.cache/ledger/<dataset>/<year>/ (one .npy per column, categoricals stored as int32
+codes plus their categories) with a manifest.json describing every partition. Analyses
+query it by dataset and year range; a partition is rebuilt only when its CSV changes,
+and rows appended to a CSV are parsed on their own and added to the existing partition.
+A partition only holds rows whose OTDATE falls in its year.
+
+Run `python analysis/overtime/ledger.py` to ingest everything up front.
+"""
+import io
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+from contextlib import contextmanager
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from pandas.api.types import union_categoricals
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from earnings.utils import CACHE_DIR, DATA_DIR, detect_encoding, file_sha1
+
+try:
+    import fcntl
+except ImportError:  # Windows, where the pipeline does not prepare ledgers concurrently
+    fcntl = None
+
+LEDGER_DIR = CACHE_DIR / 'ledger'
+MANIFEST_PATH = LEDGER_DIR / 'manifest.json'
+LOCK_PATH = LEDGER_DIR / 'manifest.lock'
+LEDGER_VERSION = 4
+
+# Source files and OTDATE format of each ledger, any columns to rename to the common
+# names, and whether the year is the one starting the file name or that of the rows'
+# OTDATE ('year': 'OTDATE'; the record request exports are named after the year they
+# were requested in, not the one they cover). data/otevents/<year>_otevents.csv are
+# copies of data/overtime/<year>.csv, so only the court overtime files are read from there.
+DATASETS = {
+    'overtime': {'pattern': 'overtime/{year}.csv', 'date_format': '%m/%d/%y'},
+    'courtot': {'pattern': 'otevents/{year}_courtot.csv', 'date_format': '%d-%b-%y'},
+    'policerequests': {'pattern': 'policerequests/Police_Record_Request_{year}.csv', 'date_format': '%m/%d/%Y',
+                       'year': 'OTDATE', 'rename': {'IDNO6': 'ID'}},
+}
+
+# Stored type of every ledger column; columns not listed are kept as categoricals
+COLUMN_TYPES = {
+    'OTDATE': 'date',
+    'OTHOURS': 'float32',
+    'WRKDHRS': 'float32',
+}
+
+
+def _date_years(dates):
+    """Distinct years of an OTDATE column, ignoring missing dates."""
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    years = np.unique(dates[~np.isnat(dates)].astype('datetime64[Y]').astype(int)) + 1970
+    return [int(year) for year in years]
+
+
+@lru_cache(maxsize=None)
+def _otdate_year(path, size, mtime_ns, date_format):
+    """
+    The one year of a CSV's OTDATE column. size and mtime_ns tie the cached answer to one
+    version of the file.
+    """
+    df = pd.read_csv(path, dtype=str, encoding=detect_encoding(path), usecols=lambda name: name.strip() == 'OTDATE')
+    years = _date_years(pd.to_datetime(df.iloc[:, 0], format=date_format, errors='coerce'))
+    if len(years) != 1:
+        raise ValueError(f"{path} has OTDATE years {years}; a ledger file must cover exactly one year")
+    return years[0]
+
+
+def source_files(dataset):
+    """Return {year: path} for every raw CSV of a ledger dataset."""
+    pattern = DATASETS[dataset]['pattern']
+    files = {}
+    for path in DATA_DIR.glob(pattern.format(year='*')):
+        if DATASETS[dataset].get('year') == 'OTDATE':
+            stat = path.stat()
+            year = _otdate_year(path, stat.st_size, stat.st_mtime_ns, DATASETS[dataset]['date_format'])
+        else:
+            match = re.match(r'\d{4}', path.name)
+            if not match:
+                continue
+            year = int(match.group())
+        if year in files:
+            raise ValueError(f"Both {files[year].name} and {path.name} hold {dataset} {year}")
+        files[year] = path
+    return dict(sorted(files.items()))
+
+
+def available_years(dataset='overtime'):
+    """Years for which the raw ledger exists."""
+    return list(source_files(dataset))
+
+
+def _read_manifest():
+    if MANIFEST_PATH.exists():
+        with open(MANIFEST_PATH) as f:
+            manifest = json.load(f)
+        if manifest.get('version') == LEDGER_VERSION:
+            return manifest
+    return {'version': LEDGER_VERSION, 'datasets': {}}
+
+
+@contextmanager
+def _store_lock():
+    """
+    Hold an exclusive lock on the ledger store. Concurrent ingests (e.g. the pipeline
+    preparing two ledgers at once) would otherwise drop each other's manifest entries
+    and rebuild the same partition at the same time.
+    """
+    if fcntl is None:
+        yield
+        return
+    LEDGER_DIR.mkdir(parents=True, exist_ok=True)
+    with open(LOCK_PATH, 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _write_manifest(manifest):
+    LEDGER_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = MANIFEST_PATH.with_suffix('.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def _is_current(entry, file_path):
+    """
+    Whether the partition described by entry was built from the current file contents,
+    and whether entry's mtime was refreshed because the file was touched but unchanged
+    (the manifest must then be saved, or every later call hashes the file again).
+    """
+    if entry is None:
+        return False, False
+    stat = file_path.stat()
+    if (stat.st_size, stat.st_mtime_ns) == (entry['size'], entry['mtime_ns']):
+        return True, False
+    if stat.st_size == entry['size'] and file_sha1(file_path) == entry['sha1']:
+        # touched but unchanged
+        entry['mtime_ns'] = stat.st_mtime_ns
+        return True, True
+    return False, False
+
+
+def _is_append(entry, file_path):
+    """True if file_path is the file entry was built from with whole rows appended to it."""
+    if entry is None or file_path.stat().st_size <= entry['size']:
+        return False
+    with open(file_path, 'rb') as f:
+        f.seek(entry['size'] - 1)
+        if f.read(1) != b'\n':
+            return False
+    return file_sha1(file_path, limit=entry['size']) == entry['sha1']
+
+
+def _parse_rows(source, dataset, encoding):
+    """Parse raw ledger CSV rows into {column: typed values}."""
+    df = pd.read_csv(source, dtype=str, encoding=encoding)
+    df.columns = df.columns.str.strip()
+    df = df.rename(columns=DATASETS[dataset].get('rename', {}))
+
+    columns = {}
+    for name in df.columns:
+        kind = COLUMN_TYPES.get(name, 'category')
+        if kind == 'date':
+            dates = pd.to_datetime(df[name], format=DATASETS[dataset]['date_format'], errors='coerce')
+            columns[name] = dates.to_numpy().astype('datetime64[D]')
+        elif kind == 'float32':
+            columns[name] = pd.to_numeric(df[name], errors='coerce').to_numpy(dtype=np.float32)
+        else:
+            columns[name] = pd.Categorical(df[name])
+    return columns
+
+
+def write_columns(partition_path, columns):
+    """
+    Atomically replace partition_path with one .npy file per column.
+
+    Categoricals are stored as int32 codes plus their categories, everything else as the
+    array itself. Returns {column: kind} for the manifest, kind being 'category' or a dtype.
+    """
+    partition_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = Path(tempfile.mkdtemp(dir=partition_path.parent))
+
+    kinds = {}
+    for name, values in columns.items():
+        if isinstance(values, pd.Categorical):
+            np.save(tmp_path / f'{name}.codes.npy', values.codes.astype(np.int32))
+            np.save(tmp_path / f'{name}.categories.npy', values.categories.to_numpy(dtype=str))
+            kinds[name] = 'category'
+        else:
+            values = np.asarray(values)
+            np.save(tmp_path / f'{name}.npy', values)
+            kinds[name] = values.dtype.name
+
+    if partition_path.exists():
+        shutil.rmtree(partition_path)
+    os.replace(tmp_path, partition_path)
+    return kinds
+
+
+def read_columns(partition_path, kinds, columns=None):
+    """Memory-map the requested columns of a partition written by write_columns."""
+    names = list(kinds) if columns is None else [col for col in columns if col in kinds]
+    data = {}
+    for name in names:
+        if kinds[name] == 'category':
+            codes = np.load(partition_path / f'{name}.codes.npy', mmap_mode='r')
+            categories = np.load(partition_path / f'{name}.categories.npy')
+            data[name] = pd.Categorical.from_codes(codes, categories=categories.astype(object))
+        else:
+            data[name] = np.load(partition_path / f'{name}.npy', mmap_mode='r')
+    return data
+
+
+def _manifest_entry(file_path, rows, kinds):
+    stat = file_path.stat()
+    return {
+        'source': str(file_path.relative_to(DATA_DIR)),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha1': file_sha1(file_path),
+        'rows': rows,
+        'columns': kinds,
+    }
+
+
+def _check_year(columns, year, file_path):
+    """Refuse rows whose OTDATE falls outside the year of the partition they go to."""
+    years = _date_years(columns['OTDATE']) if 'OTDATE' in columns else []
+    if any(other != year for other in years):
+        raise ValueError(f"{file_path} has OTDATE years {years} but is stored as {year}")
+
+
+def _ingest_file(dataset, year, file_path, partition_path):
+    """Parse one raw CSV and write it as a typed partition. Returns its manifest entry."""
+    columns = _parse_rows(file_path, dataset, detect_encoding(file_path))
+    _check_year(columns, year, file_path)
+    kinds = write_columns(partition_path, columns)
+    rows = len(next(iter(columns.values()))) if columns else 0
+    return _manifest_entry(file_path, rows, kinds)
+
+
+def _append_file(dataset, year, file_path, partition_path, entry):
+    """
+    Parse only the rows appended to file_path since entry was written and add them to the
+    partition. Returns the new manifest entry, or None if the tail does not fit the partition.
+    """
+    with open(file_path, 'rb') as f:
+        header = f.readline()
+        f.seek(entry['size'])
+        tail = f.read()
+    appended = _parse_rows(io.BytesIO(header + tail), dataset, detect_encoding(file_path))
+    if set(appended) != set(entry['columns']):
+        return None
+    _check_year(appended, year, file_path)
+
+    existing = read_columns(partition_path, entry['columns'])
+    columns = {}
+    for name, values in existing.items():
+        if entry['columns'][name] == 'category':
+            # keeps the existing categories first, so earlier codes are unchanged
+            columns[name] = union_categoricals([values, appended[name]])
+        else:
+            columns[name] = np.concatenate([values, appended[name].astype(values.dtype)])
+    kinds = write_columns(partition_path, columns)
+
+    new_entry = _manifest_entry(file_path, entry['rows'] + len(next(iter(appended.values()))), kinds)
+    # lets derived stores (see aggregates.py) fold in just the new rows
+    new_entry['appended_to'] = {'sha1': entry['sha1'], 'rows': entry['rows']}
+    return new_entry
+
+
+def ingest(datasets=None, years=None, force=False):
+    """
+    Bring the ledger store up to date with the raw CSVs.
+
+    Args:
+        datasets (list[str]): Datasets to ingest. All of DATASETS by default.
+        years (iterable[int]): Only ingest these years. All available years by default.
+        force (bool): Rebuild partitions even if their source is unchanged.
+
+    Returns:
+        dict: The manifest.
+    """
+    with _store_lock():
+        manifest = _read_manifest()
+        changed = False
+        for dataset in datasets or DATASETS:
+            entries = manifest['datasets'].setdefault(dataset, {})
+            for year, file_path in source_files(dataset).items():
+                if years is not None and year not in years:
+                    continue
+                entry = entries.get(str(year))
+                if not force:
+                    current, refreshed = _is_current(entry, file_path)
+                    changed = changed or refreshed
+                    if current:
+                        continue
+                partition_path = LEDGER_DIR / dataset / str(year)
+                new_entry = None
+                if not force and _is_append(entry, file_path):
+                    print(f"Appending new {dataset} {year} rows from {file_path.name}")
+                    new_entry = _append_file(dataset, year, file_path, partition_path, entry)
+                if new_entry is None:
+                    print(f"Ingesting {dataset} {year} from {file_path.name}")
+                    new_entry = _ingest_file(dataset, year, file_path, partition_path)
+                entries[str(year)] = new_entry
+                changed = True
+        if changed or not MANIFEST_PATH.exists():
+            _write_manifest(manifest)
+    return manifest
+
+
+def iter_ledger(dataset='overtime', years=None, columns=None):
+    """
+    Yield (year, frame) for each stored year of a ledger, ingesting stale partitions first.
+
+    Frames are read one partition at a time, so callers that aggregate per year never
+    hold more than one year of raw rows.
+    """
+    manifest = ingest([dataset], years)
+    entries = manifest['datasets'].get(dataset, {})
+    wanted = sorted(int(year) for year in entries) if years is None else list(years)
+    for year in wanted:
+        entry = entries.get(str(year))
+        if entry is None:
+            raise FileNotFoundError(f"No {dataset} ledger for {year} under {DATA_DIR}")
+        yield year, pd.DataFrame(read_columns(LEDGER_DIR / dataset / str(year), entry['columns'], columns))
+
+
+def load_ledger(dataset='overtime', years=None, columns=None):
+    """
+    Load several years of a ledger into one frame with a YEAR column.
+
+    Args:
+        dataset (str): 'overtime', 'courtot' or 'policerequests'.
+        years (iterable[int]): Years to load. Every stored year by default.
+        columns (list[str]): Columns to load. All by default.
+
+    Returns:
+        pd.DataFrame: Typed ledger rows; text columns are categoricals shared across years.
+    """
+    frames = []
+    for year, df in iter_ledger(dataset, years, columns):
+        frames.append(df.assign(YEAR=np.int16(year)))
+    if not frames:
+        return pd.DataFrame(columns=list(columns or []) + ['YEAR'])
+
+    # union the per-year categories so the concatenated columns stay categorical
+    combined = {}
+    for name in frames[0].columns:
+        if isinstance(frames[0][name].dtype, pd.CategoricalDtype):
+            combined[name] = union_categoricals([frame[name] for frame in frames])
+        else:
+            combined[name] = np.concatenate([frame[name].to_numpy() for frame in frames])
+    return pd.DataFrame(combined)
+
+
+def aggregate_ledger(by, dataset='overtime', years=None, value='OTHOURS'):
+    """
+    Sum a ledger column over the given keys one year at a time.
+
+    Only one year of raw rows is held at once and the result is a single concat of the
+    small per-year aggregates, so the cost stays linear in the number of years.
+
+    Args:
+        by (list[str]): Ledger columns to group by within each year.
+        dataset (str): 'overtime', 'courtot' or 'policerequests'.
+        years (iterable[int]): Years to aggregate. Every stored year by default.
+        value (str): Column to sum.
+
+    Returns:
+        pd.DataFrame: One row per (YEAR, *by) with the float64 sum of value.
+    """
+    by = list(by)
+    frames = []
+    for year, df in iter_ledger(dataset, years, by + [value]):
+        sums = df[value].astype('float64').groupby([df[col] for col in by], observed=True, dropna=False).sum()
+        frames.append(sums.reset_index().assign(YEAR=year))
+    if not frames:
+        return pd.DataFrame(columns=['YEAR'] + by + [value])
+    return pd.concat(frames, ignore_index=True)[['YEAR'] + by + [value]]
+
+
+if __name__ == '__main__':
+    manifest = ingest()
+    for dataset, entries in manifest['datasets'].items():
+        rows = sum(entry['rows'] for entry in entries.values())
+        print(f"{dataset}: {len(entries)} years ({', '.join(sorted(entries))}), {rows:,} rows")
@@ -1,15 +1,23 @@
 import numpy as np
-from sklearn.linear_model import LinearRegression
 import pandas as pd
 import matplotlib.pyplot as plt
+import sys
+import os
 
-years = list(range(2012, 2023))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from aggregates import load_aggregates
+from forecasting import arima_forecast, linear_forecast
+from ledger import available_years
+from render import save_figure, show_figure
+
+years = available_years()
 avgs = []  # Store average overtime per employee
 
 # Load data and compute average overtime per employee
-for year in years:
-    df = pd.read_csv(f"../../data/overtime/{year}.csv")  # Ensure the file path is correct
-    total_ot_per_employee = df.groupby("ID")["OTHOURS"].sum()
+per_employee = load_aggregates(years=years, by=["ID"])
+for year, df in per_employee.groupby("YEAR"):
+    total_ot_per_employee = df["OTHOURS"]
     avg_employee_ot = total_ot_per_employee.mean()
     avgs.append(avg_employee_ot)
 
@@ -17,17 +25,8 @@ for year in years:
 if not avgs:
     raise ValueError("No overtime data found. Check your data files.")
 
-# Convert years and averages to NumPy arrays
-X = np.array(years).reshape(-1, 1)
-y = np.array(avgs)
-
-# Fit a linear regression model
-model = LinearRegression()
-model.fit(X, y)
-
-# Predict for 2023, 2024, and 2025
-future_years = np.array([[2023], [2024], [2025]])
-predicted_avgs = model.predict(future_years)
+# Fit a linear trend and predict for 2023, 2024, and 2025
+predicted_avgs = linear_forecast(years, [avgs], [2023, 2024, 2025])[0]
 
 for year, pred in zip([2023, 2024, 2025], predicted_avgs):
     print(f"Predicted Average Overtime Hours Per Employee for {year}: {pred:.2f}")
@@ -41,19 +40,12 @@ plt.ylabel("Average Overtime Hours")
 plt.title("Average Yearly Overtime Hours Per Employee with Predictions (2012-2025)")
 plt.legend()
 plt.grid(True)
-plt.savefig('./figures/predicted-avg-overtime-per-employee-2025.png')
-plt.show()
+save_figure('./figures/predicted-avg-overtime-per-employee-2025.png')
 
 ###################################################################################
 
-from statsmodels.tsa.arima.model import ARIMA
-
-# Fit ARIMA model (p=1, d=1, q=1 is a common starting point)
-arima_model = ARIMA(avgs, order=(1, 1, 1))
-arima_fit = arima_model.fit()
-
-# Predict for 2023, 2024, 2025
-future_preds = arima_fit.forecast(steps=3)
+# Fit ARIMA model (p=1, d=1, q=1 is a common starting point) and predict for 2023, 2024, 2025
+future_preds = arima_forecast([avgs], steps=3, order=(1, 1, 1))[0]
 
 for year, pred in zip([2023, 2024, 2025], future_preds):
     print(f"Predicted Overtime Hours for {year}: {pred:.2f}")
@@ -67,4 +59,4 @@ plt.ylabel("Average Overtime Hours per Employee")
 plt.title("ARIMA Time Series Prediction")
 plt.legend()
 plt.grid(True)
-plt.show()
\ No newline at end of file
+show_figure()
\ No newline at end of file
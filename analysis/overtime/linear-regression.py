@@ -1,32 +1,30 @@
 import numpy as np
-from sklearn.linear_model import LinearRegression
 import pandas as pd
 import matplotlib.pyplot as plt
+import sys
+import os
 
-years = list(range(2012, 2023))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from forecasting import linear_forecast
+from ledger import available_years
+from render import save_figure
+from timeseries import load_daily
+
+years = available_years()
 totals = []  # Ensure this gets populated
 
-# Load data for each year
+# Yearly totals of the daily series
+periods, sums = load_daily().resample("year")
 for year in years:
-    df = pd.read_csv(f"../../data/overtime/{year}.csv")  # Ensure the correct file path
-    total_ot = df["OTHOURS"].sum()
-    totals.append(total_ot)
+    totals.append(sums[0][periods == year][0])
 
 # Ensure totals has data
 if not totals:
     raise ValueError("No overtime data found. Check your data files.")
 
-# Convert years and totals to NumPy arrays
-X = np.array(years).reshape(-1, 1)
-y = np.array(totals)
-
-# Fit a linear regression model
-model = LinearRegression()
-model.fit(X, y)
-
-# Predict for 2023, 2024, and 2025
-future_years = np.array([[2023], [2024], [2025]])
-predicted_totals = model.predict(future_years)
+# Fit a linear trend and predict for 2023, 2024, and 2025
+predicted_totals = linear_forecast(years, [totals], [2023, 2024, 2025])[0]
 
 for year, pred in zip([2023, 2024, 2025], predicted_totals):
     print(f"Predicted Total Overtime Hours for {year}: {pred:.2f}")
@@ -40,5 +38,4 @@ plt.ylabel("Total Overtime Hours")
 plt.title("Total Yearly Overtime Hours with Predictions (2012-2025)")
 plt.legend()
 plt.grid(True)
-plt.savefig('./figures/predicted-total-overtime-2025.png')
-plt.show()
\ No newline at end of file
+save_figure('./figures/predicted-total-overtime-2025.png')
\ No newline at end of file
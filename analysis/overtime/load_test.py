@@ -0,0 +1,142 @@
+"""
+Load test for the department overtime dashboard.
+
+Replays the graph callback with random slider ranges from many concurrent clients against
+a running server and reports the latency distribution, e.g.
+
+    gunicorn -c analysis/overtime/gunicorn.conf.py &
+    python analysis/overtime/load_test.py --requests 2000 --concurrency 32
+
+Ranges are drawn from a fixed number of slider positions (--positions), like real users
+dragging the same sliders, so repeated ranges hit the figure cache.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from department_aggregates import load_department_aggregates
+
+
+def callback_payload(metric, percentage_range, total_range):
+    """Request body of the department-graph callback, as the Dash front end sends it."""
+    inputs = [
+        {'id': 'metric-dropdown', 'property': 'value', 'value': metric},
+        {'id': 'overtime-percentage-slider', 'property': 'value', 'value': percentage_range},
+        {'id': 'overtime-total-slider', 'property': 'value', 'value': total_range},
+        {'id': 'year-filter', 'property': 'value', 'value': None},
+        {'id': 'title-filter', 'property': 'value', 'value': None},
+    ]
+    changed = 'overtime-percentage-slider.value' if metric == 'avg' else 'overtime-total-slider.value'
+    return {
+        'output': 'department-graph.figure',
+        'outputs': {'id': 'department-graph', 'property': 'figure'},
+        'inputs': inputs,
+        'changedPropIds': [changed],
+        'state': [],
+    }
+
+
+def random_payloads(count, positions, seed=0):
+    """Random callback bodies over both metrics, each slider range snapped to one of positions steps."""
+    rng = random.Random(seed)
+    sliders = {metric: (float(values[0]), float(values[-1]))
+               for metric, (_, values) in load_department_aggregates().items()}
+
+    def random_range(metric):
+        low, high = sliders[metric]
+        a, b = sorted(rng.randrange(positions + 1) for _ in range(2))
+        return [low + (high - low) * a / positions, low + (high - low) * b / positions]
+
+    payloads = []
+    for _ in range(count):
+        metric = rng.choice(list(sliders))
+        percentage_range = random_range('avg') if metric == 'avg' else list(sliders['avg'])
+        total_range = random_range('total') if metric == 'total' else list(sliders['total'])
+        payloads.append(json.dumps(callback_payload(metric, percentage_range, total_range)).encode())
+    return payloads
+
+
+def timed_request(url, body):
+    request = urllib.request.Request(url, data=body, headers={
+        'Content-Type': 'application/json',
+        'Accept-Encoding': 'gzip',
+    })
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            size = len(response.read())
+            status = response.status
+    except urllib.error.HTTPError as e:
+        # a server error means the payload or the app is broken, not that it is slow
+        if e.code >= 500:
+            raise RuntimeError(f"{url} answered {e.code}: {e.read()[:500].decode(errors='replace')}") from e
+        raise
+    return time.perf_counter() - start, status, size
+
+
+def run_load_test(url, requests=1000, concurrency=16, positions=20):
+    """
+    Send the callback requests concurrently and summarize the latencies.
+
+    Returns:
+        dict: Request count, errors, throughput and p50/p90/p99/max latency in milliseconds.
+
+    Raises:
+        RuntimeError: On the first 5xx response; connection failures and timeouts are
+            counted as errors instead.
+    """
+    endpoint = url.rstrip('/') + '/_dash-update-component'
+    payloads = random_payloads(requests, positions)
+    latencies, sizes, errors = [], [], 0
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(timed_request, endpoint, body) for body in payloads]
+        for future in futures:
+            try:
+                latency, status, size = future.result()
+            except OSError as e:
+                if not errors:
+                    print(f"Request failed: {e}", file=sys.stderr)
+                errors += 1
+                continue
+            latencies.append(latency * 1000)
+            sizes.append(size)
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array(latencies)
+    summary = {'requests': requests, 'errors': errors, 'seconds': elapsed, 'rps': len(latencies) / elapsed}
+    if len(latencies):
+        summary.update({
+            'p50': np.percentile(latencies, 50),
+            'p90': np.percentile(latencies, 90),
+            'p99': np.percentile(latencies, 99),
+            'max': latencies.max(),
+            'mean_kb': np.mean(sizes) / 1024,
+        })
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load test the department overtime dashboard.")
+    parser.add_argument('--url', default='http://127.0.0.1:8050', help="base URL of a running dashboard")
+    parser.add_argument('-n', '--requests', type=int, default=1000, help="callback requests to send")
+    parser.add_argument('-c', '--concurrency', type=int, default=16, help="concurrent clients")
+    parser.add_argument('--positions', type=int, default=20, help="distinct positions per slider")
+    args = parser.parse_args()
+
+    summary = run_load_test(args.url, args.requests, args.concurrency, args.positions)
+    print(f"{summary['requests']} requests, {summary['errors']} errors, "
+          f"{summary['seconds']:.1f}s ({summary['rps']:.0f} req/s) at concurrency {args.concurrency}")
+    if 'p50' in summary:
+        print(f"latency ms: p50 {summary['p50']:.1f}  p90 {summary['p90']:.1f}  "
+              f"p99 {summary['p99']:.1f}  max {summary['max']:.1f}  (mean response {summary['mean_kb']:.1f} KB)")
@@ -1,95 +1,70 @@
+import math
 import pandas as pd
+import sys
+import os
 import dash
 from dash import dcc, html
 import plotly.express as px
-from dash.dependencies import Input, Output
-
-# List of years
-years = range(2011, 2025)
-
-# Initialize an empty list to store department averages for each year
-department_averages_all_years = []
-
-# Iterate over the years and analyze department averages
-for year in years:
-    try:
-        # Load data for the year
-        df = pd.read_csv(f"../../data/earnings-reformatted/employee-earnings-report-{year}.csv")
-    except FileNotFoundError:
-        print(f"File for {year} not found, skipping.")
-        continue
-    
-    # Clean: remove $ and commas
-    df.replace({r'[\$,]': '', r'\s+': ''}, regex=True, inplace=True)
+from dash.dependencies import Input, Output, State
+from flask import abort, request
+from functools import lru_cache
 
-    # Make sure numeric columns are numbers
-    numeric_cols = ['REGULAR', 'RETRO', 'OTHER', 'OVERTIME', 'INJURED', 'DETAILS', 'QUINN', 'TOTAL EARNINGS']
-    df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric, errors='coerce')
-    
-    # Fill missing values with 0 for relevant columns
-    df.fillna({'OVERTIME': 0, 'TOTAL EARNINGS': 0}, inplace=True)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from department_aggregates import aggregates_etag, department_values, load_department_aggregates, select_range
+from earnings_cube import COMPONENTS, STATS, EarningsCube
+from serving import cached_json, gzip_json_responses
 
-    # Calculate overtime as % of total earnings
-    df = df[df['TOTAL EARNINGS'] > 0]
-    df['Overtime_Percentage'] = (df['OVERTIME'] / df['TOTAL EARNINGS']) * 100
+# Per-department metrics, prebuilt from the 2011-2024 earnings and sorted ascending
+aggregates = load_department_aggregates()
+AGGREGATES_ETAG = aggregates_etag()
+avg_names, avg_values = aggregates['avg']
+total_names, total_values = aggregates['total']
 
-    # Group by department and compute the mean overtime percentage
-    department_avg = df.groupby('DEPARTMENT NAME')['Overtime_Percentage'].mean().reset_index()
+# (year, department, title) cube answering the drill-down and cross-filtered views
+cube = EarningsCube()
 
-    # Append department averages for the current year to the list
-    department_averages_all_years.append(department_avg)
+# Find the real min and max overtime percentages
+min_overtime = float(avg_values[0])
+max_overtime = float(avg_values[-1])
 
-# Concatenate department averages across all years into a single DataFrame
-all_years_department_avg = pd.concat(department_averages_all_years)
+min_total_ot = float(total_values[0])
+max_total_ot = float(total_values[-1])
+step = (max_total_ot - min_total_ot) / 200
 
-# Group by department name and compute the overall average overtime percentage
-department_avg_all_years = all_years_department_avg.groupby('DEPARTMENT NAME')['Overtime_Percentage'].mean().reset_index()
+# Slider (min, max, step) per metric; ranges are snapped to these steps to key the figure cache
+SLIDERS = {
+    'avg': (min_overtime, max_overtime, 0.5),
+    'total': (min_total_ot, max_total_ot, step),
+}
 
-# Sort by average overtime percentage in descending order
-department_avg_all_years = department_avg_all_years.sort_values('Overtime_Percentage', ascending=False)
+# Titles listed in the title drill-down
+TOP_TITLES = 25
 
-# Find the real min and max overtime percentages
-min_overtime = department_avg_all_years['Overtime_Percentage'].min()
-max_overtime = department_avg_all_years['Overtime_Percentage'].max()
+def component_label(component):
+    return 'Overtime % of Gross' if component == 'OVERTIME_PCT' else component.replace('_', ' ').title()
 
-# Also calculate total overtime earned per department across all years
-department_totals_all_years = pd.concat(department_averages_all_years)  # we already have the yearly data
 
-# Now we need the TOTAL dollars, so go back to the original earnings data per year
-# Re-read the yearly files and accumulate overtime by department
-department_total_overtime_list = []
+def as_key(values):
+    """A filter dropdown value as a hashable cache key; () means no filter."""
+    return tuple(sorted(values or ()))
 
-for year in years:
-    try:
-        df = pd.read_csv(f"../../data/earnings-reformatted/employee-earnings-report-{year}.csv")
-    except FileNotFoundError:
-        continue
-    
-    df.replace({r'[\$,]': '', r'\s+': ''}, regex=True, inplace=True)
-    numeric_cols = ['REGULAR', 'RETRO', 'OTHER', 'OVERTIME', 'INJURED', 'DETAILS', 'QUINN', 'TOTAL EARNINGS']
-    df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric, errors='coerce')
-    
-    df.fillna({'OVERTIME': 0, 'TOTAL EARNINGS': 0}, inplace=True)
-    
-    dept_overtime = df.groupby('DEPARTMENT NAME')['OVERTIME'].sum().reset_index()
-    department_total_overtime_list.append(dept_overtime)
-
-# Concatenate total overtime earnings across all years
-department_total_overtime_all_years = pd.concat(department_total_overtime_list)
-
-# Group again to get the total overtime per department
-department_total_overtime = department_total_overtime_all_years.groupby('DEPARTMENT NAME')['OVERTIME'].sum().reset_index()
 
-# Sort descending
-department_total_overtime = department_total_overtime.sort_values('OVERTIME', ascending=False)
+def filter_label(years, titles):
+    parts = []
+    if years:
+        parts.append(', '.join(str(year) for year in years))
+    if titles:
+        parts.append(titles[0] if len(titles) == 1 else f'{len(titles)} titles')
+    return f" [{'; '.join(parts)}]" if parts else ''
 
-min_total_ot = department_total_overtime['OVERTIME'].min()
-max_total_ot = department_total_overtime['OVERTIME'].max()
-step = (max_total_ot - min_total_ot) / 200
 
 # Dash app setup
 app = dash.Dash(__name__)
 
+# WSGI entry point for production serving: gunicorn -c gunicorn.conf.py (see serving.py)
+server = app.server
+gzip_json_responses(server)
+
 app.layout = html.Div([
     html.H1("Department Overtime Analysis"),
 
@@ -103,6 +78,24 @@ app.layout = html.Div([
         clearable=False,
         style={'width': '50%', 'margin-bottom': '20px'}
     ),
+
+    # Year and title filters, also set by clicking the drill-down charts below
+    html.Div([
+        dcc.Dropdown(
+            id='year-filter',
+            options=[{'label': str(year), 'value': int(year)} for year in cube.years],
+            multi=True,
+            placeholder='All years',
+            style={'flex': '1'}
+        ),
+        dcc.Dropdown(
+            id='title-filter',
+            options=[{'label': title, 'value': title} for title in cube.titles.tolist()],
+            multi=True,
+            placeholder='All titles',
+            style={'flex': '2'}
+        ),
+    ], style={'display': 'flex', 'gap': '10px', 'width': '75%', 'margin-bottom': '20px'}),
     
     # Percentage slider (Initially shown)
     html.Div(
@@ -132,6 +125,26 @@ app.layout = html.Div([
     ),
 
     dcc.Graph(id='department-graph'),
+
+    # Drill-down into the department clicked above (all departments until one is clicked)
+    html.H2(id='drilldown-heading'),
+    html.Div([
+        dcc.Dropdown(
+            id='component-dropdown',
+            options=[{'label': component_label(component), 'value': component} for component in COMPONENTS],
+            value='OVERTIME',
+            clearable=False,
+            style={'width': '300px'}
+        ),
+        dcc.RadioItems(
+            id='stat-radio',
+            options=[{'label': stat.capitalize(), 'value': stat} for stat in STATS],
+            value='sum',
+            inline=True,
+        ),
+    ], style={'display': 'flex', 'gap': '20px', 'align-items': 'center'}),
+    dcc.Graph(id='year-graph'),
+    dcc.Graph(id='title-graph'),
 ])
 
 # Callback now updates two outputs
@@ -152,43 +165,188 @@ def toggle_sliders(selected_metric):
     Output('department-graph', 'figure'),
     [Input('metric-dropdown', 'value'),
      Input('overtime-percentage-slider', 'value'),
-     Input('overtime-total-slider', 'value')]
+     Input('overtime-total-slider', 'value'),
+     Input('year-filter', 'value'),
+     Input('title-filter', 'value')]
 )
-def update_graph(selected_metric, overtime_percentage_range, overtime_total_range):
+def update_graph(selected_metric, overtime_percentage_range, overtime_total_range, years, titles):
+    value_range = overtime_percentage_range if selected_metric == 'avg' else overtime_total_range
+    return department_figure(selected_metric, *snap_range(selected_metric, value_range), as_key(years), as_key(titles))
+
+
+def snap_range(selected_metric, value_range):
+    """Express a slider range in whole slider steps from the slider minimum."""
+    low, high, slider_step = SLIDERS[selected_metric]
+    if slider_step <= 0:
+        return 0, 0
+    # equivalent ranges map to the same steps, so they share a cache entry
+    low_steps = math.floor((value_range[0] - low) / slider_step + 1e-9)
+    high_steps = math.ceil((value_range[1] - low) / slider_step - 1e-9)
+    return low_steps, high_steps
+
+
+@lru_cache(maxsize=256)
+def department_table(selected_metric, years=(), titles=()):
+    """Department names and metric values sorted ascending, prebuilt unless filtered."""
+    if not years and not titles:
+        return aggregates[selected_metric]
+    return department_values(cube, selected_metric, years or None, titles or None)
+
+
+@lru_cache(maxsize=1024)
+def department_figure(selected_metric, low_steps, high_steps, years=(), titles=()):
+    """Build the bar chart for a metric, a slider range given in whole steps, and the filters."""
+    low, high, slider_step = SLIDERS[selected_metric]
+    range_min = max(low, low + low_steps * slider_step)
+    range_max = min(high, low + high_steps * slider_step)
+    names, values = department_table(selected_metric, years, titles)
+    # filtered values can fall outside the sliders' full-data range, so an end left at
+    # its limit stays open
+    if len(values) and low_steps <= 0:
+        range_min = min(range_min, float(values[0]))
+    if len(values) and range_max >= high:
+        range_max = max(range_max, float(values[-1]))
+
     if selected_metric == 'avg':
-        min_overtime, max_overtime = overtime_percentage_range
-        filtered_df = department_avg_all_years[
-            (department_avg_all_years['Overtime_Percentage'] >= min_overtime) & 
-            (department_avg_all_years['Overtime_Percentage'] <= max_overtime)
-        ]
+        min_overtime, max_overtime = range_min, range_max
+        start, stop = select_range(values, min_overtime, max_overtime)
+        # highest first, as the sorted table was displayed before
+        filtered_df = pd.DataFrame({'DEPARTMENT_NAME': names[start:stop][::-1],
+                                    'Overtime_Percentage': values[start:stop][::-1]})
         fig = px.bar(filtered_df, 
-                     x='DEPARTMENT NAME', 
+                     x='DEPARTMENT_NAME', 
                      y='Overtime_Percentage', 
-                     title=f"Departments by Average Overtime Percentage ({min_overtime:.1f}% - {max_overtime:.1f}%)",
+                     title=f"Departments by Average Overtime Percentage ({min_overtime:.1f}% - {max_overtime:.1f}%)"
+                           f"{filter_label(years, titles)}",
                      color='Overtime_Percentage', 
                      color_continuous_scale='Viridis',
-                     labels={'Overtime_Percentage': 'Overtime Percentage (%)', 'DEPARTMENT NAME': 'Department Name'},
+                     labels={'Overtime_Percentage': 'Overtime Percentage (%)', 'DEPARTMENT_NAME': 'Department Name'},
                      height=600)
         fig.update_layout(xaxis_tickangle=-45)
         
     elif selected_metric == 'total':
-        min_total, max_total = overtime_total_range
-        filtered_df = department_total_overtime[
-            (department_total_overtime['OVERTIME'] >= min_total) & 
-            (department_total_overtime['OVERTIME'] <= max_total)
-        ]
+        min_total, max_total = range_min, range_max
+        start, stop = select_range(values, min_total, max_total)
+        filtered_df = pd.DataFrame({'DEPARTMENT_NAME': names[start:stop][::-1],
+                                    'OVERTIME': values[start:stop][::-1]})
         fig = px.bar(filtered_df, 
-                     x='DEPARTMENT NAME', 
+                     x='DEPARTMENT_NAME', 
                      y='OVERTIME', 
-                     title=f"Departments by Total Overtime Earned (${min_total:,.0f} - ${max_total:,.0f})",
+                     title=f"Departments by Total Overtime Earned (${min_total:,.0f} - ${max_total:,.0f})"
+                           f"{filter_label(years, titles)}",
                      color='OVERTIME', 
                      color_continuous_scale='Cividis',
-                     labels={'OVERTIME': 'Total Overtime ($)', 'DEPARTMENT NAME': 'Department Name'},
+                     labels={'OVERTIME': 'Total Overtime ($)', 'DEPARTMENT_NAME': 'Department Name'},
                      height=600)
         fig.update_layout(xaxis_tickangle=-45)
         
     return fig
 
+
+@app.callback(
+    [Output('drilldown-heading', 'children'),
+     Output('year-graph', 'figure'),
+     Output('title-graph', 'figure')],
+    [Input('department-graph', 'clickData'),
+     Input('component-dropdown', 'value'),
+     Input('stat-radio', 'value'),
+     Input('year-filter', 'value'),
+     Input('title-filter', 'value')]
+)
+def update_drilldown(click_data, component, stat, years, titles):
+    department = click_data['points'][0]['x'] if click_data else None
+    heading = department or 'All departments'
+    return (heading,) + drilldown_figures(department, component, stat, as_key(years), as_key(titles))
+
+
+@lru_cache(maxsize=1024)
+def drilldown_figures(department, component, stat, years=(), titles=()):
+    """
+    Per-year and per-title bar charts of a pay component for one department (None for all).
+
+    Each chart is filtered by the other dimension's selection only and highlights its own,
+    so clicking a bar adds it to the filter without hiding the alternatives.
+    """
+    departments = [department] if department else None
+    label = f"{stat.capitalize()} of {component_label(component)}"
+
+    by_year = cube.rollup(['YEAR'], component, stat, departments=departments, titles=titles or None)
+    by_year['Selected'] = by_year['YEAR'].isin(years) if years else True
+    year_fig = px.bar(by_year,
+                      x='YEAR',
+                      y=component,
+                      title=f"{label} by Year{filter_label((), titles)}",
+                      color='Selected',
+                      color_discrete_map={True: '#1f77b4', False: '#c7c7c7'},
+                      category_orders={'YEAR': by_year['YEAR'].tolist()},
+                      labels={component: label, 'YEAR': 'Year'},
+                      height=400)
+    year_fig.update_layout(xaxis_type='category', showlegend=False)
+
+    by_title = cube.rollup(['TITLE'], component, stat, years=years or None, departments=departments)
+    by_title = by_title.nlargest(TOP_TITLES, component)
+    by_title['Selected'] = by_title['TITLE'].isin(titles) if titles else True
+    title_fig = px.bar(by_title,
+                       x='TITLE',
+                       y=component,
+                       title=f"{label} by Title, top {TOP_TITLES}{filter_label(years, ())}",
+                       color='Selected',
+                       color_discrete_map={True: '#1f77b4', False: '#c7c7c7'},
+                       category_orders={'TITLE': by_title['TITLE'].tolist()},
+                       labels={component: label, 'TITLE': 'Title'},
+                       height=500)
+    title_fig.update_layout(xaxis_tickangle=-45, showlegend=False)
+    return year_fig, title_fig
+
+
+# Cross-filtering: clicking a year or title bar toggles it in the matching filter
+@app.callback(
+    Output('year-filter', 'value'),
+    [Input('year-graph', 'clickData')],
+    [State('year-filter', 'value')],
+    prevent_initial_call=True
+)
+def toggle_year(click_data, years):
+    return toggle(years, int(click_data['points'][0]['x']))
+
+
+@app.callback(
+    Output('title-filter', 'value'),
+    [Input('title-graph', 'clickData')],
+    [State('title-filter', 'value')],
+    prevent_initial_call=True
+)
+def toggle_title(click_data, titles):
+    return toggle(titles, click_data['points'][0]['x'])
+
+
+def toggle(selected, value):
+    selected = list(selected or [])
+    return [item for item in selected if item != value] if value in selected else sorted(selected + [value])
+
+
+@lru_cache(maxsize=1024)
+def department_figure_json(selected_metric, low_steps, high_steps):
+    return department_figure(selected_metric, low_steps, high_steps).to_json()
+
+
+@server.route('/figure/<selected_metric>.json')
+def figure_json(selected_metric):
+    """Static figure for embedding, e.g. /figure/avg.json?low=5&high=20, cached until the aggregates change."""
+    if selected_metric not in SLIDERS:
+        abort(404)
+    low, high, _ = SLIDERS[selected_metric]
+    value_range = [request.args.get('low', low, type=float), request.args.get('high', high, type=float)]
+    low_steps, high_steps = snap_range(selected_metric, value_range)
+    return cached_json(department_figure_json(selected_metric, low_steps, high_steps),
+                       f'{AGGREGATES_ETAG}-{selected_metric}-{low_steps}-{high_steps}')
+
+
+# Render the full-range figures up front: plotly's one-off setup is paid at startup rather
+# than by the first user, and forked serving workers inherit the cached figures
+for metric, (low, high, _) in SLIDERS.items():
+    department_figure_json(metric, *snap_range(metric, [low, high]))
+
 # Run the app
 if __name__ == '__main__':
     app.run(debug=True)
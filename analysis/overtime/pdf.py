@@ -1,67 +1,64 @@
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
-
-# Load data for all years
-years = range(2012, 2023)
-data = {}
-
-for year in years:
-    df = pd.read_csv(f"../../data/overtime/{year}.csv")
-    total_ot_per_employee = df.groupby("ID")["OTHOURS"].sum()
-    data[year] = total_ot_per_employee.values
-
-# Determine the global x limits across all years
-all_values = [value for year_data in data.values() for value in year_data]
-x_min, x_max = min(all_values), max(all_values)
-
-# Calculate the maximum density across all years for consistent scaling
-max_density = 0
-for year in years:
-    counts, bins = np.histogram(data[year], bins=20, density=True)
-    max_density = max(max_density, max(counts))
-
-# Create the figure and axis for the animation
-fig, ax = plt.subplots(figsize=(10, 5))
-
-def update(year):
-    ax.clear()
-    # Calculate mean and median
-    mean = np.mean(data[year])
-    median = np.median(data[year])
-
-    # Plot histogram
-    ax.hist(data[year], bins=50, density=True, edgecolor='black', alpha=0.7)
-    ax.axvline(mean, color='red', linestyle='dashed', linewidth=2, label=f"Mean: {mean:.2f}")
-    ax.axvline(median, color='green', linestyle='dashed', linewidth=2, label=f"Median: {median:.2f}")
-
-    # Add labels and title
-    ax.set_title(f"Normalized Distribution of Total Overtime Hours Per Employee in {year}")
-    ax.set_xlabel("Total Overtime Hours")
-    ax.set_ylabel("Probability Density")
-    ax.grid(True)
-    ax.set_xlim(x_min, x_max)  # Set consistent x-axis limits
-    ax.set_ylim(0, max_density)  # Set consistent y-axis limits
-    ax.legend()  # Show legend for mean and median
-
-ani = FuncAnimation(fig, update, frames=years, repeat=True, interval=500)
-
-# Save the animation as an MP4 file
-output_path = "./figures/pdfs/fast-distributions.gif"
-writer = 'pillow'
-ani.save(output_path, writer=writer)
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from aggregates import load_aggregates
+from animation import histogram_frames, save_histogram_animation
+from ledger import available_years, load_ledger
+from render import save_figure
+from sketches import Summary
+
+# Load data for every year with a ledger
+years = available_years()
+
+# Distribution of total overtime per employee, summarized per year
+per_employee = load_aggregates(years=years, by=["ID"])
+summaries = {year: Summary.of(df["OTHOURS"]) for year, df in per_employee.groupby("YEAR")}
+
+# One frame per year, or per month with --monthly
+if '--monthly' in sys.argv:
+    ledger = load_ledger(years=years, columns=["ID", "OTDATE", "OTHOURS"])
+    month = ledger["OTDATE"].dt.to_period("M")
+    per_month = ledger["OTHOURS"].astype("float64").groupby([month, ledger["ID"]], observed=True).sum().reset_index()
+    periods, frames = np.unique(per_month["OTDATE"].astype(str), return_inverse=True)
+    values = per_month["OTHOURS"].to_numpy()
+    labels = pd.PeriodIndex(periods, freq="M").strftime("%B %Y")
+    output_path = "./figures/pdfs/monthly-distributions.gif"
+    fps = 6
+else:
+    frames = np.searchsorted(years, per_employee["YEAR"])
+    values = per_employee["OTHOURS"].to_numpy()
+    labels = [str(year) for year in years]
+    output_path = "./figures/pdfs/fast-distributions.gif"
+    fps = 2
+
+# Histograms of every frame over the same bins, counted in one pass
+edges, densities = histogram_frames(values, frames, bins=50)
+frame_stats = pd.Series(values).groupby(frames).agg(["mean", "median"])
+save_histogram_animation(
+    output_path, edges, densities,
+    titles=[f"Normalized Distribution of Total Overtime Hours Per Employee in {label}" for label in labels],
+    markers={
+        "Mean": ("red", frame_stats["mean"].to_numpy()),
+        "Median": ("green", frame_stats["median"].to_numpy()),
+    },
+    xlabel="Total Overtime Hours",
+    ylabel="Probability Density",
+    fps=fps,
+)
 
 print(f"Animation saved to {output_path}")
 
-# Years excluding 2018
-filtered_years = [year for year in years if year != 2018]
+# 2018 is shown on its own, as an outlier, when its ledger exists
+outlier_year = 2018
+filtered_years = [year for year in years if year != outlier_year]
 
 # Compute means
-means = [np.mean(data[year]) for year in filtered_years]
-
-# Include 2018 separately
-mean_2018 = np.mean(data[2018])
+means = [summaries[year].mean for year in filtered_years]
 
 # Compute standard deviation of means (excluding 2018)
 std_dev = np.std(means, ddof=1)
@@ -72,7 +69,8 @@ print(mean_of_means)
 # Create the boxplot
 plt.figure(figsize=(8, 5))
 plt.boxplot(means, vert=False, patch_artist=True, boxprops=dict(facecolor="lightblue"))
-plt.scatter(mean_2018, 1, color='red', label="2018 Mean", zorder=3)  # Highlight 2018 separately
+if outlier_year in summaries:
+    plt.scatter(summaries[outlier_year].mean, 1, color='red', label=f"{outlier_year} Mean", zorder=3)  # Highlight 2018 separately
 
 # Plot standard deviation range
 plt.axvline(mean_of_means, color='black', linestyle='dashed', linewidth=1, label="Mean of Means")
@@ -83,9 +81,10 @@ plt.axvline(mean_of_means - 2 * std_dev, color='blue', linestyle='dotted', linew
 
 # Labels and title
 plt.xlabel("Mean Overtime Hours")
-plt.title("Distribution of Mean Overtime Hours Across Years (Highlighting 2018)")
+title = "Distribution of Mean Overtime Hours Across Years"
+if outlier_year in summaries:
+    title += f" (Highlighting {outlier_year})"
+plt.title(title)
 plt.legend()
 plt.grid(True)
-plt.savefig('./figures/pdfs/outlier_with_std.png')
-plt.show()
-
+save_figure('./figures/pdfs/outlier_with_std.png')
@@ -0,0 +1,57 @@
+"""
+HTTP helpers for serving the department overtime dashboard to many users.
+
+The Dash dev server (`python overtime-ratio.py`) is a single process; in production the
+app's Flask server is run by gunicorn with several workers, see gunicorn.conf.py. These
+helpers add what the dev server leaves out: gzip for the JSON figure payloads, which are
+mostly repeated numbers and shrink several-fold, and conditional GET with cache headers
+for figures that only change when the aggregates artifact is rebuilt.
+"""
+import gzip
+
+from flask import Response, request
+
+# Bodies smaller than this are not worth the compression overhead
+MIN_GZIP_SIZE = 1024
+
+
+def gzip_json_responses(server, min_size=MIN_GZIP_SIZE, level=6):
+    """Compress JSON responses of a Flask server for clients that accept gzip."""
+
+    @server.after_request
+    def compress(response):
+        if (response.mimetype != 'application/json'
+                or response.direct_passthrough
+                or response.status_code != 200
+                or 'Content-Encoding' in response.headers):
+            return response
+        response.vary.add('Accept-Encoding')
+        if 'gzip' not in request.headers.get('Accept-Encoding', '').lower():
+            return response
+        body = response.get_data()
+        if len(body) < min_size:
+            return response
+        response.set_data(gzip.compress(body, compresslevel=level))
+        response.headers['Content-Encoding'] = 'gzip'
+        return response
+
+    return compress
+
+
+def cached_json(body, etag, max_age=3600):
+    """
+    Respond with a JSON body that can be cached until its ETag changes.
+
+    Args:
+        body (str | bytes): Serialized JSON.
+        etag (str): Identifies this exact body, e.g. the aggregates version plus the query.
+        max_age (int): Seconds browsers and proxies may reuse the response without asking.
+
+    Returns:
+        flask.Response: The body, or an empty 304 if the client already holds it.
+    """
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    return response.make_conditional(request)
@@ -0,0 +1,253 @@
+"""
+Daily overtime time series.
+
+Each ledger is turned once into dense per-day arrays: for a grouping such as the assigned
+unit, a (series, days) matrix of OTHOURS summed per key and calendar day, indexed by the
+day offset from January 1 of the ledger's first year. OTDATE is already parsed at ingest
+(each ledger has its own date format, see ledger.py), so building is one pass of integer
+day offsets per partition. Days no ledger partition covers (e.g. the missing 2018) are
+marked as such, so coarser periods over them come out as NaN rather than 0.
+
+The arrays are stored under data/.cache/timeseries/<dataset>/<grouping>/ and rebuilt
+only when a ledger partition changes. Monthly and yearly totals, single days and
+calendar windows such as the week of July 4 in every year are then slices and
+reductions of those arrays instead of groupbys over the raw rows.
+
+Run `python analysis/overtime/timeseries.py` to build the unit, rank and OT type series
+and print the units with the most overtime around July 4.
+"""
+import json
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from ledger import CACHE_DIR, LEDGER_DIR, ingest, read_columns, write_columns
+
+TIMESERIES_DIR = CACHE_DIR / 'timeseries'
+TIMESERIES_VERSION = 1
+
+# Key of the single series of a grouping by nothing
+TOTAL = 'ALL'
+
+FREQS = ['day', 'month', 'year']
+
+
+class DailySeries:
+    """
+    OTHOURS per series and day.
+
+    Attributes:
+        keys (pd.DataFrame): The key values of each series (one column per grouping column).
+        start (np.datetime64): Date of day offset 0.
+        values (np.ndarray): (series, days) sums.
+        covered (np.ndarray): Per day, whether any ledger partition covers it.
+    """
+
+    def __init__(self, keys, start, values, covered):
+        self.keys = keys
+        self.start = np.datetime64(start, 'D')
+        self.values = values
+        self.covered = covered
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def dates(self):
+        return self.start + np.arange(self.values.shape[1])
+
+    def offset(self, date):
+        """Day offset of a date (anything np.datetime64 accepts)."""
+        return int((np.datetime64(date, 'D') - self.start) // np.timedelta64(1, 'D'))
+
+    def between(self, first, last):
+        """The series from first to last (inclusive), as a view of the same arrays."""
+        a, b = max(self.offset(first), 0), min(self.offset(last) + 1, self.values.shape[1])
+        return DailySeries(self.keys, self.start + a, self.values[:, a:b], self.covered[a:b])
+
+    def select(self, **keys):
+        """The series whose key columns have the given values, e.g. select(RANK='Ptl')."""
+        mask = np.ones(len(self.keys), dtype=bool)
+        for column, value in keys.items():
+            mask &= self.keys[column].to_numpy() == value
+        return DailySeries(self.keys[mask].reset_index(drop=True), self.start, self.values[mask], self.covered)
+
+    def total(self):
+        """One series summing all of them."""
+        return DailySeries(pd.DataFrame({'SERIES': [TOTAL]}), self.start, self.values.sum(axis=0, keepdims=True),
+                           self.covered)
+
+    def resample(self, freq):
+        """
+        Sums per calendar period.
+
+        Args:
+            freq (str): 'day', 'month' or 'year'.
+
+        Returns:
+            (np.ndarray, np.ndarray): Period numbers (the dates for days, year * 12 +
+            month - 1 for months, years for years) and the (series, periods) sums; NaN
+            for periods no partition covers.
+        """
+        if freq not in FREQS:
+            raise ValueError(f"Unknown frequency {freq!r}, expected one of {FREQS}")
+        dates = self.dates
+        if freq == 'day':
+            return dates, np.where(self.covered, self.values, np.nan)
+
+        months = dates.astype('datetime64[M]').astype(np.int64)
+        periods = months // 12 + 1970 if freq == 'year' else months + 1970 * 12
+        # dates are sorted, so every period is one contiguous run of days
+        starts = np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]])
+        sums = np.add.reduceat(self.values, starts, axis=1) if len(starts) else self.values[:, :0]
+        covered = np.add.reduceat(self.covered.astype(np.int64), starts) > 0 if len(starts) else self.covered[:0]
+        return periods[starts], np.where(covered, sums, np.nan)
+
+    def windows(self, month, day, before=0, after=0):
+        """
+        Sums over the same calendar window in every year, e.g. July 1-7 as
+        windows(7, 4, before=3, after=3).
+
+        Returns:
+            (np.ndarray, np.ndarray): The years and the (series, years) sums; NaN for
+            years whose window no partition covers.
+        """
+        years = np.arange(self.start.astype('datetime64[Y]').astype(int) + 1970,
+                          self.dates[-1].astype('datetime64[Y]').astype(int) + 1971)
+        centers = np.array([self.offset(f'{year}-{month:02d}-{day:02d}') for year in years])
+        days = centers[:, None] + np.arange(-before, after + 1)[None, :]
+        inside = (days >= 0) & (days < self.values.shape[1])
+        days = np.clip(days, 0, self.values.shape[1] - 1)
+        sums = np.where(inside[None], self.values[:, days], 0).sum(axis=2)
+        covered = (np.where(inside, self.covered[days], False)).any(axis=1)
+        return years, np.where(covered[None, :], sums, np.nan)
+
+    def to_frame(self, freq='day'):
+        """Long table of the series resampled to freq: key columns, PERIOD, OTHOURS."""
+        periods, values = self.resample(freq)
+        table = self.keys.loc[self.keys.index.repeat(len(periods))].reset_index(drop=True)
+        table['PERIOD'] = np.tile(periods, len(self.keys))
+        table['OTHOURS'] = values.ravel()
+        return table
+
+
+def _grouping_name(by):
+    return '+'.join(by) if by else TOTAL
+
+
+def _partition_days(dataset, entry, year, by, start):
+    """Sums of OTHOURS per key and day offset from start over one ledger partition."""
+    columns = read_columns(LEDGER_DIR / dataset / str(year), entry['columns'], by + ['OTDATE', 'OTHOURS'])
+    dates = np.asarray(columns['OTDATE']).astype('datetime64[D]')
+    hours = np.asarray(columns['OTHOURS'], dtype=np.float64)
+    valid = ~np.isnat(dates) & np.isfinite(hours)
+    # rows missing a key belong to no series, as in a pandas groupby
+    for col in by:
+        valid &= columns[col].codes != -1
+    offsets = (dates[valid] - start).astype(np.int64)
+
+    keys = [np.asarray(columns[col]).astype(str)[valid] for col in by]
+    sums = pd.Series(hours[valid]).groupby(keys + [offsets]).sum()
+    frame = sums.reset_index()
+    frame.columns = by + ['DAY', 'OTHOURS']
+    return frame, (offsets.min(), offsets.max()) if len(offsets) else None
+
+
+def build_daily(by=(), dataset='overtime', force=False):
+    """
+    Write the daily arrays of a grouping unless they are current. Returns their directory.
+
+    Args:
+        by (iterable[str]): Ledger columns identifying a series. () for one total series.
+        dataset (str): 'overtime', 'courtot' or 'policerequests'.
+        force (bool): Rebuild even if the ledger did not change.
+    """
+    by = list(by)
+    path = TIMESERIES_DIR / dataset / _grouping_name(by)
+    entries = ingest([dataset])['datasets'].get(dataset, {})
+    sources = {year: entry['sha1'] for year, entry in sorted(entries.items())}
+    meta_path = path / 'meta.json'
+    if not force and meta_path.exists():
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get('version') == TIMESERIES_VERSION and meta.get('sources') == sources:
+            return path
+
+    print(f"Building daily {dataset} series by {_grouping_name(by)}")
+    # day 0 is January 1 of the earliest year with any rows
+    first_dates = [np.asarray(read_columns(LEDGER_DIR / dataset / year, entry['columns'], ['OTDATE'])['OTDATE'])
+                   for year, entry in entries.items()]
+    first_dates = np.concatenate(first_dates).astype('datetime64[D]') if first_dates else np.array([], 'M8[D]')
+    first_dates = first_dates[~np.isnat(first_dates)]
+    if not len(first_dates):
+        raise FileNotFoundError(f"No {dataset} ledger rows to build series from")
+    start = first_dates.min().astype('datetime64[Y]').astype('datetime64[D]')
+    end = (first_dates.max().astype('datetime64[Y]') + 1).astype('datetime64[D]')
+    days = int((end - start) // np.timedelta64(1, 'D'))
+
+    frames, covered = [], np.zeros(days, dtype=bool)
+    for year, entry in entries.items():
+        frame, span = _partition_days(dataset, entry, year, by, start)
+        frames.append(frame)
+        if span is not None:
+            covered[span[0]:span[1] + 1] = True
+
+    long = pd.concat(frames, ignore_index=True)
+    if by:
+        keys, series = np.unique(long[by].to_numpy(dtype=str), axis=0, return_inverse=True)
+        series = series.ravel()
+    else:
+        keys, series = np.array([[TOTAL]]), np.zeros(len(long), dtype=np.int64)
+    values = np.bincount(series * days + long['DAY'].to_numpy(), weights=long['OTHOURS'].to_numpy(),
+                         minlength=len(keys) * days).reshape(len(keys), days)
+
+    columns = {col: pd.Categorical(keys[:, i]) for i, col in enumerate(by or ['SERIES'])}
+    columns.update({'values': values, 'covered': covered, 'start': np.array([start])})
+    kinds = write_columns(path, columns)
+    tmp_path = meta_path.with_suffix(f'.{os.getpid()}.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump({'version': TIMESERIES_VERSION, 'sources': sources, 'by': by, 'columns': kinds}, f, indent=2)
+    os.replace(tmp_path, meta_path)
+    return path
+
+
+def load_daily(by=(), dataset='overtime'):
+    """
+    Memory-mapped daily series of a grouping, building them first if stale.
+
+    Args:
+        by (iterable[str]): Ledger columns identifying a series, e.g. ['ASSIGNED_DESC']
+            or ['RANK', 'DESCRIPTION']. () for one total series.
+        dataset (str): 'overtime', 'courtot' or 'policerequests'.
+
+    Returns:
+        DailySeries
+    """
+    by = list(by)
+    path = build_daily(by, dataset)
+    with open(path / 'meta.json') as f:
+        meta = json.load(f)
+    columns = read_columns(path, meta['columns'])
+    keys = pd.DataFrame({col: np.asarray(columns[col]).astype(str) for col in by or ['SERIES']})
+    return DailySeries(keys, columns['start'][0], columns['values'], np.asarray(columns['covered']))
+
+
+# Groupings built by the command line run
+GROUPINGS = [[], ['ASSIGNED_DESC'], ['RANK'], ['DESCRIPTION']]
+
+
+if __name__ == '__main__':
+    for by in GROUPINGS:
+        series = load_daily(by)
+        print(f"{_grouping_name(by)}: {len(series)} series over {series.values.shape[1]:,} days "
+              f"from {series.start}")
+
+    units = load_daily(['ASSIGNED_DESC'])
+    years, sums = units.windows(7, 4, before=3, after=3)
+    latest = np.flatnonzero(np.isfinite(sums).any(axis=0))[-1]
+    top = np.argsort(-np.nan_to_num(sums[:, latest]))[:10]
+    print(f"\nUnits with the most overtime hours over July 1-7, {years[latest]}:")
+    for row in top:
+        print(f"  {units.keys['ASSIGNED_DESC'][row]:<45} {sums[row, latest]:>10,.1f}")
@@ -0,0 +1,205 @@
+"""
+Training of the overtime random forest.
+
+The forest predicts a year's OTHOURS per (RANK, ASSIGNED_DESC) combination from the year
+and the encoded rank and unit. Its parameters are chosen by time-based cross-validation:
+each fold trains on the stored years up to one year and is scored on the next stored
+year, which is how the model is used. Candidates drawn from PARAM_DISTRIBUTIONS are
+searched by successive halving (scikit-learn's HalvingRandomSearchCV): every candidate
+is first scored with MIN_TREES trees, and only the best third of each round goes on
+with three times as many, so poor configurations are discarded after their cheapest
+fits. Fits run on all cores, or in one process as a pipeline target (ANALYSIS_JOBS).
+
+The best configuration is refitted on every year and stored with its encoders, search
+results and the sha1 of every ledger partition it saw under data/.cache/models/.
+load_model() returns it as long as no partition has changed and retrains otherwise.
+
+Run `python analysis/overtime/training.py` to train (if stale) and print the search
+results next to the former fixed configuration.
+"""
+import json
+import os
+import sys
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401 (enables the import below)
+from sklearn.model_selection import HalvingRandomSearchCV, cross_val_score
+from sklearn.preprocessing import LabelEncoder
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from ledger import CACHE_DIR, aggregate_ledger, available_years, ingest
+
+MODELS_DIR = CACHE_DIR / 'models'
+MODEL_PATH = MODELS_DIR / 'random_forest.joblib'
+META_PATH = MODELS_DIR / 'random_forest.json'
+MODEL_VERSION = 1
+
+FEATURES = ['Year', 'Rank_Encoded', 'Assigned_Encoded']
+SCORING = 'neg_mean_absolute_error'
+
+# Forest parameters the search draws candidates from (max_features as a share of FEATURES)
+PARAM_DISTRIBUTIONS = {
+    'max_depth': [None, 6, 10, 16, 24],
+    'min_samples_leaf': [1, 2, 4, 8, 16],
+    'max_features': [1.0, 0.67, 0.34],
+    'bootstrap': [True, False],
+}
+
+# Candidates drawn, and the trees of the first round and the most any round may use
+CANDIDATES = 60
+MIN_TREES = 25
+MAX_TREES = 400
+
+# Fewest years the first fold trains on
+MIN_TRAIN_YEARS = 3
+
+RANDOM_STATE = 42
+
+# Parallel fits: every core when run on its own, the pipeline's budget (one) as a target
+N_JOBS = int(os.environ.get('ANALYSIS_JOBS', -1))
+
+
+def training_frame(years=None):
+    """
+    OTHOURS per year, rank and unit with the features of the model.
+
+    Args:
+        years (iterable[int]): Years to read. Every stored year by default.
+
+    Returns:
+        (pd.DataFrame, LabelEncoder, LabelEncoder): One row per Year, Rank_Encoded and
+        Assigned_Encoded with the OTHOURS sum, and the encoders of RANK and ASSIGNED_DESC.
+    """
+    years = available_years() if years is None else list(years)
+    # sums per (Year, Rank, Assigned) one year at a time; the raw rows are never combined
+    data = aggregate_ledger(["RANK", "ASSIGNED_DESC"], years=years).rename(columns={"YEAR": "Year"})
+
+    rank_encoder = LabelEncoder()
+    data["Rank_Encoded"] = rank_encoder.fit_transform(data["RANK"])
+    assigned_encoder = LabelEncoder()
+    data["Assigned_Encoded"] = assigned_encoder.fit_transform(data["ASSIGNED_DESC"])
+
+    # collapse to one row per encoded combination
+    data = data.groupby(FEATURES).agg({"OTHOURS": "sum"}).reset_index()
+    return data, rank_encoder, assigned_encoder
+
+
+def time_folds(years, min_train=MIN_TRAIN_YEARS):
+    """
+    Expanding-window folds over the rows of several years.
+
+    Args:
+        years (array-like): Year of every row.
+        min_train (int): Stored years the first fold trains on.
+
+    Returns:
+        list[(np.ndarray, np.ndarray)]: (train, test) row positions: the rows of the
+        first k stored years and those of the year after them, for every k >= min_train.
+    """
+    years = np.asarray(years)
+    stored = np.unique(years)
+    return [(np.flatnonzero(years <= stored[k - 1]), np.flatnonzero(years == stored[k]))
+            for k in range(min_train, len(stored))]
+
+
+def search(data, n_candidates=CANDIDATES, n_jobs=N_JOBS, random_state=RANDOM_STATE):
+    """
+    Successive halving search over PARAM_DISTRIBUTIONS with time-based folds.
+
+    Args:
+        data (pd.DataFrame): Rows from training_frame().
+        n_candidates (int): Configurations drawn for the first round.
+        n_jobs (int): Parallel fits; -1 for every core. N_JOBS by default.
+
+    Returns:
+        HalvingRandomSearchCV: The fitted search; best_estimator_ is refitted on all rows.
+    """
+    halving = HalvingRandomSearchCV(
+        RandomForestRegressor(random_state=random_state),
+        PARAM_DISTRIBUTIONS,
+        n_candidates=n_candidates,
+        resource='n_estimators',
+        min_resources=MIN_TREES,
+        max_resources=MAX_TREES,
+        factor=3,
+        cv=time_folds(data["Year"]),
+        scoring=SCORING,
+        n_jobs=n_jobs,
+        random_state=random_state,
+    )
+    return halving.fit(data[FEATURES], data["OTHOURS"])
+
+
+def _sources():
+    entries = ingest(['overtime'])['datasets'].get('overtime', {})
+    return {year: entry['sha1'] for year, entry in sorted(entries.items())}
+
+
+def train_model(n_jobs=N_JOBS):
+    """
+    Search, refit on every stored year and store the best forest.
+
+    Returns:
+        dict: The model bundle: 'model', 'rank_encoder', 'assigned_encoder', 'params',
+        'folds' (the test year and MAE of every fold of the best configuration) and
+        'sources' (the ledger partitions trained on).
+    """
+    sources = _sources()
+    data, rank_encoder, assigned_encoder = training_frame()
+    result = search(data, n_jobs=n_jobs)
+
+    folds = time_folds(data["Year"])
+    best = result.best_index_
+    bundle = {
+        'model': result.best_estimator_,
+        'rank_encoder': rank_encoder,
+        'assigned_encoder': assigned_encoder,
+        'params': result.best_params_,
+        'folds': [{'year': int(data["Year"].iloc[test[0]]),
+                   'mae': -float(result.cv_results_[f'split{i}_test_score'][best])}
+                  for i, (_, test) in enumerate(folds)],
+        'sources': sources,
+    }
+
+    MODELS_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = MODEL_PATH.with_suffix(f'.{os.getpid()}.tmp')
+    joblib.dump(bundle, tmp_path)
+    os.replace(tmp_path, MODEL_PATH)
+    # the metadata goes last, so it never describes a model that was not written
+    meta = {key: bundle[key] for key in ['params', 'folds', 'sources']}
+    tmp_path = META_PATH.with_suffix(f'.{os.getpid()}.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump({'version': MODEL_VERSION, **meta}, f, indent=2)
+    os.replace(tmp_path, META_PATH)
+    return bundle
+
+
+def load_model(force=False):
+    """The stored model bundle (see train_model), retrained first if a ledger partition changed."""
+    if not force and META_PATH.exists() and MODEL_PATH.exists():
+        with open(META_PATH) as f:
+            meta = json.load(f)
+        if meta.get('version') == MODEL_VERSION and meta.get('sources') == _sources():
+            return joblib.load(MODEL_PATH)
+    print("Training the overtime random forest")
+    return train_model()
+
+
+if __name__ == '__main__':
+    import time
+
+    start = time.perf_counter()
+    bundle = load_model(force='--force' in sys.argv)
+    print(f"Model ready in {time.perf_counter() - start:.1f}s")
+    print(f"Best parameters: {bundle['params']}")
+
+    data, _, _ = training_frame()
+    folds = time_folds(data["Year"])
+    former = -cross_val_score(RandomForestRegressor(random_state=RANDOM_STATE, n_estimators=100),
+                              data[FEATURES], data["OTHOURS"], cv=folds, scoring=SCORING, n_jobs=N_JOBS)
+    print(f"{'Test year':<10} {'Best MAE':>10} {'Former MAE':>11}")
+    for fold, mae in zip(bundle['folds'], former):
+        print(f"{fold['year']:<10} {fold['mae']:>10,.1f} {mae:>11,.1f}")
+    print(f"{'Mean':<10} {np.mean([fold['mae'] for fold in bundle['folds']]):>10,.1f} {former.mean():>11,.1f}")
@@ -0,0 +1,467 @@
+"""
+Pipeline runner for the analysis scripts.
+
+Every analysis is declared below with the code it imports, the data it reads, the shared
+datasets it needs prepared and the files it writes. The runner
+
+  1. works out which targets are stale (their code, inputs or parameters changed since
+     the last successful run, or one of their outputs is missing),
+  2. prepares the shared datasets those targets need once, sharded by year across the
+     worker pool (the earnings column cache, the overtime ledger store and aggregates),
+  3. runs the stale targets concurrently, as soon as everything they need is ready.
+
+Outputs are kept in a content-addressed artifact cache (see artifacts.py): a target whose
+fingerprint was seen before gets its outputs restored rather than re-rendered.
+
+Workers are forked from a parent that has already imported pandas, scikit-learn,
+matplotlib and plotly, so no target pays interpreter or import start-up, and all of them
+read the prepared datasets from the memory-mapped cache instead of the raw CSVs. Where
+fork is unavailable (Windows) they are spawned instead and import what they use.
+
+Usage:
+    python analysis/pipeline.py [-j WORKERS] [--force] [TARGET ...]
+    python analysis/pipeline.py --status    # what would run and why, and the cache size
+    python analysis/pipeline.py --prune     # drop artifacts of superseded runs
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import runpy
+import sys
+import time
+import traceback
+from multiprocessing.connection import wait
+from pathlib import Path
+
+# Figures are only ever written to disk when running as a pipeline (see render.py)
+os.environ['ANALYSIS_HEADLESS'] = '1'
+os.environ.setdefault('MPLBACKEND', 'Agg')
+# Every target runs in one of the pool's worker slots, so scripts that parallelize on their
+# own (see overtime/training.py) stay in that one process instead of oversubscribing
+os.environ['ANALYSIS_JOBS'] = '1'
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from artifacts import ARTIFACTS_DIR, ArtifactCache
+from earnings.utils import CACHE_DIR, file_sha1
+
+ROOT = Path(__file__).parent.parent
+PIPELINE_DIR = CACHE_DIR / 'pipeline'
+STATE_PATH = PIPELINE_DIR / 'state.json'
+LOG_DIR = PIPELINE_DIR / 'logs'
+
+# Modules imported by every analysis
+COMMON_CODE = ['analysis/earnings/utils.py', 'analysis/earnings/currency.py', 'analysis/render.py']
+ROSTER_CSV = 'data/roster/bpd-roster-2020.csv'
+
+# Employee identity resolution (analysis/identity.py) and the ledgers it indexes
+IDENTITY_CODE = ['analysis/identity.py', 'analysis/linkage.py', 'analysis/ranks.py', 'analysis/overtime/ledger.py']
+IDENTITY_INPUTS = [ROSTER_CSV, 'data/overtime/*.csv', 'data/otevents/*_courtot.csv']
+
+
+def _earnings(year):
+    return f'data/earnings/employee-earnings-report-{year}.csv'
+
+
+# Analyses run by `make run`. Paths are relative to the repository root; cwd is the
+# directory the script expects to be started from.
+TARGETS = {
+    'roster': {
+        'script': 'analysis/roster/roster.py',
+        'cwd': '.',
+        'code': ['analysis/ranks.py', 'analysis/hover.py', 'analysis/scatter.py'],
+        'inputs': [ROSTER_CSV],
+        'outputs': [
+            'analysis/roster/figures/ethnic_group_distribution.png',
+            'analysis/roster/figures/gender_distribution.png',
+            'analysis/roster/figures/job_title_vs_annual_rt_by_gender.png',
+            'analysis/roster/figures/job_title_vs_rates_combined.png',
+            'analysis/roster/figures/job_title_vs_rates_seperate.png',
+        ],
+    },
+    'roster2': {
+        'script': 'analysis/roster/roster2.py',
+        'cwd': '.',
+        'code': ['analysis/roster/roster.py', 'analysis/ranks.py', 'analysis/hover.py', 'analysis/scatter.py'] + IDENTITY_CODE,
+        'inputs': IDENTITY_INPUTS + [_earnings(2020)],
+        'needs': ['earnings:2020', 'ledger', 'courtot'],
+        'outputs': [
+            'analysis/roster/figures/top_100_ethnic_group_distribution.png',
+            'analysis/roster/figures/top_100_gender_distribution.png',
+            'analysis/roster/EDA/top_100_income_ranking.html',
+        ],
+    },
+    'decision_tree': {
+        'script': 'analysis/roster/decision_tree.py',
+        'cwd': '.',
+        'code': ['analysis/roster/roster.py', 'analysis/roster/roster2.py', 'analysis/ranks.py', 'analysis/hover.py', 'analysis/scatter.py'] + IDENTITY_CODE,
+        'inputs': IDENTITY_INPUTS + [_earnings(2020)],
+        'needs': ['earnings:2020', 'ledger', 'courtot'],
+        'outputs': ['analysis/roster/EDA/top_earners_decision_tree2020.png'],
+    },
+    'earnings_bpd_breakdown': {
+        'script': 'analysis/earnings/earnings_bpd_breakdown.py',
+        'cwd': '.',
+        'inputs': [_earnings(year) for year in range(2011, 2025)],
+        'needs': [f'earnings:{year}' for year in range(2011, 2025)],
+        'outputs': ['analysis/earnings/figures/figure_bpd_earnings_breakdown_stacked.png'],
+    },
+    'earnings_intradepartment_ot_gross': {
+        'script': 'analysis/earnings/earnings_intradepartment_ot_gross.py',
+        'cwd': '.',
+        'inputs': [_earnings(year) for year in range(2018, 2022)],
+        'needs': [f'earnings:{year}' for year in range(2018, 2022)],
+        'outputs': [f'analysis/earnings/figures/figure_intradepartment_overtime_vs_earnings_{year}.png'
+                    for year in range(2018, 2022)],
+    },
+    'earnings_intradepartment': {
+        'script': 'analysis/earnings/earnings_intradepartment.py',
+        'cwd': '.',
+        'inputs': [_earnings(year) for year in range(2011, 2023)],
+        'needs': [f'earnings:{year}' for year in range(2011, 2023)],
+        'outputs': ['analysis/earnings/figures/figure_totalearnings_comparison.png'],
+    },
+    'linear-regression-per-employee': {
+        'script': 'analysis/overtime/linear-regression-per-employee.py',
+        'cwd': 'analysis/overtime',
+        'code': ['analysis/overtime/ledger.py', 'analysis/overtime/aggregates.py', 'analysis/overtime/forecasting.py', 'analysis/overtime/timeseries.py'],
+        'inputs': ['data/overtime/*.csv'],
+        'needs': ['ledger'],
+        'outputs': ['analysis/overtime/figures/predicted-avg-overtime-per-employee-2025.png'],
+    },
+    'linear-regression': {
+        'script': 'analysis/overtime/linear-regression.py',
+        'cwd': 'analysis/overtime',
+        'code': ['analysis/overtime/ledger.py', 'analysis/overtime/forecasting.py', 'analysis/overtime/timeseries.py'],
+        'inputs': ['data/overtime/*.csv'],
+        'needs': ['ledger'],
+        'outputs': ['analysis/overtime/figures/predicted-total-overtime-2025.png'],
+    },
+    'pdf': {
+        'script': 'analysis/overtime/pdf.py',
+        'cwd': 'analysis/overtime',
+        'code': ['analysis/overtime/ledger.py', 'analysis/overtime/aggregates.py', 'analysis/overtime/animation.py', 'analysis/sketches.py'],
+        'inputs': ['data/overtime/*.csv'],
+        'needs': ['ledger'],
+        'outputs': [
+            'analysis/overtime/figures/pdfs/fast-distributions.gif',
+            'analysis/overtime/figures/pdfs/outlier_with_std.png',
+        ],
+    },
+    'random-forest-regressor': {
+        'script': 'analysis/overtime/random-forest-regressor.py',
+        'cwd': 'analysis/overtime',
+        'code': ['analysis/overtime/ledger.py', 'analysis/overtime/training.py'],
+        'inputs': ['data/overtime/*.csv'],
+        'needs': ['ledger'],
+        'outputs': [
+            'analysis/overtime/figures/regression/predictions.png',
+            'analysis/overtime/figures/regression/stacked-bar.png',
+            'analysis/overtime/figures/regression/heatmap.png',
+            'analysis/overtime/csv/predicted_overtime_2023.csv',
+            'analysis/overtime/csv/assigned_mapping_key.csv',
+        ],
+    },
+}
+
+
+def _prepare_earnings(year):
+    from earnings.utils import load_earnings_data
+    load_earnings_data(year, columns=['NAME'])
+
+
+def _prepare_ledger():
+    sys.path.append(str(ROOT / 'analysis' / 'overtime'))
+    from aggregates import update_aggregates
+    update_aggregates('overtime')
+
+
+def _prepare_courtot():
+    sys.path.append(str(ROOT / 'analysis' / 'overtime'))
+    from ledger import ingest
+    ingest(['courtot'])
+
+
+def _preparations(names):
+    """Map each shared dataset name a target can need to the function that prepares it."""
+    tasks = {}
+    for name in names:
+        if name == 'ledger':
+            tasks[name] = (_prepare_ledger, ())
+        elif name == 'courtot':
+            tasks[name] = (_prepare_courtot, ())
+        elif name.startswith('earnings:'):
+            tasks[name] = (_prepare_earnings, (int(name.split(':')[1]),))
+        else:
+            raise ValueError(f"Unknown dataset '{name}'")
+    return tasks
+
+
+class Fingerprints:
+    """SHA-1 of files, memoized by (size, mtime) across runs so unchanged data is not re-read."""
+
+    def __init__(self, known):
+        self.known = known
+
+    def file(self, rel_path):
+        path = ROOT / rel_path
+        stat = path.stat()
+        known = self.known.get(rel_path)
+        if known and known[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return known[2]
+        sha1 = file_sha1(path)
+        self.known[rel_path] = [stat.st_size, stat.st_mtime_ns, sha1]
+        return sha1
+
+    def target(self, name, target):
+        """Fingerprint of everything a target's outputs are derived from."""
+        files = [target['script']] + COMMON_CODE + target.get('code', [])
+        for pattern in target.get('inputs', []):
+            matches = sorted(path.relative_to(ROOT).as_posix() for path in ROOT.glob(pattern))
+            if not matches:
+                raise FileNotFoundError(f"{name}: no input matches {pattern}")
+            files.extend(matches)
+        parts = {path: self.file(path) for path in files}
+        parts['params'] = json.dumps(target.get('params', {}), sort_keys=True)
+        return hashlib.sha1(json.dumps(parts, sort_keys=True).encode()).hexdigest(), parts
+
+    def outputs_match(self, outputs):
+        """True if every recorded output exists with the recorded contents."""
+        return all((ROOT / output).exists() and self.file(output) == sha1 for output, sha1 in outputs.items())
+
+
+def _read_state():
+    if STATE_PATH.exists():
+        with open(STATE_PATH) as f:
+            return json.load(f)
+    return {'targets': {}, 'files': {}}
+
+
+def _write_state(state):
+    PIPELINE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = STATE_PATH.with_suffix('.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, STATE_PATH)
+
+
+def _run_script(target):
+    """Run a target's script in this (worker) process as if started with `python script`."""
+    script = ROOT / target['script']
+    os.chdir(ROOT / target['cwd'])
+    sys.path.insert(0, str(script.parent))
+    sys.argv = [str(script)]
+    runpy.run_path(str(script), run_name='__main__')
+
+
+def _child(name, func, args):
+    """Entry point of a worker process: run one task with its output sent to its log file."""
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
+    with open(LOG_DIR / f"{name.replace(':', '-')}.log", 'w') as log:
+        os.dup2(log.fileno(), 1)
+        os.dup2(log.fileno(), 2)
+        try:
+            func(*args)
+        except SystemExit as e:
+            if e.code not in (None, 0):
+                raise
+        except BaseException:
+            traceback.print_exc()
+            sys.stdout.flush()
+            os._exit(1)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(0)
+
+
+def _preload():
+    """Import the heavy libraries once so forked workers inherit them."""
+    import render  # noqa: F401  (selects the Agg backend)
+    import matplotlib.pyplot  # noqa: F401
+    import numpy  # noqa: F401
+    import pandas  # noqa: F401
+    import seaborn  # noqa: F401
+    import sklearn.ensemble  # noqa: F401
+    import sklearn.linear_model  # noqa: F401
+    import sklearn.tree  # noqa: F401
+    import plotly.express  # noqa: F401
+
+
+def run(targets=None, workers=None, force=False):
+    """
+    Run the stale targets and everything they need.
+
+    Args:
+        targets (list[str]): Targets to consider. All of TARGETS by default.
+        workers (int): Maximum concurrent processes. Defaults to the number of CPUs.
+        force (bool): Run the targets even if they are up to date.
+
+    Returns:
+        dict: {task: 'done' | 'failed' | 'skipped' | 'up to date' | 'restored'}.
+    """
+    names = list(targets or TARGETS)
+    for name in names:
+        if name not in TARGETS:
+            raise ValueError(f"Unknown target '{name}'. Choose from: {', '.join(TARGETS)}")
+
+    state = _read_state()
+    fingerprints = Fingerprints(state['files'])
+    cache = ArtifactCache(ROOT)
+    status = {}
+    pending = {}
+    for name in names:
+        target = TARGETS[name]
+        fingerprint, sources = fingerprints.target(name, target)
+        previous = state['targets'].get(name, {})
+        if not force and previous.get('fingerprint') == fingerprint and fingerprints.outputs_match(previous['outputs']):
+            status[name] = 'up to date'
+            continue
+        cached = None if force else cache.lookup(fingerprint)
+        if cached is not None and set(cached) == set(target['outputs']):
+            # the same code, data and parameters produced these bytes before
+            cache.restore(cached)
+            state['targets'][name] = {'fingerprint': fingerprint, 'sources': sources, 'outputs': cached,
+                                      'finished': time.time()}
+            status[name] = 'restored'
+            print(f"[restored] {name} from the artifact cache")
+            continue
+        pending[name] = (fingerprint, sources, target)
+
+    # Each target waits on the shared datasets it needs; those are prepared once
+    preparations = _preparations(sorted({need for _, _, target in pending.values() for need in target.get('needs', [])}))
+    tasks = {name: (func, args, []) for name, (func, args) in preparations.items()}
+    for name, (_, _, target) in pending.items():
+        tasks[name] = (_run_script, (target,), list(target.get('needs', [])))
+
+    if not tasks:
+        _write_state(state)
+        cache.save()
+        return status
+
+    if 'fork' in multiprocessing.get_all_start_methods():
+        _preload()
+        context = multiprocessing.get_context('fork')
+    else:
+        # every task is a module-level function with picklable arguments, so it can start
+        # in a fresh interpreter as well
+        context = multiprocessing.get_context('spawn')
+    workers = workers or os.cpu_count() or 1
+    running = {}
+    started = {}
+    while tasks or running:
+        for name in list(tasks):
+            if len(running) >= workers:
+                break
+            func, args, needs = tasks[name]
+            if any(status.get(need) in ('failed', 'skipped') for need in needs):
+                status[name] = 'skipped'
+                del tasks[name]
+                print(f"[skipped] {name}: a dataset it needs failed to prepare")
+                continue
+            if any(status.get(need) != 'done' for need in needs):
+                continue
+            process = context.Process(target=_child, args=(name, func, args), name=name)
+            process.start()
+            running[process.sentinel] = (name, process)
+            started[name] = time.perf_counter()
+            del tasks[name]
+
+        if not running:
+            # only blocked tasks remain and nothing can unblock them
+            for name in tasks:
+                status[name] = 'skipped'
+            break
+
+        for sentinel in wait(list(running)):
+            name, process = running.pop(sentinel)
+            process.join()
+            elapsed = time.perf_counter() - started[name]
+            log_path = LOG_DIR / f"{name.replace(':', '-')}.log"
+            if process.exitcode == 0:
+                status[name] = 'done'
+                print(f"[done] {name} ({elapsed:.1f}s)")
+                if name in pending:
+                    fingerprint, sources, target = pending[name]
+                    missing = [output for output in target['outputs'] if not (ROOT / output).exists()]
+                    if missing:
+                        status[name] = 'failed'
+                        print(f"[failed] {name}: did not write {', '.join(missing)}")
+                        continue
+                    state['targets'][name] = {'fingerprint': fingerprint, 'sources': sources,
+                                              'outputs': cache.store(fingerprint, name, target['outputs']),
+                                              'finished': time.time()}
+            else:
+                status[name] = 'failed'
+                print(f"[failed] {name} ({elapsed:.1f}s), see {log_path}")
+                with open(log_path) as f:
+                    print(''.join(f.readlines()[-5:]), end='')
+
+    _write_state(state)
+    cache.save()
+    return status
+
+
+def status_report(targets=None):
+    """
+    Describe, without running anything, what `run` would do for each target and why.
+
+    Returns:
+        list[tuple[str, str, str]]: (target, 'up to date' | 'cached' | 'stale', reason).
+    """
+    state = _read_state()
+    fingerprints = Fingerprints(state['files'])
+    cache = ArtifactCache(ROOT)
+    rows = []
+    for name in targets or TARGETS:
+        target = TARGETS[name]
+        fingerprint, sources = fingerprints.target(name, target)
+        previous = state['targets'].get(name)
+        if previous is None:
+            reasons = ['never run']
+        else:
+            changed = [path for path in sources if previous['sources'].get(path) != sources[path]]
+            missing = [output for output in target['outputs'] if not (ROOT / output).exists()]
+            modified = [output for output, sha1 in previous['outputs'].items()
+                        if (ROOT / output).exists() and fingerprints.file(output) != sha1]
+            reasons = ([f"changed: {', '.join(changed)}"] if changed else []) \
+                + ([f"missing: {', '.join(missing)}"] if missing else []) \
+                + ([f"modified: {', '.join(modified)}"] if modified else [])
+
+        if not reasons:
+            rows.append((name, 'up to date', ''))
+        elif cache.lookup(fingerprint) is not None:
+            rows.append((name, 'cached', '; '.join(reasons) + ' (outputs for these sources are in the cache)'))
+        else:
+            rows.append((name, 'stale', '; '.join(reasons)))
+    _write_state(state)
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the analysis pipeline.")
+    parser.add_argument('targets', nargs='*', help="targets to run (default: all)")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="maximum concurrent processes")
+    parser.add_argument('--force', action='store_true', help="run targets even if they are up to date")
+    parser.add_argument('--status', action='store_true', help="report what would run and why, then exit")
+    parser.add_argument('--prune', action='store_true', help="drop cached artifacts of superseded runs, then exit")
+    args = parser.parse_args()
+
+    if args.status:
+        for name, result, reason in status_report(args.targets):
+            print(f"{name:<36} {result:<11} {reason}")
+        objects, size = ArtifactCache(ROOT).size()
+        print(f"\nartifact cache: {objects} objects, {size / 2**20:.1f} MB in {ARTIFACTS_DIR}")
+        sys.exit(0)
+    if args.prune:
+        cache = ArtifactCache(ROOT)
+        freed = cache.prune({entry['fingerprint'] for entry in _read_state()['targets'].values()})
+        cache.save()
+        print(f"Freed {freed / 2**20:.1f} MB")
+        sys.exit(0)
+
+    status = run(args.targets, args.workers, args.force)
+    for name in args.targets or TARGETS:
+        print(f"{name:<36} {status.get(name, 'up to date')}")
+    if any(result in ('failed', 'skipped') for result in status.values()):
+        sys.exit(1)
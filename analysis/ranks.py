@@ -0,0 +1,72 @@
+"""
+Police rank taxonomy shared by the roster, earnings and overtime analyses.
+
+Ranks are ordinals into RANKS, from the Commissioner (0) down to Police Officer (8), with
+everything else as Other (9). Job titles (roster 'Job Title', earnings TITLE) get the
+first rank in RANKS that is a substring of the title, and the overtime ledgers' RANK
+abbreviations (Ptl, SgtDet, Capt, ...) are mapped onto the same scale, so rank-level
+results can be joined across the datasets.
+
+Titles repeat heavily (a few dozen distinct values over thousands of rows), so each
+distinct value is encoded once and the result is broadcast through categorical codes.
+"""
+import numpy as np
+import pandas as pd
+
+# Leadership ranking, highest first
+RANKS = [
+    "Commissioner", "Supn-In Chief", "Supn Bpd", "Dep Supn",
+    "Police Captain", "Police Lieutenant", "Police Sergeant",
+    "Police Detective", "Police Officer", "Other"
+]
+OTHER = RANKS.index("Other")
+
+# RANK column of the overtime, court OT and record request ledgers
+RANK_CODES = {
+    'Supt': RANKS.index("Supn Bpd"),
+    'Capt': RANKS.index("Police Captain"),
+    'Capt D': RANKS.index("Police Captain"),
+    'Lieut': RANKS.index("Police Lieutenant"),
+    'LtDet': RANKS.index("Police Lieutenant"),
+    'Sergt': RANKS.index("Police Sergeant"),
+    'SgtDet': RANKS.index("Police Sergeant"),
+    'Det': RANKS.index("Police Detective"),
+    'Ptl': RANKS.index("Police Officer"),
+    'Civili': OTHER,
+}
+
+
+def title_rank(title):
+    """Rank of a single job title: the first of RANKS contained in it, else Other."""
+    if isinstance(title, str):
+        for rank, name in enumerate(RANKS[:OTHER]):
+            if name in title:
+                return rank
+    return OTHER
+
+
+def _broadcast(values, encode):
+    """Apply encode to each distinct value once and spread the results over all rows."""
+    values = pd.Series(values)
+    categorical = pd.Categorical(values)
+    lookup = np.array([encode(value) for value in categorical.categories] + [encode(None)], dtype=np.int8)
+    # missing values have code -1, which picks the trailing encode(None)
+    return pd.Series(lookup[categorical.codes], index=values.index)
+
+
+def encode_titles(titles):
+    """
+    Ordinal rank of every job title.
+
+    Args:
+        titles (array-like): Roster 'Job Title' or earnings TITLE values.
+
+    Returns:
+        pd.Series: int8 indices into RANKS, aligned with titles.
+    """
+    return _broadcast(titles, title_rank)
+
+
+def encode_rank_codes(codes):
+    """Ordinal rank of every ledger RANK abbreviation; unknown or missing codes are Other."""
+    return _broadcast(codes, lambda code: RANK_CODES.get(code.strip(), OTHER) if isinstance(code, str) else OTHER)
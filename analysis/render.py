@@ -0,0 +1,102 @@
+"""
+Single place every analysis script writes its figures through.
+
+Interactive by default: a saved figure is also shown. Setting ANALYSIS_HEADLESS=1 (the
+pipeline runner does) switches to batch mode: matplotlib is forced onto the Agg backend,
+nothing is ever shown, and independent figures can be rendered in worker processes.
+Either way each figure is closed once written, so a long run does not accumulate them.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+
+HEADLESS = os.environ.get('ANALYSIS_HEADLESS') == '1'
+if HEADLESS:
+    matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt
+
+
+def save_figure(path, fig=None, show=True, **kwargs):
+    """
+    Save a matplotlib figure, show it when interactive, then close it.
+
+    Args:
+        path (str | Path): Output file.
+        fig (matplotlib.figure.Figure): Figure to save. The current figure by default.
+        show (bool): Also show the figure when interactive.
+        **kwargs: Passed on to Figure.savefig (dpi, bbox_inches, ...).
+    """
+    fig = fig or plt.gcf()
+    fig.savefig(path, **kwargs)
+    if show:
+        show_figure(fig)
+    else:
+        plt.close(fig)
+
+
+def show_figure(fig=None):
+    """Show a matplotlib figure when interactive, then close it."""
+    fig = fig or plt.gcf()
+    if not HEADLESS:
+        plt.show()
+    plt.close(fig)
+
+
+def save_plotly(fig, path=None):
+    """Write a plotly figure to HTML if a path is given, and open it when interactive."""
+    if path is not None:
+        fig.write_html(path)
+    if not HEADLESS:
+        fig.show()
+
+
+def save_plotly_page(figs, path, title=None):
+    """
+    Write several plotly figures into one HTML page that embeds plotly.js once, and open
+    them when interactive.
+    """
+    figs = list(figs)
+    divs = [fig.to_html(full_html=False, include_plotlyjs=(i == 0)) for i, fig in enumerate(figs)]
+    heading = f'<title>{title}</title>' if title else ''
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f'<html>\n<head><meta charset="utf-8" />{heading}</head>\n<body>\n')
+        f.write('\n'.join(divs))
+        f.write('\n</body>\n</html>\n')
+    if not HEADLESS:
+        for fig in figs:
+            fig.show()
+
+
+# Jobs of the current render_all call, inherited by its forked workers
+_jobs = []
+
+
+def render_all(jobs, workers=None):
+    """
+    Run independent figure functions, each given as (func, args).
+
+    In headless mode the jobs run in forked worker processes, which inherit the caller's
+    data instead of pickling it; interactively (or where fork is unavailable) they run
+    one after another in this process so figures can be shown.
+    """
+    jobs = list(jobs)
+    if not HEADLESS or len(jobs) < 2 or 'fork' not in multiprocessing.get_all_start_methods():
+        for func, args in jobs:
+            func(*args)
+        return
+
+    global _jobs
+    _jobs = jobs
+    context = multiprocessing.get_context('fork')
+    with ProcessPoolExecutor(max_workers=workers or min(len(jobs), os.cpu_count() or 1), mp_context=context) as pool:
+        # the result() calls re-raise any error from a worker
+        for future in [pool.submit(_run_job, i) for i in range(len(jobs))]:
+            future.result()
+
+
+def _run_job(i):
+    func, args = _jobs[i]
+    func(*args)
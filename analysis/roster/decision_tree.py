@@ -13,6 +13,7 @@ from sklearn.preprocessing import LabelEncoder
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from earnings.utils import load_earnings_data
+from render import save_figure
 
 if __name__ == "__main__":
     # Load and prepare data
@@ -54,6 +55,4 @@ if __name__ == "__main__":
 
     output_dir = Path(__file__).parent / 'EDA'
     output_dir.mkdir(exist_ok=True)
-    plt.savefig(output_dir / f'top_earners_decision_tree{2020}.png', bbox_inches='tight', dpi=300) # comment out when don't want saved
-
-    plt.show()
+    save_figure(output_dir / f'top_earners_decision_tree{2020}.png', bbox_inches='tight', dpi=300) # comment out when don't want saved
@@ -2,25 +2,17 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 import plotly.express as px
+import sys
+import os
 
-### leadership rankings so they can be encoded:
-'''
-1) Commissioner
-2) Supn-In Chief
-3) Supn Bpd
-4) Dep Supn
-5) Police Captain
-6) Police Lieutenant
-7) Police Sergeant
-8) Police Detective
-9) Police Officer
-10) other
-'''
-titles = [
-              "Commissioner", "Supn-In Chief", "Supn Bpd", "Dep Supn",
-              "Police Captain", "Police Lieutenant", "Police Sergeant",
-              "Police Detective", "Police Officer", "Other"
-       ]
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from hover import labels
+from ranks import RANKS, encode_titles
+from render import render_all, save_figure, save_plotly, show_figure
+from scatter import scatter
+
+### leadership rankings so they can be encoded (see ranks.py)
+titles = RANKS
 
 ### data preprocessing
 def preprocess(df):
@@ -41,16 +33,7 @@ def preprocess(df):
        df_encoded["Ethnic Grp Categorical"] = df["Ethnic Grp"].astype(str) # append the categorical column for use later?
        df = df_encoded  # df_encoded already contains the one-hot encoded values and the original numerical columns
 
-       # used in to encode job titles
-       def encode_ranking(col: pd.Series) -> pd.Series:
-              def get_title_index(entry):
-                     for idx, title in enumerate(titles, start=0):
-                            if title in entry:
-                                   return idx
-                     return 9 # "other" category
-
-              return col.apply(get_title_index)
-       df['Job Title Encoded'] = encode_ranking(df['Job Title']) # what if I need to keep all of the job titles because I lost some
+       df['Job Title Encoded'] = encode_titles(df['Job Title']) # what if I need to keep all of the job titles because I lost some
        return df
 
 ### data analysis -- gender distribution
@@ -62,8 +45,7 @@ def plot_gender_dist(df, title):
        ax.pie(sizes, labels=labels, autopct='%1.1f%%',
               pctdistance=1.25, labeldistance=.6)
        plt.title(title)
-       plt.savefig(f'./analysis/roster/figures/{title}.png')# only uncomment when you want to save figure
-       plt.show()
+       save_figure(f'./analysis/roster/figures/{title}.png')# only uncomment when you want to save figure
 
 ### data analysis -- ethnic group
 def plot_ethnic_grp_dist(df, title):
@@ -73,8 +55,7 @@ def plot_ethnic_grp_dist(df, title):
        ax.pie(sizes, labels=labels, autopct='%1.1f%%',
               pctdistance=1.25, labeldistance=.6)
        plt.title(title)
-       plt.savefig(f'./analysis/roster/figures/{title}.png') # only uncomment when you want to save figure
-       plt.show()
+       save_figure(f'./analysis/roster/figures/{title}.png') # only uncomment when you want to save figure
 
 ### data analysis -- annual rate and ethnic group (maybe add sex as color)
 def plot_job_title_vs_annual_rt_vs_gender():
@@ -92,8 +73,7 @@ def plot_job_title_vs_annual_rt_vs_gender():
               plt.Line2D([0], [0], marker='o', color='w', markerfacecolor='red', markersize=10, label='Female', alpha=0.5)
        ])
        plt.tight_layout()  # Adjusts plot to fit labels
-       plt.savefig('./analysis/roster/figures/job_title_vs_annual_rt_by_gender.png') # very interesting outlier
-       plt.show()
+       save_figure('./analysis/roster/figures/job_title_vs_annual_rt_by_gender.png') # very interesting outlier
 
 def plot_job_title_vs_rates_combined():
        plt.xticks(ticks=range(1, 11), labels=titles, rotation=45, ha='right')
@@ -123,8 +103,7 @@ def plot_job_title_vs_rates_combined():
        plt.legend(loc='upper right')
        plt.yscale('log')
        plt.tight_layout()  # Adjusts plot to fit labels
-       plt.savefig('./analysis/roster/figures/job_title_vs_rates_combined.png')
-       plt.show()
+       save_figure('./analysis/roster/figures/job_title_vs_rates_combined.png')
 
 def plot_job_title_vs_rates_seperate():
        # Create subplots, one for each rate (Hourly Rate, Monthly Rate, Annual Rate)
@@ -166,8 +145,7 @@ def plot_job_title_vs_rates_seperate():
               ])
        
        plt.tight_layout()
-       plt.savefig('./analysis/roster/figures/job_title_vs_rates_seperate.png')
-       plt.show()
+       save_figure('./analysis/roster/figures/job_title_vs_rates_seperate.png')
 
 ### data analysis -- print info about person with highest annual rt
 def max_annual_rt():
@@ -225,24 +203,27 @@ def plot_rate_comparison():
        
        plt.tight_layout()
        # plt.savefig('./figures/rate_comparison.png')
-       plt.show()
+       show_figure()
 
 
 def plot_interactive_hrly_vs_annual_rate():
-    # Prepare the data with custom hover information
-    df['hover_info'] = df.apply(lambda row: f"Job Title: {row['Job Title']}<br>Hourly Rate: {row['Hrly Rate']}<br>Monthly Rate: {row['Monthly Rt']}<br>Annual Rate: {row['Annual Rt']}<br>Sex: {'Male' if row['Sex_M'] else 'Female'}<br>Ethnic Group: {row['Ethnic Grp Categorical']}", axis=1)
-
     # Create interactive scatter plots for 'Hrly Rate' vs 'Annual Rt'
-    fig = px.scatter(df,
-                     x='Hrly Rate',
-                     y='Annual Rt',
-                     color=df['Sex_M'].map({True: 'Male', False: 'Female'}),
-                     hover_name='Job Title',
-                     hover_data={'Hrly Rate': True, 'Annual Rt': True, 'Annual Rt': True, 'Sex_M': False, 'hover_info': True},
-                     title='Hourly Rate vs. Annual Rate',
-                     labels={'Hrly Rate': 'Hourly Rate', 'Annual Rt': 'Annual Rate'},
-                     color_discrete_map={'Male': 'blue', 'Female': 'red'},
-                     opacity=0.7)
+    fig = scatter(df.assign(Sex=labels(df['Sex_M'], 'Male', 'Female')),
+                  'Hrly Rate',
+                  'Annual Rt',
+                  color='Sex',
+                  hover_fields=[
+                      ('Hourly Rate', 'Hrly Rate', '$,.2f'),
+                      ('Monthly Rate', 'Monthly Rt', '$,.2f'),
+                      ('Annual Rate', 'Annual Rt', '$,.2f'),
+                      ('Sex', 'Sex'),
+                      ('Ethnic Group', 'Ethnic Grp Categorical'),
+                  ],
+                  hover_title='Job Title',
+                  title='Hourly Rate vs. Annual Rate',
+                  labels={'Hrly Rate': 'Hourly Rate', 'Annual Rt': 'Annual Rate'},
+                  color_discrete_map={'Male': 'blue', 'Female': 'red'},
+                  opacity=0.7)
     
     # Polynomial Trendline (2nd degree)
     coefficients = np.polyfit(df['Hrly Rate'], df['Annual Rt'], 2) # changing last argument to 1 makes it linear instead of polynomial (2)
@@ -255,7 +236,7 @@ def plot_interactive_hrly_vs_annual_rate():
 
     fig.update_layout(legend_title_text='Gender')
 #     fig.write_html('./figures/interactive_hrly_vs_annual_rate.html')
-    fig.show()
+    save_plotly(fig)
 
 ### running code:
 if __name__ == "__main__":
@@ -265,11 +246,13 @@ if __name__ == "__main__":
        df = preprocess(df)
        print(df.head()) # after preprocessing
 
-       ### plots
-       plot_ethnic_grp_dist(df, "ethnic_group_distribution")
-       plot_gender_dist(df, "gender_distribution")
-       plot_job_title_vs_annual_rt_vs_gender()
-       plot_job_title_vs_rates_combined()
-       plot_job_title_vs_rates_seperate()
-       plot_rate_comparison()
-       plot_interactive_hrly_vs_annual_rate()
\ No newline at end of file
+       ### plots (independent of each other, so rendered in parallel when headless)
+       render_all([
+              (plot_ethnic_grp_dist, (df, "ethnic_group_distribution")),
+              (plot_gender_dist, (df, "gender_distribution")),
+              (plot_job_title_vs_annual_rt_vs_gender, ()),
+              (plot_job_title_vs_rates_combined, ()),
+              (plot_job_title_vs_rates_seperate, ()),
+              (plot_rate_comparison, ()),
+              (plot_interactive_hrly_vs_annual_rate, ()),
+       ])
\ No newline at end of file
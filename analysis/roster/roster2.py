@@ -11,6 +11,10 @@ import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from earnings.utils import load_earnings_data
+from hover import labels
+from identity import load_identity_index, match_stats, normalize_ids
+from render import save_figure, save_plotly
+from scatter import scatter
 
 def create_top_earners_chart(df, year):
     plt.figure(figsize=(15, 8))
@@ -58,33 +62,25 @@ def create_top_earners_chart(df, year):
     # Save the figure
     output_dir = Path(__file__).parent / 'EDA'
     output_dir.mkdir(exist_ok=True)
-    plt.savefig(output_dir / f'top_earners_{year}.png', bbox_inches='tight', dpi=300)
+    save_figure(output_dir / f'top_earners_{year}.png', bbox_inches='tight', dpi=300, show=False)
     print(f"\nPlot saved as 'top_earners_{year}.png' in {output_dir}")
 
-# Normalize roster_df name columns
+# Join the top earners to the roster on resolved employee IDs
 def preprocess_and_merge(n, roster_df, police_df):
-    roster_df['Last'] = roster_df['Last'].str.strip().str.upper()
-    roster_df['First Name'] = roster_df['First Name'].str.strip().str.upper()
+    # Get top earners and resolve their names to roster employee IDs, fuzzily where
+    # suffixes or spelling keep an exact match from resolving, among officers of the same rank
+    top_n = police_df.nlargest(n, 'TOTAL GROSS')
+    top_n = load_identity_index().resolve(top_n, within='roster', fuzzy=True, rank_column='TITLE')
+    print(f"Top {n} earners matched to the roster:", match_stats(top_n))
 
-    # Get top earners' name columns
-    top_n = police_df.nlargest(n, 'TOTAL GROSS').copy()
-
-    # Split and normalize names
-    top_n[['Last', 'First Name']] = top_n['NAME'].str.split(',', expand=True)
-    top_n['Last'] = top_n['Last'].str.strip().str.upper()
-    top_n['First Name'] = top_n['First Name'].str.strip().str.split().str[0].str.upper()
-
-    # Merge on normalized names
+    # Roster IDs are unique, so each earner matches at most one roster row
     top_n_with_roster_df = pd.merge(
         top_n,
-        roster_df,
-        on=['Last', 'First Name'],
+        roster_df.assign(EMPLOYEE_ID=normalize_ids(roster_df['ID']).to_numpy()),
+        on='EMPLOYEE_ID',
         how='inner' # keep the top 100 even if roster_df is NA?
     )
 
-    # Drop duplicate matches
-    top_n_with_roster_df = top_n_with_roster_df.drop_duplicates(subset=['Last', 'First Name'])
-
     return top_n_with_roster_df
 
 def plot_income_ranking_with_demographics(df: pd.DataFrame, title: str = "Top 100 Earners by Income Ranking", filename: str = "top_100_income_ranking.html"):
@@ -102,30 +98,27 @@ def plot_income_ranking_with_demographics(df: pd.DataFrame, title: str = "Top 10
     df = df.sort_values(by="TOTAL GROSS", ascending=False).reset_index(drop=True)
     df['Rank'] = df.index + 1
 
-    # Format hover text
-    df['Sex'] = df['Sex_M'].apply(lambda x: 'Male' if x else 'Female')
-    df['Hover Info'] = (
-        "Name: " + df['NAME'] + "<br>" +
-        "Job Title: " + df['Job Title'].fillna("N/A") + "<br>" +
-        "Sex: " + df['Sex'] + "<br>" +
-        "Ethnic Group: " + df['Ethnic Grp Categorical'].fillna("N/A") + "<br>" +
-        "Total Earnings: $" + df['TOTAL GROSS'].map("{:,.2f}".format)
-    )
-
     # Create the plot
-    fig = px.scatter(
+    df['Sex'] = labels(df['Sex_M'], 'Male', 'Female')
+    fig = scatter(
         df,
-        x="Rank",
-        y="TOTAL GROSS",
-        hover_name="NAME",
-        hover_data={"Hover Info": True, "TOTAL GROSS": False, "Rank": False},
+        "Rank",
+        "TOTAL GROSS",
+        hover_fields=[
+            ('Job Title', 'Job Title'),
+            ('Sex', 'Sex'),
+            ('Ethnic Group', 'Ethnic Grp Categorical'),
+            ('Total Earnings', 'TOTAL GROSS', '$,.2f'),
+        ],
+        hover_title='NAME',
         labels={"TOTAL GROSS": "Total Gross Income", "Rank": "Income Rank"},
         title=title
     )
 
-    fig.update_traces(marker=dict(size=8, color='blue'), hovertemplate=df['Hover Info'])
+    fig.update_traces(marker=dict(size=8, color='blue'), selector=dict(mode='markers'))
     fig.update_layout(
-        xaxis=dict(tickmode='linear', dtick=10),
+        # a tick every 10 ranks for a top 100, automatic ticks for longer rankings
+        xaxis=dict(tickmode='linear', dtick=10) if len(df) <= 200 else dict(),
         yaxis_tickprefix="$",
         hoverlabel=dict(bgcolor="white", font_size=12),
         margin=dict(t=80, r=20, l=60, b=60),
@@ -136,8 +129,7 @@ def plot_income_ranking_with_demographics(df: pd.DataFrame, title: str = "Top 10
     # Save the plot
     output_path = Path(__file__).parent / "EDA"
     output_path.mkdir(exist_ok=True)
-    fig.write_html(output_path / filename)
-    fig.show()
+    save_plotly(fig, output_path / filename)
     print(f"\nInteractive plot saved as '{filename}' in {output_path}")
 
 if __name__ == "__main__":
@@ -163,29 +155,19 @@ if __name__ == "__main__":
         print(f"\nDetailed Breakdown of Top 10 Earners ({year})")
         print("-" * 80)
         
-        top_10 = police_df.nlargest(10, 'TOTAL GROSS')
+        top_10 = load_identity_index().resolve(police_df.nlargest(10, 'TOTAL GROSS'), within='roster')
         components = ['REGULAR', 'OVERTIME', 'DETAIL', 'QUINN_EDUCATION', 'INJURED', 'RETRO', 'OTHER']
         roster_components = ['Job Title', 'Sex_M', 'Ethnic Grp Categorical']
+
+        # Roster rows by employee ID, for constant-time lookups
+        roster_by_id = roster_df.set_index(normalize_ids(roster_df['ID']).to_numpy())
         
         # printing for top 10
         for idx, row in top_10.iterrows():
-            full_name = row['NAME']
-            last, first = full_name.split(',')
-            last = last.strip().upper()
-            first = first.strip().split(' ')[0].upper()
-            
-            # Normalize name columns in roster
-            roster_df['Last'] = roster_df['Last'].str.strip().str.upper()
-            roster_df['First Name'] = roster_df['First Name'].str.strip().str.upper()
-            
-            matching_roster_row = roster_df.loc[
-                (roster_df['Last'] == last) & (roster_df['First Name'] == first)
-            ]
-            
             print(f"\n{row['NAME']} — Total Earnings: ${row['TOTAL GROSS']:,.2f}")
             
-            if not matching_roster_row.empty:
-                m = matching_roster_row.iloc[0]
+            if row['EMPLOYEE_ID'] in roster_by_id.index:
+                m = roster_by_id.loc[row['EMPLOYEE_ID']]
                 print("Diversity Background:")
                 print(f"  Job Title         : {m['Job Title']}")
                 print(f"  Sex               : {'Male' if m['Sex_M'] else 'Female'}")
@@ -0,0 +1,140 @@
+"""
+Interactive scatter plots that stay usable from a hundred points to every employee across
+all years.
+
+scatter() picks how to draw the points from how many there are:
+
+  - up to WEBGL_POINTS, SVG markers (px.scatter as before);
+  - up to BIN_POINTS, WebGL markers, which the browser can pan and hover over smoothly
+    for hundreds of thousands of points;
+  - beyond that, the points are binned on a grid in Python, datashader-style, and drawn
+    as a density heatmap: the page carries BINS x BINS cell counts instead of the points,
+    and hovering a cell shows how many points fell in it.
+
+Positions are sent as float32, which plotly writes as compact base64 typed arrays rather
+than JSON number lists. save_plotly_page() in render.py writes several such figures into
+one page that embeds plotly.js once.
+
+Run `python analysis/scatter.py` to export every earner's regular pay vs overtime over
+all years of earnings reports.
+"""
+import os
+import sys
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from hover import fill_missing, hover_template
+
+# Above this many points markers are drawn with WebGL instead of SVG
+WEBGL_POINTS = 1_000
+
+# Above this many points they are binned into a density heatmap instead of drawn
+BIN_POINTS = 100_000
+
+# Cells along each axis of a density heatmap
+BINS = 300
+
+
+def scatter_mode(points):
+    """'svg', 'webgl' or 'binned': how scatter() draws this many points."""
+    if points > BIN_POINTS:
+        return 'binned'
+    return 'webgl' if points > WEBGL_POINTS else 'svg'
+
+
+def scatter(df, x, y, color=None, hover_fields=None, hover_title=None, mode=None, bins=BINS, **kwargs):
+    """
+    Scatter plot of two columns, drawn to suit the number of points.
+
+    Args:
+        df (pd.DataFrame): Data, one row per point.
+        x, y (str): Columns to plot.
+        color (str): Column to color the markers by. A density heatmap counts all points
+            together, without colors.
+        hover_fields, hover_title: Per-point hover, as for hover.hover_template().
+        mode (str): 'svg', 'webgl' or 'binned'. Chosen by scatter_mode() by default.
+        bins (int): Cells along each axis of a density heatmap.
+        **kwargs: Passed on to px.scatter. A density heatmap only uses title and labels.
+
+    Returns:
+        go.Figure: The figure. Marker traces can be told apart from a density heatmap
+        with update_traces(selector=dict(mode='markers')).
+    """
+    mode = mode or scatter_mode(len(df))
+    if mode == 'binned':
+        return density_heatmap(df[x], df[y], bins, title=kwargs.get('title'),
+                               x_label=kwargs.get('labels', {}).get(x, x),
+                               y_label=kwargs.get('labels', {}).get(y, y))
+
+    custom_data = None
+    if hover_fields:
+        custom_data, template = hover_template(hover_fields, title=hover_title)
+    # hovers show the exact values, so only positions not also hovered are narrowed
+    data = df.assign(**{column: df[column].astype(np.float32) for column in [x, y]
+                        if column not in (custom_data or [])})
+    if hover_fields:
+        data = fill_missing(data, custom_data)
+    fig = px.scatter(data, x=x, y=y, color=color, custom_data=custom_data,
+                     render_mode='webgl' if mode == 'webgl' else 'svg', **kwargs)
+    if hover_fields:
+        fig.update_traces(hovertemplate=template)
+    return fig
+
+
+def density_heatmap(x, y, bins=BINS, title=None, x_label='x', y_label='y'):
+    """
+    Density heatmap of points binned on a bins x bins grid.
+
+    Colors follow log10 of the count so sparse outliers stay visible next to dense
+    clusters; empty cells are transparent.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    finite = np.isfinite(x) & np.isfinite(y)
+    counts, x_edges, y_edges = np.histogram2d(x[finite], y[finite], bins=bins)
+    # histogram2d counts x along the rows, a heatmap's z has y along them
+    counts = counts.T.astype(np.int32)
+    with np.errstate(divide='ignore'):
+        z = np.where(counts > 0, np.log10(counts), np.nan).astype(np.float32)
+
+    decades = np.arange(int(np.nanmax(z, initial=0)) + 1)
+    fig = go.Figure(go.Heatmap(
+        x=((x_edges[:-1] + x_edges[1:]) / 2).astype(np.float32),
+        y=((y_edges[:-1] + y_edges[1:]) / 2).astype(np.float32),
+        z=z,
+        customdata=counts,
+        colorscale='Viridis',
+        colorbar=dict(title='Points', tickvals=decades, ticktext=[f'{10 ** d:,}' for d in decades]),
+        hovertemplate=f'{x_label}: %{{x:,.0f}}<br>{y_label}: %{{y:,.0f}}<br>%{{customdata:,}} points<extra></extra>',
+    ))
+    fig.update_layout(title=f'{title} ({finite.sum():,} points)' if title else None,
+                      xaxis_title=x_label, yaxis_title=y_label, template='plotly_white')
+    return fig
+
+
+if __name__ == '__main__':
+    import argparse
+    from earnings.utils import load_all_earnings
+    from render import save_plotly_page
+
+    parser = argparse.ArgumentParser(description="Export citywide regular pay vs overtime over all years.")
+    parser.add_argument('output', nargs='?', default='citywide_regular_vs_overtime.html', help="HTML file to write")
+    args = parser.parse_args()
+
+    years = range(2011, 2025)
+    df = load_all_earnings(years, columns=['NAME', 'DEPARTMENT_NAME', 'TITLE', 'REGULAR', 'OVERTIME'])
+    labels = {'REGULAR': 'Regular Pay', 'OVERTIME': 'Overtime Pay'}
+    hover = [('Department', 'DEPARTMENT_NAME'), ('Title', 'TITLE'), ('Year', 'YEAR'),
+             ('Regular Pay', 'REGULAR', '$,.0f'), ('Overtime Pay', 'OVERTIME', '$,.0f')]
+
+    latest = df[df['YEAR'] == years[-1]]
+    figures = [
+        scatter(df, 'REGULAR', 'OVERTIME', labels=labels,
+                title=f'Regular Pay vs. Overtime, {years[0]}-{years[-1]}'),
+        scatter(latest, 'REGULAR', 'OVERTIME', hover_fields=hover, hover_title='NAME', labels=labels,
+                title=f'Regular Pay vs. Overtime, {years[-1]} ({len(latest):,} employees)', opacity=0.5),
+    ]
+    save_plotly_page(figures, args.output, title='Citywide Regular Pay vs. Overtime')
+    print(f"{len(df):,} points written to {args.output} ({os.path.getsize(args.output) / 2 ** 20:.1f} MB)")
@@ -0,0 +1,228 @@
+"""
+Mergeable distribution sketches.
+
+A Summary is fed values chunk by chunk (a partition, a year, a CSV chunk) and summaries
+of different chunks can be merged, so distribution statistics over any slice are
+answered from the summaries of its parts without holding the raw rows:
+
+  - count, mean, standard deviation, min and max are exact (moments are merged with
+    Chan et al.'s parallel update, which keeps the variance stable);
+  - quantiles come from a t-digest. It keeps every value until it holds more than
+    EXACT_VALUES, so smaller inputs get exactly np.quantile's (linear) answer; beyond
+    that values are merged into centroids that are small near the tails and larger
+    towards the median, so quantile rank errors stay well under 1%;
+  - an optional Histogram over fixed bin edges counts exactly, and histograms over the
+    same edges add up.
+"""
+import copy
+import numpy as np
+
+# Number of centroids the digest keeps per unit of the k1 scale (more is more accurate)
+COMPRESSION = 300
+
+# A digest holding up to this many values stores them as they are
+EXACT_VALUES = 10_000
+
+
+def _finite(values):
+    values = np.asarray(values, dtype=np.float64).ravel()
+    return values[np.isfinite(values)]
+
+
+class TDigest:
+    """Quantile sketch of a stream of values (a merging t-digest)."""
+
+    def __init__(self, compression=COMPRESSION, exact_values=EXACT_VALUES):
+        self.compression = compression
+        self.exact_values = exact_values
+        self._means = np.empty(0)
+        self._weights = np.empty(0)
+        self._buffer = []
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values):
+        """Add a chunk of values; NaNs are ignored. Returns self."""
+        values = _finite(values)
+        if len(values):
+            self._buffer.append(values)
+            self.count += len(values)
+            self.min = min(self.min, values.min())
+            self.max = max(self.max, values.max())
+            if sum(len(chunk) for chunk in self._buffer) > self.exact_values:
+                self._flush()
+        return self
+
+    def merge(self, other):
+        """Fold another digest into this one. Returns self."""
+        other._flush()
+        if other.count:
+            self._buffer.append((other._means, other._weights))
+            self.count += other.count
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+            self._flush()
+        return self
+
+    def _flush(self):
+        """Sort the buffered values into the centroids, compressing once there are too many."""
+        if not self._buffer:
+            return
+        means, weights = [self._means], [self._weights]
+        for chunk in self._buffer:
+            if isinstance(chunk, tuple):
+                means.append(chunk[0])
+                weights.append(chunk[1])
+            else:
+                means.append(chunk)
+                weights.append(np.ones(len(chunk)))
+        self._buffer = []
+        means, weights = np.concatenate(means), np.concatenate(weights)
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+
+        if len(means) > self.exact_values:
+            # k1 scale: each group spans one unit of k, so groups are narrow in the tails
+            q = (np.cumsum(weights) - weights / 2) / weights.sum()
+            k = np.floor(self.compression / (2 * np.pi) * np.arcsin(2 * q - 1))
+            groups = np.r_[0, np.cumsum(np.diff(k) != 0)]
+            weights, sums = np.bincount(groups, weights), np.bincount(groups, weights * means)
+            means = sums / weights
+        self._means, self._weights = means, weights
+
+    def quantile(self, q):
+        """
+        Estimated quantile(s) q in [0, 1], interpolated linearly between ranks like
+        np.quantile; NaN for an empty digest.
+        """
+        self._flush()
+        if not self.count:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else np.nan
+        # 0-based rank of each centroid's center; for single values just their position
+        centers = np.cumsum(self._weights) - (self._weights + 1) / 2
+        ranks = np.r_[0, centers, self.count - 1]
+        values = np.r_[self.min, self._means, self.max]
+        return np.interp(np.asarray(q, dtype=np.float64) * (self.count - 1), ranks, values)
+
+
+class Histogram:
+    """Exact value counts over fixed bin edges. The last bin includes its right edge, as in np.histogram."""
+
+    def __init__(self, edges):
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.counts = np.zeros(len(self.edges) - 1, dtype=np.int64)
+        self.below = 0
+        self.above = 0
+
+    @classmethod
+    def linear(cls, low, high, bins):
+        """Histogram of bins equal-width bins from low to high."""
+        return cls(np.linspace(low, high, bins + 1))
+
+    def update(self, values):
+        """Count a chunk of values; NaNs are ignored. Returns self."""
+        values = _finite(values)
+        below, above = values < self.edges[0], values > self.edges[-1]
+        self.below += int(below.sum())
+        self.above += int(above.sum())
+        inside = values[~below & ~above]
+        positions = np.minimum(np.searchsorted(self.edges, inside, side='right') - 1, len(self.counts) - 1)
+        self.counts += np.bincount(positions, minlength=len(self.counts))
+        return self
+
+    def merge(self, other):
+        """Add the counts of a histogram over the same edges. Returns self."""
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Histograms with different bin edges cannot be merged")
+        self.counts += other.counts
+        self.below += other.below
+        self.above += other.above
+        return self
+
+    def density(self):
+        """Counts normalized so the histogram integrates to 1, like np.histogram(..., density=True)."""
+        return self.counts / self.counts.sum() / np.diff(self.edges)
+
+
+class Summary:
+    """
+    Exact moments, a quantile digest and optionally a fixed-bin histogram of a stream of
+    values.
+
+    Args:
+        edges (array-like): Histogram bin edges. No histogram by default.
+        compression (float): Digest compression, see TDigest.
+    """
+
+    def __init__(self, edges=None, compression=COMPRESSION):
+        self.count = 0
+        self.mean = np.nan
+        self._m2 = 0.0
+        self.digest = TDigest(compression)
+        self.histogram = Histogram(edges) if edges is not None else None
+
+    @classmethod
+    def of(cls, values, edges=None):
+        """Summary of a single array of values."""
+        return cls(edges).update(values)
+
+    def update(self, values):
+        """Add a chunk of values; NaNs are ignored. Returns self."""
+        values = _finite(values)
+        if len(values):
+            mean = values.mean()
+            self._combine(len(values), mean, ((values - mean) ** 2).sum())
+            self.digest.update(values)
+            if self.histogram is not None:
+                self.histogram.update(values)
+        return self
+
+    def merge(self, other):
+        """Fold another summary into this one. Returns self."""
+        if other.count:
+            self._combine(other.count, other.mean, other._m2)
+            self.digest.merge(other.digest)
+        if self.histogram is not None and other.histogram is not None:
+            self.histogram.merge(other.histogram)
+        return self
+
+    def _combine(self, count, mean, m2):
+        if not self.count:
+            self.count, self.mean, self._m2 = count, mean, m2
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self._m2 += m2 + delta ** 2 * self.count * count / total
+        self.count = total
+
+    @property
+    def min(self):
+        return self.digest.min if self.count else np.nan
+
+    @property
+    def max(self):
+        return self.digest.max if self.count else np.nan
+
+    def var(self, ddof=1):
+        return self._m2 / (self.count - ddof) if self.count > ddof else np.nan
+
+    def std(self, ddof=1):
+        """Standard deviation, by default with pandas' ddof=1."""
+        return np.sqrt(self.var(ddof))
+
+    def quantile(self, q):
+        return self.digest.quantile(q)
+
+    def median(self):
+        return self.digest.quantile(0.5)
+
+
+def combine(sketches):
+    """Merge of several summaries (or digests, or histograms), leaving them untouched."""
+    sketches = list(sketches)
+    merged = copy.deepcopy(sketches[0])
+    for sketch in sketches[1:]:
+        merged.merge(sketch)
+    return merged
@@ -1,29 +1,78 @@
 import os
+import sys
 
 cwd = os.getcwd()
 
-### tests for main figures in analysis/roster
-roster_path = os.path.join(cwd, 'analysis/roster/')
-# assertions for figures in EDA folder
-assert(os.path.exists(os.path.join(roster_path, 'EDA/top_earners_decision_tree2020.png'))), "ERROR: decision tree file doesn't exist"
-# assertions for figures in figures folder
-assert(os.path.exists(os.path.join(roster_path, 'figures/ethnic_group_distribution.png'))), "ERROR: ethnic group distribution file doesn't exist"
-assert(os.path.exists(os.path.join(roster_path, 'figures/gender_distribution.png'))), "ERROR: gender distribution file doesn't exist"
-assert(os.path.exists(os.path.join(roster_path, 'figures/top_100_ethnic_group_distribution.png'))), "ERROR: top 100 earners ethnic group distribution file doesn't exist"
-assert(os.path.exists(os.path.join(roster_path, 'figures/top_100_gender_distribution.png'))), "ERROR: top 100 earners gender distribution file doesn't exist"
-assert(os.path.exists(os.path.join(roster_path, 'figures/job_title_vs_annual_rt_by_gender.png'))), "ERROR: job title vs annual rate by gender file doesn't exist"
-assert(os.path.exists(os.path.join(roster_path, 'figures/job_title_vs_rates_seperate.png'))), "ERROR: job title vs rates file doesn't exist"
-
-# assertions for overtime figures
-overtime_path = os.path.join(cwd, 'analysis/overtime/')
-assert(os.path.exists(os.path.join(overtime_path, 'figures/predicted-avg-overtime-per-employee-2025.png')))
-assert(os.path.exists(os.path.join(overtime_path, 'figures/predicted-total-overtime-2025.png')))
-assert(os.path.exists(os.path.join(overtime_path, 'figures/pdfs/outlier_with_std.png')))
-assert(os.path.exists(os.path.join(overtime_path, 'figures/pdfs/fast-distributions.gif')))
-assert(os.path.exists(os.path.join(overtime_path, 'figures/regression/heatmap.png')))
-assert(os.path.exists(os.path.join(overtime_path, 'figures/regression/predictions.png')))
-assert(os.path.exists(os.path.join(overtime_path, 'figures/regression/stacked-bar.png')))
-
-# assertions for overtime regression csv files
-assert(os.path.exists(os.path.join(overtime_path, 'csv/assigned_mapping_key.csv')))
-assert(os.path.exists(os.path.join(overtime_path, 'csv/predicted_overtime_2023.csv')))
+# every figure and csv the pipeline declares must have been created
+sys.path.append(os.path.join(cwd, 'analysis'))
+from pipeline import TARGETS
+
+for name, target in TARGETS.items():
+    for output in target['outputs']:
+        assert(os.path.exists(os.path.join(cwd, output))), f"ERROR: {output} from {name} doesn't exist"
+
+# the mergeable distribution sketches must agree with exact NumPy results
+import numpy as np
+from sketches import EXACT_VALUES, Histogram, Summary, TDigest, combine
+
+rng = np.random.default_rng(0)
+values = np.concatenate([rng.lognormal(3, 1, 150_000), rng.normal(500, 50, 50_000)])
+edges = np.linspace(0, 1000, 51)
+
+# summarized in chunks within partitions, then merged across partitions
+partitions = [Summary(edges) for _ in range(4)]
+for i, chunk in enumerate(np.array_split(values, 40)):
+    partitions[i % 4].update(chunk)
+summary = combine(partitions)
+
+assert summary.count == len(values)
+assert np.isclose(summary.mean, values.mean(), rtol=1e-12), "ERROR: sketch mean"
+assert np.isclose(summary.std(), values.std(ddof=1), rtol=1e-9), "ERROR: sketch standard deviation"
+assert (summary.min, summary.max) == (values.min(), values.max()), "ERROR: sketch min/max"
+
+# quantiles within 0.5% of the true rank, tails included
+qs = np.array([0.001, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 0.999])
+ranks = np.searchsorted(np.sort(values), summary.quantile(qs)) / len(values)
+assert np.abs(ranks - qs).max() < 0.005, f"ERROR: sketch quantile ranks {ranks} for {qs}"
+
+counts, _ = np.histogram(values, bins=edges)
+assert np.array_equal(summary.histogram.counts, counts), "ERROR: sketch histogram counts"
+assert summary.histogram.above == (values > edges[-1]).sum(), "ERROR: sketch histogram overflow"
+assert np.allclose(Histogram(edges).update(values[values <= edges[-1]]).density(),
+                   np.histogram(values[values <= edges[-1]], bins=edges, density=True)[0]), "ERROR: sketch density"
+
+# small inputs are kept whole, so their quantiles are exact
+small = values[:EXACT_VALUES]
+digest = combine([TDigest().update(part) for part in np.array_split(small, 3)])
+assert np.allclose(digest.quantile(qs), np.quantile(small, qs)), "ERROR: exact digest quantiles"
+
+# folding appended ledger rows into the stored aggregates must match aggregating every row,
+# also when exactly as many rows as keys were appended and one of them has no ID
+import pandas as pd
+sys.path.append(os.path.join(cwd, 'analysis', 'overtime'))
+from aggregates import AGGREGATE_KEYS, _aggregate, _merge
+
+keys = AGGREGATE_KEYS
+rows = 40 + len(keys)
+ledger = {key: pd.Categorical(rng.choice(['A', 'B', 'C'], rows)) for key in keys}
+ledger['ID'][-1] = np.nan
+ledger['OTHOURS'] = rng.integers(1, 9, rows).astype(np.float32)
+
+stored = _aggregate({name: values[:40] for name, values in ledger.items()}, keys)
+stored = {**{key: pd.Categorical(stored[key]) for key in keys}, 'OTHOURS': stored['OTHOURS'].to_numpy(),
+          'N': stored['N'].to_numpy()}
+folded = _merge(stored, _aggregate(ledger, keys, start=40), keys)
+full = _aggregate(ledger, keys)
+assert folded['OTHOURS'].sum() == ledger['OTHOURS'].sum(), "ERROR: appended rows lost in the aggregates"
+assert (folded.astype({key: str for key in keys}).sort_values(keys).reset_index(drop=True)
+        .equals(full.astype({key: str for key in keys}).sort_values(keys).reset_index(drop=True))), \
+    "ERROR: folded aggregates differ from a full rebuild"
+
+# every ledger partition holds only rows dated in its year
+from ledger import DATASETS, iter_ledger
+
+for dataset in DATASETS:
+    for year, df in iter_ledger(dataset, columns=['OTDATE']):
+        dates = df['OTDATE'].to_numpy()
+        years = set(dates[~np.isnat(dates)].astype('datetime64[Y]').astype(int) + 1970)
+        assert years <= {year}, f"ERROR: {dataset} {year} has rows dated {sorted(years)}"